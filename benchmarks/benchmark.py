@@ -0,0 +1,368 @@
+#!/usr/bin/python3
+
+# ==============================================================================
+#   Assignment:  Benchmarks for Milestones 0 to 3
+#
+#   Author:  Fatemeh Zahedi
+#   Language:  Python3 (timeit, multiprocessing, subprocess library)
+#   To Compile:  -
+#
+#   Class:  Python for Programmers: Sockets and Security - DPI912NSA
+#   Professor:  Harvey Kaduri
+#
+# -----------------------------------------------------------------------------
+#
+#   Description: This script benchmarks the ticket generators, the reply formatting and the request parsing
+#                of every milestone, and the milestone servers end to end on localhost, so changes can be
+#                compared with a stored baseline.
+#
+#   Collaboration:  -
+#
+#   Input: python3 benchmarks/benchmark.py [--micro] [--macro] [-o results.json] [--baseline baseline.json] [--save-baseline]
+#          --micro / --macro       : run only one level (default is both)
+#          -m, --milestones        : milestones of the micro benchmarks (default is 0 1 2 3)
+#          -t, --tickets           : ticket types of the micro benchmarks (default is max 6/49 daily)
+#          -q, --quantities        : tickets per call of the micro benchmarks (default is 1 100 10000)
+#          -s, --servers           : servers of the macro benchmarks (default is milestone1 milestone2 milestone3)
+#          -r, --requests          : text requests sent to every server (default is max,1 6/49,1000)
+#          -c, --concurrency       : clients sending requests at the same time (default is 4)
+#          -d, --duration          : seconds every server scenario is measured (default is 5)
+#          -o, --output            : results JSON file (default is benchmark-results.json)
+#          --baseline              : results JSON to compare with (default is benchmarks/baseline.json, if present)
+#          --save-baseline         : store these results as the baseline
+#          --threshold             : slowdown reported as a regression (default is 0.1, 10%)
+#
+#   Output:
+#           micro/milestone3/generate/max/10000: 215000 tickets/s
+#           macro/milestone2/max,1/c4/throughput: 290 requests/s
+#           ...
+#           Regressions against benchmarks/baseline.json (threshold 10%):
+#           micro/milestone3/format/max/10000: 1210000 -> 980000 tickets/s (-19.0%)
+#           The exit status is 1 when a regression was found.
+#
+#   Algorithm: Micro benchmarks run in a forked process per milestone, so the modules of different
+#              milestones that share a name (server, protocol) never meet. Every function is timed with
+#              timeit: autorange picks a call count of at least 0.2s and the best of 5 rounds is kept,
+#              with the random module seeded first. Macro benchmarks start each server on a free port
+#              in a temporary directory and run --concurrency client processes against it for a
+#              warm-up second and --duration seconds, recording throughput and latency percentiles.
+#              Results carry the machine they were measured on; comparing with a baseline from another
+#              machine prints a warning.
+#
+#   Required Features Not Included:  -
+#   Known Bugs:  -
+#   Classification: -
+# ==============================================================================
+
+import argparse
+import importlib
+import json
+import multiprocessing
+import os
+import platform
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_FILE = os.path.join(REPOSITORY, "benchmarks", "baseline.json")
+BENCHMARK_SEED = 912  # random.seed of every micro benchmark
+REPEATS = 5  # timeit rounds per micro benchmark, the best one counts
+WARM_UP = 1.0  # seconds of load before a server is measured
+SERVER_START_TIMEOUT = 10.0
+RESULTS_VERSION = 1
+
+# how to start every server; {port} is replaced, daemons are stopped with their stop command
+SERVERS = {
+    "milestone1": {"command": ["milestone1/server.py", "-p", "{port}"]},
+    "milestone2": {"command": ["milestone2/server.py", "-p", "{port}"]},
+    "milestone3": {"command": ["milestone3/server.py", "-p", "{port}", "start"], "stop": ["milestone3/server.py", "stop"]},
+    "milestone3-prefork": {"command": ["milestone3/server.py", "-p", "{port}", "-w", str(os.cpu_count() or 1), "start"], "stop": ["milestone3/server.py", "stop"]},
+    "milestone3-asyncio": {"command": ["milestone3/server.py", "-p", "{port}", "--backend", "asyncio", "start"], "stop": ["milestone3/server.py", "stop"]},
+}
+
+# module with the generator of every milestone
+GENERATOR_MODULES = {0: "LotteryTicketGenerator", 1: "server", 2: "server", 3: "server"}
+
+def machineInfo():
+    info = {
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "cpus": os.cpu_count(),
+        "loadAverage": os.getloadavg(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+    try:
+        with open("/proc/cpuinfo", "r") as cpuInfo:
+            for line in cpuInfo:
+                if line.startswith("model name"):
+                    info["processor"] = line.split(":", 1)[1].strip()
+                    break
+        with open("/proc/meminfo", "r") as memoryInfo:
+            info["memoryKiB"] = int(memoryInfo.readline().split()[1])
+    except OSError:
+        info["processor"] = platform.processor()
+    try:
+        info["commit"] = subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPOSITORY, capture_output=True,
+                                        text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        pass
+    return info
+
+def measure(function):
+    # seconds per call: best of REPEATS rounds of a call count that takes at least 0.2s
+    random.seed(BENCHMARK_SEED)
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=REPEATS, number=number)) / number
+
+def result(value, unit, higherIsBetter=True):
+    return {"value": value, "unit": unit, "higherIsBetter": higherIsBetter}
+
+def microBenchmarks(milestone, ticketTypes, quantities):
+    # runs in its own process: imports the milestone's modules and times them
+    directory = os.path.join(REPOSITORY, f"milestone{milestone}")
+    sys.path.insert(0, directory)
+    module = importlib.import_module(GENERATOR_MODULES[milestone])
+    generator = module.LotteryTicketGenerator()
+    results = {}
+    prefix = f"micro/milestone{milestone}"
+
+    for ticketType in ticketTypes:
+        typeOfTicket = generator.lottoTicketTypes[ticketType]
+        for quantity in quantities:
+            seconds = measure(lambda: generator.generateTickets(quantity, typeOfTicket))
+            results[f"{prefix}/generate/{ticketType}/{quantity}"] = result(quantity / seconds, "tickets/s")
+
+            formatTickets = getattr(module, "formatTickets", None)
+            if formatTickets is None:
+                continue
+            tickets = generator.generateTicketBatch(quantity, typeOfTicket)
+            if milestone >= 3:
+                seconds = measure(lambda: formatTickets(tickets, 1, typeOfTicket.numberFormat))
+            else:
+                seconds = measure(lambda: formatTickets(tickets, 1))
+            results[f"{prefix}/format/{ticketType}/{quantity}"] = result(quantity / seconds, "tickets/s")
+
+    # request parsing: the text parser of milestone3 and the binary request frames of milestones 2 and 3
+    if hasattr(module, "parseTextRequest"):
+        request = f"{ticketTypes[0]},{quantities[-1]}".encode()
+        seconds = measure(lambda: module.parseTextRequest(request))
+        results[f"{prefix}/parse/text"] = result(1 / seconds, "requests/s")
+    if os.path.exists(os.path.join(directory, "protocol.py")):
+        protocol = importlib.import_module("protocol")
+        payload = protocol.packRequest(ticketTypes[0], quantities[-1])[protocol.HEADER.size:]
+        seconds = measure(lambda: protocol.unpackRequest(payload))
+        results[f"{prefix}/parse/binary"] = result(1 / seconds, "requests/s")
+    return results
+
+def runIsolated(function, *args):
+    # call function in a forked child and return its JSON result
+    reader, writer = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(reader)
+        status = 0
+        try:
+            output = json.dumps(function(*args)).encode()
+        except BaseException as e:
+            output = json.dumps({"error": f"{type(e).__name__}: {e}"}).encode()
+            status = 1
+        with os.fdopen(writer, "wb") as pipe:
+            pipe.write(output)
+        os._exit(status)
+    os.close(writer)
+    with os.fdopen(reader, "rb") as pipe:
+        output = json.loads(pipe.read() or b"{}")
+    os.waitpid(pid, 0)
+    if "error" in output:
+        raise RuntimeError(output["error"])
+    return output
+
+def freePort():
+    with socket.socket(socket.AF_INET6, socket.SOCK_STREAM) as probe:
+        probe.bind(("::1", 0))
+        return probe.getsockname()[1]
+
+def sendRequest(port, request):
+    # one text protocol request: send it and read the reply until the server closes the connection
+    with socket.create_connection(("::1", port)) as clientSocket:
+        clientSocket.sendall(request)
+        clientSocket.shutdown(socket.SHUT_WR)
+        received = 0
+        while True:
+            data = clientSocket.recv(65536)
+            if not data:
+                return received
+            received += len(data)
+
+def waitForServer(port):
+    # the first request doubles as the readiness probe: milestone1 cannot take an empty connection
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while True:
+        try:
+            sendRequest(port, b"max,1")
+            return
+        except ConnectionRefusedError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+def serverCommand(arguments, port=None):
+    # script paths are relative to the repository
+    return [sys.executable] + [os.path.join(REPOSITORY, part) if part.endswith(".py") else part.format(port=port)
+                               for part in arguments]
+
+def startServer(name, port, directory):
+    spec = SERVERS[name]
+    command = serverCommand(spec["command"], port)
+    process = subprocess.Popen(command, cwd=directory, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                               start_new_session=True)
+    if "stop" in spec:
+        process.wait()  # the daemon forks away; the process started here exits at once
+    waitForServer(port)
+    return process
+
+def stopServer(name, process, directory):
+    spec = SERVERS[name]
+    if "stop" in spec:
+        subprocess.run(serverCommand(spec["stop"]), cwd=directory, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        return
+    os.killpg(process.pid, signal.SIGTERM)
+    process.wait()
+
+def runClient(task):
+    # one client process: back-to-back requests until the deadline, latencies after the warm-up
+    port, request, measureFrom, deadline = task
+    latencies = []
+    errors = 0
+    while True:
+        started = time.time()
+        if started >= deadline:
+            break
+        try:
+            sendRequest(port, request)
+        except OSError:
+            errors += 1
+            continue
+        if started >= measureFrom:
+            latencies.append(time.time() - started)
+    return latencies, errors
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+def macroBenchmark(name, request, concurrency, duration):
+    directory = tempfile.mkdtemp(prefix=f"benchmark-{name}-")
+    port = freePort()
+    process = startServer(name, port, directory)
+    try:
+        measureFrom = time.time() + WARM_UP
+        deadline = measureFrom + duration
+        with multiprocessing.Pool(concurrency) as pool:
+            replies = pool.map(runClient, [(port, request.encode(), measureFrom, deadline)] * concurrency)
+    finally:
+        stopServer(name, process, directory)
+    latencies = sorted(latency for clientLatencies, _ in replies for latency in clientLatencies)
+    errors = sum(clientErrors for _, clientErrors in replies)
+    prefix = f"macro/{name}/{request}/c{concurrency}"
+    return {
+        f"{prefix}/throughput": result(len(latencies) / duration, "requests/s"),
+        f"{prefix}/p50": result(percentile(latencies, 0.50) * 1000, "ms", higherIsBetter=False),
+        f"{prefix}/p99": result(percentile(latencies, 0.99) * 1000, "ms", higherIsBetter=False),
+        f"{prefix}/errors": result(errors, "requests", higherIsBetter=False),
+    }
+
+def compareResults(results, baseline, threshold):
+    # names whose value moved the wrong way by more than threshold
+    regressions = []
+    for name, current in results.items():
+        known = baseline.get(name)
+        if not known:
+            continue
+        if not known["value"]:
+            # errors that were not there before
+            if not current["higherIsBetter"] and current["value"] > 0:
+                regressions.append((name, 0, current["value"], current["unit"], float("inf")))
+            continue
+        change = (current["value"] - known["value"]) / known["value"]
+        if (change < -threshold) if current["higherIsBetter"] else (change > threshold):
+            regressions.append((name, known["value"], current["value"], current["unit"], change))
+    return regressions
+
+def formatValue(value):
+    return f"{value:.4g}" if value < 1000 else f"{value:.0f}"
+
+def main():
+    parser = argparse.ArgumentParser(description="Lottery Benchmarks")
+    parser.add_argument("--micro", action="store_true", help="Run the micro benchmarks only")
+    parser.add_argument("--macro", action="store_true", help="Run the server benchmarks only")
+    parser.add_argument("-m", "--milestones", type=int, nargs="+", choices=sorted(GENERATOR_MODULES), default=sorted(GENERATOR_MODULES), help="Milestones of the micro benchmarks (default is all)")
+    parser.add_argument("-t", "--tickets", nargs="+", choices=["max", "6/49", "daily"], default=["max", "6/49", "daily"], help="Ticket types of the micro benchmarks (default is all)")
+    parser.add_argument("-q", "--quantities", type=int, nargs="+", default=[1, 100, 10000], help="Tickets per call of the micro benchmarks (default is 1 100 10000)")
+    parser.add_argument("-s", "--servers", nargs="+", choices=list(SERVERS), default=["milestone1", "milestone2", "milestone3"], help="Servers of the macro benchmarks (default is milestone1 milestone2 milestone3)")
+    parser.add_argument("-r", "--requests", nargs="+", default=["max,1", "6/49,1000"], help="Text requests sent to every server (default is max,1 6/49,1000)")
+    parser.add_argument("-c", "--concurrency", type=int, default=4, help="Clients sending requests at the same time (default is 4)")
+    parser.add_argument("-d", "--duration", type=float, default=5.0, help="Seconds every server scenario is measured (default is 5)")
+    parser.add_argument("-o", "--output", type=str, default="benchmark-results.json", help="Results JSON file (default is benchmark-results.json)")
+    parser.add_argument("--baseline", type=str, default=BASELINE_FILE, help="Results JSON to compare with (default is benchmarks/baseline.json)")
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the baseline")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Slowdown reported as a regression (default is 0.1)")
+    args = parser.parse_args()
+
+    if args.concurrency < 1 or args.duration <= 0 or min(args.quantities) < 1:
+        parser.error("--concurrency, --duration and --quantities must be positive")
+    runMicro = args.micro or not args.macro
+    runMacro = args.macro or not args.micro
+
+    results = {}
+    try:
+        if runMicro:
+            for milestone in args.milestones:
+                for name, value in runIsolated(microBenchmarks, milestone, args.tickets, args.quantities).items():
+                    results[name] = value
+                    print(f"{name}: {formatValue(value['value'])} {value['unit']}")
+        if runMacro:
+            for name in args.servers:
+                for request in args.requests:
+                    for key, value in macroBenchmark(name, request, args.concurrency, args.duration).items():
+                        results[key] = value
+                        print(f"{key}: {formatValue(value['value'])} {value['unit']}")
+    except (OSError, RuntimeError) as e:
+        print(f"Error: {str(e)}")
+        sys.exit(2)
+
+    report = {"version": RESULTS_VERSION, "machine": machineInfo(), "results": results}
+    with open(args.output, "w") as resultsFile:
+        json.dump(report, resultsFile, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as baselineFile:
+            json.dump(report, baselineFile, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        return
+    with open(args.baseline, "r") as baselineFile:
+        baseline = json.load(baselineFile)
+    for key in ("processor", "cpus", "python"):
+        if baseline["machine"].get(key) != report["machine"].get(key):
+            print(f"Warning: the baseline was measured with {key} {baseline['machine'].get(key)}, this run with {report['machine'].get(key)}")
+    regressions = compareResults(results, baseline["results"], args.threshold)
+    print(f"Regressions against {args.baseline} (threshold {args.threshold:.0%}): {len(regressions) or 'none'}")
+    for name, known, current, unit, change in regressions:
+        print(f"{name}: {formatValue(known)} -> {formatValue(current)} {unit}" + (f" ({change:+.1%})" if known else ""))
+    if regressions:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+#!/usr/bin/python3
+
+"""
+==============================================================================
+   Assignment:  Milestone 0
+
+  Author:  Fatemeh Zahedi
+  Language:  Python3 (argparse, random, multiprocessing library)
+  To Compile:  n/a
+
+  Class:  Python for Programmers: Sockets and Security - DPI912NSA
+  Professor:  Harvey Kaduri
+
+-----------------------------------------------------------------------------
+
+  Description:  This script estimates how often a ticket hits every prize tier (Max, 6/49, and Daily Grand)
+                by checking batches of generated tickets against simulated winning draws.
+
+  Collaboration:  -
+
+  Input: ./LotterySimulator.py -t <ticket> -n <tickets> [-b <batch>] [-d <draws>] [-P <processes>] [-c <checkpoint>] [--resume]
+          -t, --ticket       : The type of lottery ticket to simulate.
+          -n, --tickets      : Total ticket/draw pairs to simulate.
+          -b, --batch        : Tickets generated per round (default is 100000).
+          -d, --draws        : Winning draws checked against every batch (default is 1).
+          -P, --processes    : Worker processes (default is the CPU count).
+          -c, --checkpoint   : Save the totals to this file while running and when interrupted.
+          --resume           : Continue the run saved in the checkpoint file.
+
+  Output:  The running totals are printed every few seconds and once at the end:
+              *** LOTTO 6/49: 2000000 tickets simulated, 412000 tickets/s ***
+              6 matched: 0 (0 to 1.92e-06, exact 7.15e-08)
+              3 matched: 35187 (0.01742 to 0.01777, exact 0.01765)
+
+  Algorithm:  Every round draws one batch of tickets with the generator of LotteryTicketGenerator.py,
+              draws the winning numbers and counts the matches of the whole batch at once.
+              Rounds run in a process pool, every round with its own seed derived from the run seed,
+              so a resumed run continues with new rounds. Each tier is reported with a 95% Wilson
+              confidence interval next to its exact hypergeometric probability.
+
+  Required Features Not Included:  -
+
+  Known Bugs:  -
+
+  Classification: -
+
+==============================================================================
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+from LotteryTicketGenerator import LotteryTicketGenerator
+
+REPORT_INTERVAL = 5.0  # seconds between running reports
+CHECKPOINT_INTERVAL = 30.0  # seconds between checkpoint saves
+CONFIDENCE_Z = 1.96  # 95% confidence intervals
+
+class DrawChecker:
+    # counts the matches of every ticket against one winning draw, one set of numbers per ticket set
+    def __init__(self, winningSets):
+        self.winningSets = winningSets
+        self.numbersPerTicket = [len(winningSet) for winningSet in winningSets]
+        self.rowLength = sum(self.numbersPerTicket)
+        # bytes.translate tables: 1 for a winning number of the set, 0 for anything else
+        self.tables = [bytes(number in winningSet for number in range(256)) for winningSet in winningSets]
+        # a ticket's tier is its match count per set in mixed radix, one byte per ticket
+        self.weights = []
+        weight = 1
+        for length in reversed(self.numbersPerTicket):
+            self.weights.insert(0, weight)
+            weight *= length + 1
+        if weight > 256:
+            raise ValueError("too many prize tiers for one byte per ticket")
+        self.tierCounts = [0] * weight
+        self.checked = 0
+
+    def check(self, numbers):
+        # numbers holds whole rows; the columns of all rows are matched at once, one byte per ticket
+        numbers = bytes(numbers)
+        rowLength = self.rowLength
+        rows = len(numbers) // rowLength
+        if not rows:
+            return
+        tiers = 0
+        position = 0
+        for length, table, weight in zip(self.numbersPerTicket, self.tables, self.weights):
+            matches = 0
+            for column in range(position, position + length):
+                matches += int.from_bytes(numbers[column::rowLength].translate(table), "big")
+            tiers += matches * weight
+            position += length
+        tierBytes = tiers.to_bytes(rows, "big")
+        for tier in range(len(self.tierCounts)):
+            self.tierCounts[tier] += tierBytes.count(tier)
+        self.checked += rows
+
+def roundSeed(runSeed, roundNumber):
+    # independent seed of one round, the same whichever process or run draws it
+    return int.from_bytes(hashlib.sha256(f"{runSeed}/{roundNumber}".encode()).digest(), "big")
+
+def simulateRound(task):
+    # one batch of tickets checked against draws winning draws; returns the tier counts
+    ticketTypeKey, runSeed, roundNumber, batchSize, draws = task
+    generator = LotteryTicketGenerator()
+    typeOfTicket = generator.lottoTicketTypes[ticketTypeKey]
+    random.seed(roundSeed(runSeed, roundNumber))
+    tickets = generator.generateTicketBatch(batchSize, typeOfTicket)
+    counts = None
+    for _ in range(draws):
+        winningSets = [random.sample(range(1, typeOfTicket.numbersRange), length)
+                       for length in typeOfTicket.numbersPerTicket]
+        checker = DrawChecker(winningSets)
+        checker.check(tickets.numbers)
+        if counts is None:
+            counts = checker.tierCounts
+        else:
+            counts = [known + count for known, count in zip(counts, checker.tierCounts)]
+    return counts
+
+def exactOdds(typeOfTicket, matches):
+    # hypergeometric probability of matching matches[i] numbers of every set
+    poolSize = typeOfTicket.numbersRange - 1
+    probability = 1.0
+    for length, matched in zip(typeOfTicket.numbersPerTicket, matches):
+        probability *= math.comb(length, matched) * math.comb(poolSize - length, length - matched) / math.comb(poolSize, length)
+    return probability
+
+def wilsonInterval(hits, trials, z=CONFIDENCE_Z):
+    # stays meaningful for tiers that have not been hit yet, unlike p +- z * sqrt(p(1-p)/n)
+    if not trials:
+        return 0.0, 1.0
+    p = hits / trials
+    denominator = 1 + z * z / trials
+    centre = (p + z * z / (2 * trials)) / denominator
+    spread = z * math.sqrt(p * (1 - p) / trials + z * z / (4 * trials * trials)) / denominator
+    return max(0.0, centre - spread), min(1.0, centre + spread)
+
+def tierMatches(tier, numbersPerTicket):
+    # tier index -> matches per set, as DrawChecker numbers them
+    matches = []
+    for length in reversed(numbersPerTicket):
+        tier, matched = divmod(tier, length + 1)
+        matches.insert(0, matched)
+    return matches
+
+def printReport(typeOfTicket, state, elapsed):
+    trials = state["trials"]
+    rate = (trials - state["resumedTrials"]) / elapsed if elapsed > 0 else 0
+    print(f"*** {typeOfTicket.ticketType}: {trials} tickets simulated, {rate:.0f} tickets/s ***")
+    tiers = sorted(enumerate(state["tierCounts"]), key=lambda item: tierMatches(item[0], typeOfTicket.numbersPerTicket), reverse=True)
+    for tier, hits in tiers:
+        matches = tierMatches(tier, typeOfTicket.numbersPerTicket)
+        low, high = wilsonInterval(hits, trials)
+        print(f"{' + '.join(map(str, matches))} matched: {hits} ({low:.3g} to {high:.3g}, exact {exactOdds(typeOfTicket, matches):.3g})")
+    sys.stdout.flush()
+
+def saveCheckpoint(path, state):
+    # write then rename, so an interrupted save never leaves a broken checkpoint
+    temporaryPath = path + ".tmp"
+    with open(temporaryPath, "w") as checkpointFile:
+        json.dump({key: value for key, value in state.items() if key != "resumedTrials"}, checkpointFile)
+        checkpointFile.flush()
+        os.fsync(checkpointFile.fileno())
+    os.replace(temporaryPath, path)
+
+def loadCheckpoint(path, ticketTypeKey, batchSize, draws):
+    with open(path, "r") as checkpointFile:
+        state = json.load(checkpointFile)
+    if (state["ticketType"], state["batchSize"], state["draws"]) != (ticketTypeKey, batchSize, draws):
+        raise ValueError(f"{path} is a run of {state['ticketType']} with batches of {state['batchSize']} and {state['draws']} draws")
+    return state
+
+def simulate(ticketTypeKey, total, batchSize, draws, processes, checkpoint=None, resume=False, seed=None):
+    generator = LotteryTicketGenerator()
+    typeOfTicket = generator.lottoTicketTypes[ticketTypeKey]
+    if resume:
+        state = loadCheckpoint(checkpoint, ticketTypeKey, batchSize, draws)
+    else:
+        tiers = math.prod(length + 1 for length in typeOfTicket.numbersPerTicket)
+        state = {"ticketType": ticketTypeKey, "batchSize": batchSize, "draws": draws,
+                 "seed": seed if seed is not None else int.from_bytes(os.urandom(16), "big"),
+                 "nextRound": 0, "trials": 0, "tierCounts": [0] * tiers}
+    state["resumedTrials"] = state["trials"]
+
+    perRound = batchSize * draws
+    rounds = max(0, -(-(total - state["trials"]) // perRound))
+    tasks = ((ticketTypeKey, state["seed"], roundNumber, batchSize, draws)
+             for roundNumber in range(state["nextRound"], state["nextRound"] + rounds))
+
+    started = time.monotonic()
+    lastReport = lastCheckpoint = started
+    pool = multiprocessing.Pool(processes)
+    try:
+        # imap keeps round order, so nextRound is always the first round not counted yet
+        for counts in pool.imap(simulateRound, tasks):
+            state["tierCounts"] = [known + count for known, count in zip(state["tierCounts"], counts)]
+            state["trials"] += perRound
+            state["nextRound"] += 1
+            now = time.monotonic()
+            if now - lastReport >= REPORT_INTERVAL:
+                printReport(typeOfTicket, state, now - started)
+                lastReport = now
+            if checkpoint and now - lastCheckpoint >= CHECKPOINT_INTERVAL:
+                saveCheckpoint(checkpoint, state)
+                lastCheckpoint = now
+        pool.close()
+    except KeyboardInterrupt:
+        pool.terminate()
+        print("Interrupted." + (f" Resume with --resume -c {checkpoint}" if checkpoint else ""))
+    finally:
+        pool.join()
+        if checkpoint:
+            saveCheckpoint(checkpoint, state)
+    printReport(typeOfTicket, state, time.monotonic() - started)
+    return state
+
+def main():
+    parser = argparse.ArgumentParser(description="Lottery Odds Simulator")
+    parser.add_argument("-t", "--ticket", type=str, choices=["max", "6/49", "daily"], required=True,
+                        help="Lottery Ticket types: LOTTO MAX (max), LOTTO 6/49 (6/49), DAILY GRAND (daily)")
+    parser.add_argument("-n", "--tickets", type=int, default=10000000,
+                        help="Ticket/draw pairs to simulate (default is 10000000)")
+    parser.add_argument("-b", "--batch", type=int, default=100000,
+                        help="Tickets generated per round (default is 100000)")
+    parser.add_argument("-d", "--draws", type=int, default=1,
+                        help="Winning draws checked against every batch; more draws reuse tickets for speed (default is 1)")
+    parser.add_argument("-P", "--processes", type=int, default=os.cpu_count() or 1,
+                        help="Worker processes (default is the CPU count)")
+    parser.add_argument("-c", "--checkpoint", type=str, help="Checkpoint file to save and resume the run")
+    parser.add_argument("--resume", action="store_true", help="Continue the run saved in the checkpoint file")
+    parser.add_argument("-s", "--seed", type=int, help="Run seed (default is random)")
+    args = parser.parse_args()
+
+    if args.resume and not args.checkpoint:
+        parser.error("--resume needs -c/--checkpoint")
+    if args.tickets < 1 or args.batch < 1 or args.draws < 1 or args.processes < 1:
+        parser.error("--tickets, --batch, --draws and --processes must be positive")
+
+    try:
+        simulate(args.ticket, args.tickets, args.batch, args.draws, args.processes, args.checkpoint, args.resume, args.seed)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Error: {str(e)}")
+
+if __name__ == "__main__":
+    main()
@@ -19,9 +19,12 @@
 
   Collaboration:  -
 
-  Input: ./LotteryTicketGenerator.py -t <ticket> -q <quantity>
+  Input: ./LotteryTicketGenerator.py -t <ticket> -q <quantity> [-d shuffle|rank] [-f text|ranks]
           -t, --ticket   : The type of lottery ticket to generate.
           -q, --quantity      : The number of tickets to generate.
+          -d, --draw     : Draw number by number (default) or one uniform combination rank per ticket.
+          -f, --format   : Save the tickets as text (default) or as packed ranks to "Generated Tickets.ranks"
+                           (the ticket type key on the first line, then one big endian rank per ticket).
 
   Output:  The user passes the ticket type and number of tickets, and the script generates random tickets, shows the numbers for each ticket and save them to "Generated Tickets.txt" file.
               *** LOTTO 6/49 Ticket(s) ***
@@ -42,12 +45,56 @@
 import argparse
 import random
 
+from ticketcodec import TicketCodec
+
 class LotteryTicket:
     def __init__(self, ticketType, numbersPerTicket, numbersRange):
         self.ticketType = ticketType
         self.numbersPerTicket = numbersPerTicket
         self.numbersRange = numbersRange
 
+class TicketBatch:
+    # compact ticket container: one contiguous uint8 buffer shaped
+    # quantity x rowLength, where rowLength = sum(numbersPerTicket)
+    __slots__ = ("numbers", "quantity", "numbersPerTicket", "rowLength")
+
+    def __init__(self, numbers, numbersPerTicket):
+        self.numbers = numbers
+        self.numbersPerTicket = numbersPerTicket
+        self.rowLength = sum(numbersPerTicket)
+        self.quantity = len(numbers) // self.rowLength if self.rowLength else 0
+
+    def __len__(self):
+        return self.quantity
+
+    def __getitem__(self, index):
+        # numbers of one ticket as a zero-copy view
+        if index < 0:
+            index += self.quantity
+        if not 0 <= index < self.quantity:
+            raise IndexError("ticket index out of range")
+        start = index * self.rowLength
+        return self.view()[start:start + self.rowLength]
+
+    def __iter__(self):
+        numbers = self.view()
+        rowLength = self.rowLength
+        for start in range(0, self.quantity * rowLength, rowLength):
+            yield numbers[start:start + rowLength]
+
+    def view(self):
+        return memoryview(self.numbers)
+
+    def ticketSets(self, index):
+        # split one ticket back into its sets of numbers
+        ticket = self[index]
+        sets = []
+        position = 0
+        for length in self.numbersPerTicket:
+            sets.append(ticket[position:position + length])
+            position += length
+        return sets
+
 class LotteryTicketGenerator:
     def __init__(self):
         self.lottoTicketTypes = {
@@ -56,24 +103,51 @@ class LotteryTicketGenerator:
             "daily": LotteryTicket("DAILY GRAND", [5], 49)
         }
 
+    def generateTicketBatch(self, quantityOfTicket, typeOfTicket):
+        # draw every ticket of the request into one flat byte matrix
+        # (quantityOfTicket rows of sum(numbersPerTicket) numbers each)
+        ticketPool = bytearray(range(1, typeOfTicket.numbersRange))
+        poolSize = len(ticketPool)
+        # partial Fisher-Yates: (position, remaining width) for every draw of a ticket
+        drawSteps = []
+        for length in typeOfTicket.numbersPerTicket:
+            if length > poolSize:
+                raise ValueError(f"cannot draw {length} numbers from a pool of {poolSize}")
+            drawSteps.append([(j, poolSize - j) for j in range(length)])
+        rowLength = sum(typeOfTicket.numbersPerTicket)
+        numbers = bytearray(quantityOfTicket * rowLength)
+        draw = random.random
+        position = 0
+        for _ in range(quantityOfTicket):
+            for steps in drawSteps:
+                # every set is drawn from a fresh copy of the pool
+                pool = ticketPool[:]
+                for j, width in steps:
+                    randomIndex = j + int(draw() * width)
+                    pool[j], pool[randomIndex] = pool[randomIndex], pool[j]
+                length = len(steps)
+                numbers[position:position + length] = pool[:length]
+                position += length
+        return TicketBatch(numbers, typeOfTicket.numbersPerTicket)
+
+    def generateRankBatch(self, quantityOfTicket, typeOfTicket):
+        # one uniform combination rank per ticket, decoded with every set in ascending order
+        codec = TicketCodec(typeOfTicket.numbersPerTicket, typeOfTicket.numbersRange - 1)
+        ranks = [random.randrange(codec.combinations) for _ in range(quantityOfTicket)]
+        return TicketBatch(codec.decodeBatch(ranks), typeOfTicket.numbersPerTicket)
+
+    def generateTicketChunks(self, quantityOfTicket, typeOfTicket, chunkSize):
+        # lazily draw a large request as a sequence of smaller batches
+        for start in range(0, quantityOfTicket, chunkSize):
+            yield self.generateTicketBatch(min(chunkSize, quantityOfTicket - start), typeOfTicket)
+
     def generateTickets(self, quantityOfTicket, typeOfTicket):
         # store generated tickets
+        batch = self.generateTicketBatch(quantityOfTicket, typeOfTicket)
         tickets = []
-        for _ in range(quantityOfTicket):
+        for index in range(len(batch)):
             # store generated ticket
-            ticket = []
-            # for how many numbers per ticket
-            for length in typeOfTicket.numbersPerTicket:
-                # store numbers within a set
-                ticketSet = []
-                ticketPool = list(range(1, typeOfTicket.numbersRange))
-                remainingPool = len(ticketPool) - 1 if ticketPool else None
-                for _ in range(length):
-                    if ticketPool:
-                        randomIndex = random.randint(0, remainingPool)
-                        ticketSet.append(ticketPool.pop(randomIndex))
-                        remainingPool -= 1
-                ticket.append(ticketSet)
+            ticket = [list(ticketSet) for ticketSet in batch.ticketSets(index)]
             tickets.append(ticket)
         return tickets
 
@@ -86,6 +160,10 @@ def main():
                         help="Lottery Ticket types: LOTTO MAX (max), LOTTO 6/49 (6/49), DAILY GRAND (daily)")
     parser.add_argument("-q", "--quantity", type=int, default=1,
                         help="Number of tickets (default is 1 ticket)")
+    parser.add_argument("-d", "--draw", choices=["shuffle", "rank"], default="shuffle",
+                        help="Draw number by number or one uniform combination rank per ticket (default is shuffle)")
+    parser.add_argument("-f", "--format", choices=["text", "ranks"], default="text",
+                        help="Save as text to 'Generated Tickets.txt' or as packed ranks to 'Generated Tickets.ranks' (default is text)")
     
     # parse the arguments
     args = parser.parse_args()
@@ -104,17 +182,30 @@ def main():
 
     # display generated tickets based on ticket type to the STDOUT and save to the file
     try:
-        tickets = generator.generateTickets(quantity, generator.lottoTicketTypes[ticketTypeKey])
-
-        with open("Generated Tickets.txt", 'w') as file:
-            file.write(f"*** {generator.lottoTicketTypes[ticketTypeKey].ticketType} Ticket(s) ***\n")
-            for i, ticket in enumerate(tickets, 1):
-                file.write(f"{i}. {', '.join(map(str, ticket[0]))}\n")
-
-        print(f"Tickets generated and saved to 'Generated Tickets.txt'")
+        typeOfTicket = generator.lottoTicketTypes[ticketTypeKey]
+        if args.draw == "rank":
+            tickets = generator.generateRankBatch(quantity, typeOfTicket)
+        else:
+            tickets = generator.generateTicketBatch(quantity, typeOfTicket)
+
+        if args.format == "ranks":
+            # about half the size of the numbers themselves, a fraction of the text
+            codec = TicketCodec(typeOfTicket.numbersPerTicket, typeOfTicket.numbersRange - 1)
+            fileName = "Generated Tickets.ranks"
+            with open(fileName, 'wb') as file:
+                file.write(f"{ticketTypeKey}\n".encode())
+                file.write(codec.packRanks(codec.encodeBatch(tickets.numbers)))
+        else:
+            fileName = "Generated Tickets.txt"
+            with open(fileName, 'w') as file:
+                file.write(f"*** {typeOfTicket.ticketType} Ticket(s) ***\n")
+                for i, ticket in enumerate(tickets, 1):
+                    file.write(f"{i}. {', '.join(map(str, ticket))}\n")
+
+        print(f"Tickets generated and saved to '{fileName}'")
         print(f"*** {generator.lottoTicketTypes[ticketTypeKey].ticketType} Ticket(s) ***")
         for i, ticket in enumerate(tickets, 1):
-            print(f"{i}. {', '.join(map(str, ticket[0]))}")
+            print(f"{i}. {', '.join(map(str, ticket))}")
     except ValueError as e:
         print(f"Error: {str(e)}")
 
@@ -0,0 +1,144 @@
+#!/usr/bin/python3
+
+# ==============================================================================
+#   Assignment:  Milestone 0
+#
+#   Author:  Fatemeh Zahedi
+#   Language:  Python3 (math, bisect library)
+#   To Compile:  -
+#
+#   Class:  Python for Programmers: Sockets and Security - DPI912NSA
+#   Professor:  Harvey Kaduri
+#
+# -----------------------------------------------------------------------------
+#
+#   Description: Maps lottery tickets to and from their combination rank, one integer per ticket.
+#
+#   Rank:  A set of k numbers drawn from 1..n is ranked among all C(n, k) such sets in lexicographic
+#          order, ignoring the order the numbers were drawn in. A ticket of several sets combines
+#          the rank of every set in mixed radix, so ranks run from 0 to combinations - 1.
+#          Packed ranks are big endian integers of rankBytes bytes each.
+#
+#   Algorithm: Ranking sums precomputed binomial coefficients (the combinatorial number system).
+#              Unranking walks the same coefficients back with one binary search per number.
+# ==============================================================================
+
+import bisect
+import itertools
+import math
+
+class TicketCodec:
+    # ranks the tickets of one type: one set of numbers from 1..poolSize per entry of numbersPerTicket
+    def __init__(self, numbersPerTicket, poolSize):
+        if not numbersPerTicket or not all(1 <= length <= poolSize for length in numbersPerTicket):
+            raise ValueError(f"set sizes must be from 1 to {poolSize}")
+        self.numbersPerTicket = numbersPerTicket
+        self.poolSize = poolSize
+        self.rowLength = sum(numbersPerTicket)
+        self.setCombinations = [math.comb(poolSize, length) for length in numbersPerTicket]
+        self.combinations = math.prod(self.setCombinations)
+        self.rankBytes = max(1, ((self.combinations - 1).bit_length() + 7) // 8)
+        # lexicographic rank of sorted numbers v1 < ... < vk: C(n, k) - 1 - sum of C(n - vi, k - i)
+        self.rankTerms = [[[math.comb(poolSize - number, length - i) for number in range(poolSize + 1)]
+                           for i in range(length)] for length in numbersPerTicket]
+        # the same sum read backwards: C(c, j) for every c, searched once per number
+        self.unrankColumns = {length: [[math.comb(c, j) for c in range(poolSize)] for j in range(length + 1)]
+                              for length in set(numbersPerTicket)}
+
+    def encode(self, ticket):
+        # rank of one flat row of numbers, set after set
+        rank = 0
+        position = 0
+        for length, count, terms in zip(self.numbersPerTicket, self.setCombinations, self.rankTerms):
+            setRank = count - 1
+            for column, number in zip(terms, sorted(ticket[position:position + length])):
+                setRank -= column[number]
+            rank = rank * count + setRank
+            position += length
+        return rank
+
+    def encodeSets(self, ticketSets):
+        # rank of one ticket as generateTickets returns it: a list of sets
+        return self.encode(list(itertools.chain.from_iterable(ticketSets)))
+
+    def decode(self, rank):
+        # flat row of the ticket with this rank, every set in ascending order
+        if not 0 <= rank < self.combinations:
+            raise ValueError(f"rank must be from 0 to {self.combinations - 1}")
+        setRanks = []
+        for count in reversed(self.setCombinations):
+            rank, setRank = divmod(rank, count)
+            setRanks.append(setRank)
+        row = bytearray()
+        for length, count, setRank in zip(self.numbersPerTicket, self.setCombinations, reversed(setRanks)):
+            row += self.decodeSet(length, count - 1 - setRank)
+        return bytes(row)
+
+    def decodeSet(self, length, remainder):
+        # greedy combinatorial number system: the largest c with C(c, j) <= remainder, for j = length .. 1
+        columns = self.unrankColumns[length]
+        numbers = bytearray(length)
+        for i in range(length):
+            column = columns[length - i]
+            c = bisect.bisect_right(column, remainder) - 1
+            remainder -= column[c]
+            numbers[i] = self.poolSize - c
+        return numbers
+
+    def decodeSets(self, rank):
+        row = self.decode(rank)
+        sets = []
+        position = 0
+        for length in self.numbersPerTicket:
+            sets.append(list(row[position:position + length]))
+            position += length
+        return sets
+
+    def encodeBatch(self, numbers):
+        # ranks of every row of a flat buffer such as TicketBatch.numbers
+        view = memoryview(numbers)
+        rowLength = self.rowLength
+        if len(self.numbersPerTicket) > 1:
+            return [self.encode(view[start:start + rowLength]) for start in range(0, len(view), rowLength)]
+        # single set tickets: skip the mixed radix loop
+        base = self.combinations - 1
+        terms = self.rankTerms[0]
+        return [base - sum([column[number] for column, number in zip(terms, sorted(view[start:start + rowLength]))])
+                for start in range(0, len(view), rowLength)]
+
+    def decodeBatch(self, ranks):
+        # flat buffer of the tickets with these ranks, ready for a TicketBatch
+        numbers = bytearray()
+        if len(self.numbersPerTicket) > 1:
+            for rank in ranks:
+                numbers += self.decode(rank)
+            return numbers
+        length = self.numbersPerTicket[0]
+        base = self.combinations - 1
+        decodeSet = self.decodeSet
+        for rank in ranks:
+            if not 0 <= rank <= base:
+                raise ValueError(f"rank must be from 0 to {base}")
+            numbers += decodeSet(length, base - rank)
+        return numbers
+
+    def packRanks(self, ranks):
+        rankBytes = self.rankBytes
+        return b"".join([rank.to_bytes(rankBytes, "big") for rank in ranks])
+
+    def unpackRanks(self, data):
+        rankBytes = self.rankBytes
+        if len(data) % rankBytes:
+            raise ValueError(f"packed ranks must be a multiple of {rankBytes} bytes")
+        return [int.from_bytes(data[start:start + rankBytes], "big") for start in range(0, len(data), rankBytes)]
+
+    def everyTicket(self, sets=0):
+        # every ticket in rank order as bytes; itertools.product would hold all combinations in memory
+        combinations = itertools.combinations(range(1, self.poolSize + 1), self.numbersPerTicket[sets])
+        if sets == len(self.numbersPerTicket) - 1:
+            yield from map(bytes, combinations)
+            return
+        for numbers in combinations:
+            head = bytes(numbers)
+            for rest in self.everyTicket(sets + 1):
+                yield head + rest
@@ -58,9 +58,16 @@ def requestTickets(host, port, ticketType, quantity, identifier):
         print(f"Connected to [{host}]:{port}")
 
         request = f"{ticketType},{quantity}"
-        clientSocket.send(request.encode())
+        clientSocket.sendall(request.encode())
 
-        response = clientSocket.recv(1024).decode()
+        # the reply ends when the server closes the connection
+        response = bytearray()
+        while True:
+            chunk = clientSocket.recv(65536)
+            if not chunk:
+                break
+            response += chunk
+        response = response.decode()
         print(response)
 
         if identifier:
@@ -46,12 +46,56 @@ import argparse
 import random
 import socket
 
+TICKET_CHUNK_SIZE = 4096  # tickets generated and sent per chunk
+
 class LotteryTicket:
     def __init__(self, ticketType, numbersPerTicket, numbersRange):
         self.ticketType = ticketType
         self.numbersPerTicket = numbersPerTicket
         self.numbersRange = numbersRange
 
+class TicketBatch:
+    # compact ticket container: one contiguous uint8 buffer shaped
+    # quantity x rowLength, where rowLength = sum(numbersPerTicket)
+    __slots__ = ("numbers", "quantity", "numbersPerTicket", "rowLength")
+
+    def __init__(self, numbers, numbersPerTicket):
+        self.numbers = numbers
+        self.numbersPerTicket = numbersPerTicket
+        self.rowLength = sum(numbersPerTicket)
+        self.quantity = len(numbers) // self.rowLength if self.rowLength else 0
+
+    def __len__(self):
+        return self.quantity
+
+    def __getitem__(self, index):
+        # numbers of one ticket as a zero-copy view
+        if index < 0:
+            index += self.quantity
+        if not 0 <= index < self.quantity:
+            raise IndexError("ticket index out of range")
+        start = index * self.rowLength
+        return self.view()[start:start + self.rowLength]
+
+    def __iter__(self):
+        numbers = self.view()
+        rowLength = self.rowLength
+        for start in range(0, self.quantity * rowLength, rowLength):
+            yield numbers[start:start + rowLength]
+
+    def view(self):
+        return memoryview(self.numbers)
+
+    def ticketSets(self, index):
+        # split one ticket back into its sets of numbers
+        ticket = self[index]
+        sets = []
+        position = 0
+        for length in self.numbersPerTicket:
+            sets.append(ticket[position:position + length])
+            position += length
+        return sets
+
 class LotteryTicketGenerator:
     def __init__(self):
         self.lottoTicketTypes = {
@@ -60,38 +104,69 @@ class LotteryTicketGenerator:
             "daily": LotteryTicket("DAILY GRAND", [5], 49)
     }
     
+    def generateTicketBatch(self, quantityOfTicket, typeOfTicket):
+        # draw every ticket of the request into one flat byte matrix
+        # (quantityOfTicket rows of sum(numbersPerTicket) numbers each)
+        ticketPool = bytearray(range(1, typeOfTicket.numbersRange))
+        poolSize = len(ticketPool)
+        # partial Fisher-Yates: (position, remaining width) for every draw of a ticket
+        drawSteps = []
+        for length in typeOfTicket.numbersPerTicket:
+            if length > poolSize:
+                raise ValueError(f"cannot draw {length} numbers from a pool of {poolSize}")
+            drawSteps.append([(j, poolSize - j) for j in range(length)])
+        rowLength = sum(typeOfTicket.numbersPerTicket)
+        numbers = bytearray(quantityOfTicket * rowLength)
+        draw = random.random
+        position = 0
+        for _ in range(quantityOfTicket):
+            for steps in drawSteps:
+                # every set is drawn from a fresh copy of the pool
+                pool = ticketPool[:]
+                for j, width in steps:
+                    randomIndex = j + int(draw() * width)
+                    pool[j], pool[randomIndex] = pool[randomIndex], pool[j]
+                length = len(steps)
+                numbers[position:position + length] = pool[:length]
+                position += length
+        return TicketBatch(numbers, typeOfTicket.numbersPerTicket)
+
+    def generateTicketChunks(self, quantityOfTicket, typeOfTicket, chunkSize):
+        # lazily draw a large request as a sequence of smaller batches
+        for start in range(0, quantityOfTicket, chunkSize):
+            yield self.generateTicketBatch(min(chunkSize, quantityOfTicket - start), typeOfTicket)
+
     def generateTickets(self, quantityOfTicket, typeOfTicket):
+        # store generated tickets
+        batch = self.generateTicketBatch(quantityOfTicket, typeOfTicket)
         tickets = []
-        for _ in range(quantityOfTicket):
-            ticket = []
-            for length in typeOfTicket.numbersPerTicket:
-                ticketSet = []
-                ticketPool = list(range(1, typeOfTicket.numbersRange))
-                remainingPool = len(ticketPool) - 1 if ticketPool else None
-                for _ in range(length):
-                    if ticketPool:
-                        randomIndex = random.randint(0, remainingPool)
-                        ticketSet.append(ticketPool.pop(randomIndex))
-                        remainingPool -= 1
-                ticket.append(ticketSet)
+        for index in range(len(batch)):
+            # store generated ticket
+            ticket = [list(ticketSet) for ticketSet in batch.ticketSets(index)]
             tickets.append(ticket)
         return tickets
 
+def formatTickets(tickets, firstNumber):
+    return "".join([f"{i}. {', '.join(map(str, ticket))}\n" for i, ticket in enumerate(tickets, firstNumber)])
+
+def streamTickets(generator, ticketType, quantity):
+    # generate and format the reply one chunk at a time so memory stays flat
+    typeOfTicket = generator.lottoTicketTypes[ticketType]
+    firstNumber = 1
+    for tickets in generator.generateTicketChunks(quantity, typeOfTicket, TICKET_CHUNK_SIZE):
+        yield formatTickets(tickets, firstNumber).encode()
+        firstNumber += len(tickets)
+
 def processClientRequest(clientSocket, addr, ticketType, quantity):
     generator = LotteryTicketGenerator()
     
     try:
-        tickets = generator.generateTickets(quantity, generator.lottoTicketTypes[ticketType])
-        
-        processedTickets = ""
-        for i, ticket in enumerate(tickets, 1):
-            processedTickets += f"{i}. {', '.join(map(str, ticket[0]))}\n"
-        
-        clientSocket.send(processedTickets.encode())
+        for chunk in streamTickets(generator, ticketType, quantity):
+            clientSocket.sendall(chunk)
     
     except (ValueError, KeyError) as e:
         errorMessage = f"Error: {str(e)}"
-        clientSocket.send(errorMessage.encode())
+        clientSocket.sendall(errorMessage.encode())
     
     clientSocket.close()
 
@@ -35,20 +35,325 @@
 
 
 import argparse
+import asyncio
+import collections
 import os
 import socket
 import random
 
-def requestTickets(host, port, ticketType, quantity, identifier):
-    clientSocket = socket.socket(socket.AF_INET6, socket.SOCK_STREAM)
+from protocol import (FRAME_END, FRAME_ERROR, FRAME_TICKETS, HEADER, MAGIC, ProtocolError, isFramed, packRequest,
+                      readFrame, unpackTickets)
+
+PIPELINE_DEPTH = 64  # requests sent ahead of their replies on one connection
+
+class TicketError(Exception):
+    # the server answered a request with an error
+    pass
+
+class UnframedReplyError(ProtocolError):
+    # the server only speaks the legacy text protocol
+    pass
+
+class TicketConnection:
+    # one persistent binary protocol connection
+    def __init__(self, host, port, timeout=None):
+        self.socket = socket.socket(socket.AF_INET6, socket.SOCK_STREAM)
+        self.socket.settimeout(timeout)
+        self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        try:
+            self.socket.connect((host, port))
+        except OSError:
+            self.socket.close()
+            raise
+        self.buffered = b""
+        self.served = 0  # replies received so far
+
+    def send(self, requests):
+        self.socket.sendall(b"".join(packRequest(ticketType, quantity) for ticketType, quantity in requests))
+
+    def receive(self):
+        # read one complete reply and return its tickets as rows of numbers
+        if not self.buffered:
+            self.buffered = self.socket.recv(65536)
+            if not self.buffered:
+                raise ConnectionAbortedError("server closed the connection")
+        if not isFramed(self.buffered):
+            raise UnframedReplyError("server does not speak the binary protocol")
+
+        tickets = []
+        while True:
+            version, kind, payload, self.buffered = readFrame(self.socket, self.buffered)
+            if kind == FRAME_TICKETS:
+                tickets.extend(unpackTickets(payload))
+            elif kind == FRAME_ERROR:
+                self.served += 1
+                raise TicketError(payload.decode())
+            elif kind == FRAME_END:
+                self.served += 1
+                return tickets
+
+    def close(self):
+        self.socket.close()
+
+class TicketClient:
+    # blocking client with a pool of persistent connections and pipelined requests
+    def __init__(self, host, port, poolSize=4, timeout=None):
+        self.host = host
+        self.port = port
+        self.poolSize = poolSize
+        self.timeout = timeout
+        self.idle = []
+        self.keepAlive = True  # cleared once the server turns out to close after every reply
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def connection(self):
+        if self.idle:
+            return self.idle.pop()
+        return TicketConnection(self.host, self.port, self.timeout)
+
+    def release(self, connection):
+        if self.keepAlive and len(self.idle) < self.poolSize:
+            self.idle.append(connection)
+        else:
+            connection.close()
+
+    def request(self, ticketType, quantity):
+        result, = self.requestMany([(ticketType, quantity)])
+        if isinstance(result, TicketError):
+            raise result
+        return result
+
+    def requestMany(self, requests):
+        # replies come back in request order; a failed request yields its TicketError
+        results = [None] * len(requests)
+        pending = collections.deque(range(len(requests)))
+        while pending:
+            depth = PIPELINE_DEPTH if self.keepAlive else 1
+            rounds = []
+            # send one window of requests on every pooled connection, then collect the replies
+            for _ in range(self.poolSize):
+                if not pending:
+                    break
+                window = [pending.popleft() for _ in range(min(depth, len(pending)))]
+                connection = self.connection()
+                try:
+                    connection.send([requests[index] for index in window])
+                except ConnectionError:
+                    self.dropConnection(connection, len(window))
+                    pending.extendleft(reversed(window))
+                    continue
+                rounds.append((connection, window))
+
+            for connection, window in rounds:
+                answered = self.receiveWindow(connection, window, results)
+                pending.extendleft(reversed(window[answered:]))
+        return results
+
+    def receiveWindow(self, connection, window, results):
+        answered = 0
+        try:
+            for index in window:
+                try:
+                    results[index] = connection.receive()
+                except TicketError as e:
+                    results[index] = e
+                answered += 1
+        except UnframedReplyError:
+            connection.close()
+            raise
+        except (ConnectionError, ProtocolError):
+            self.dropConnection(connection, len(window))
+            return answered
+        self.release(connection)
+        return answered
+
+    def dropConnection(self, connection, inFlight):
+        # closed after answering (or while pipelining): the server handles one request per connection
+        connection.close()
+        if connection.served == 0 and inFlight <= 1:
+            raise ConnectionAbortedError("server closed the connection without replying")
+        self.keepAlive = False
+
+    def close(self):
+        while self.idle:
+            self.idle.pop().close()
+
+class AsyncTicketConnection:
+    # one persistent connection; replies are matched to requests in order
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.waiting = collections.deque()
+        self.served = 0
+        self.closed = False
+        self.readerTask = asyncio.ensure_future(self.readReplies())
 
+    @classmethod
+    async def open(cls, host, port):
+        reader, writer = await asyncio.open_connection(host, port, family=socket.AF_INET6)
+        writer.get_extra_info("socket").setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return cls(reader, writer)
+
+    async def request(self, ticketType, quantity):
+        if self.closed:
+            raise ConnectionAbortedError("server closed the connection")
+        future = asyncio.get_running_loop().create_future()
+        self.waiting.append(future)
+        try:
+            self.writer.write(packRequest(ticketType, quantity))
+            await self.writer.drain()
+        except BaseException:
+            # nobody will wait for this reply any more
+            future.cancel()
+            raise
+        return await future
+
+    async def readReply(self):
+        tickets = []
+        while True:
+            header = await self.reader.readexactly(HEADER.size)
+            magic, version, kind, length = HEADER.unpack(header)
+            if magic != MAGIC:
+                raise UnframedReplyError("server does not speak the binary protocol")
+            payload = await self.reader.readexactly(length)
+            if kind == FRAME_TICKETS:
+                tickets.extend(unpackTickets(payload))
+            elif kind == FRAME_ERROR:
+                return TicketError(payload.decode())
+            elif kind == FRAME_END:
+                return tickets
+
+    async def readReplies(self):
+        error = ConnectionAbortedError("server closed the connection")
+        try:
+            while True:
+                reply = await self.readReply()
+                self.served += 1
+                if not self.waiting:
+                    continue
+                future = self.waiting.popleft()
+                if future.done():
+                    continue
+                if isinstance(reply, TicketError):
+                    future.set_exception(reply)
+                else:
+                    future.set_result(reply)
+        except UnframedReplyError as e:
+            error = e
+        except (asyncio.IncompleteReadError, ConnectionError, ProtocolError):
+            pass
+        finally:
+            self.closed = True
+            while self.waiting:
+                future = self.waiting.popleft()
+                if not future.done():
+                    future.set_exception(error)
+            self.writer.close()
+
+    async def close(self):
+        self.readerTask.cancel()
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except ConnectionError:
+            pass
+
+class AsyncTicketClient:
+    # asyncio client: requests are spread over a pool of pipelined connections
+    def __init__(self, host, port, poolSize=4):
+        self.host = host
+        self.port = port
+        self.poolSize = poolSize
+        self.connections = []
+        self.nextConnection = 0
+        self.connecting = asyncio.Lock()
+        self.keepAlive = True
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def connection(self):
+        if not self.keepAlive:
+            return await AsyncTicketConnection.open(self.host, self.port)
+        # serialise connects so concurrent requests share the pool instead of each opening a socket
+        async with self.connecting:
+            self.connections = [connection for connection in self.connections if not connection.closed]
+            if len(self.connections) < self.poolSize:
+                connection = await AsyncTicketConnection.open(self.host, self.port)
+                self.connections.append(connection)
+                return connection
+        self.nextConnection = (self.nextConnection + 1) % len(self.connections)
+        return self.connections[self.nextConnection]
+
+    async def request(self, ticketType, quantity):
+        pooled = self.keepAlive
+        connection = await self.connection()
+        try:
+            return await connection.request(ticketType, quantity)
+        except (ConnectionAbortedError, ConnectionResetError, BrokenPipeError):
+            if not pooled:
+                raise
+            # the server closes after every reply: stop sharing connections and retry once
+            self.keepAlive = False
+            return await self.request(ticketType, quantity)
+        finally:
+            if not pooled:
+                await connection.close()
+
+    async def requestMany(self, requests):
+        return await asyncio.gather(*(self.request(ticketType, quantity) for ticketType, quantity in requests),
+                                    return_exceptions=True)
+
+    async def close(self):
+        for connection in self.connections:
+            await connection.close()
+        self.connections = []
+
+def formatTickets(tickets):
+    return "".join([f"{i}. {', '.join(map(str, ticket))}\n" for i, ticket in enumerate(tickets, 1)])
+
+def requestText(host, port, ticketType, quantity):
+    # legacy text protocol: the reply ends when the server closes the connection
+    clientSocket = socket.socket(socket.AF_INET6, socket.SOCK_STREAM)
     try:
         clientSocket.connect((host, port))
+        clientSocket.sendall(f"{ticketType},{quantity}".encode())
+        response = bytearray()
+        while True:
+            chunk = clientSocket.recv(65536)
+            if not chunk:
+                break
+            response += chunk
+        return response.decode()
+    finally:
+        clientSocket.close()
 
-        request = f"{ticketType},{quantity}"
-        clientSocket.send(request.encode())
+def requestTickets(host, port, ticketType, quantity, identifier, textProtocol=False, client=None):
+    try:
+        response = None
+        if not textProtocol:
+            ticketClient = client or TicketClient(host, port, poolSize=1)
+            try:
+                response = formatTickets(ticketClient.request(ticketType, quantity))
+            except TicketError as e:
+                response = str(e)
+            except UnframedReplyError:
+                # older server: fall back to the text protocol
+                response = None
+            finally:
+                if client is None:
+                    ticketClient.close()
 
-        response = clientSocket.recv(1024).decode()
+        if response is None:
+            response = requestText(host, port, ticketType, quantity)
         print(response)
 
         if identifier:
@@ -63,16 +368,13 @@ def requestTickets(host, port, ticketType, quantity, identifier):
     except ConnectionRefusedError:
         print("Connection refused. Make sure the server is running.")
 
-    finally:
-        clientSocket.close()
-
-def generateRequests(host, port, ticketType, quantity, identifier, requests):
+def generateRequests(host, port, ticketType, quantity, identifier, requests, textProtocol=False):
     for i in range(requests):
         pid = os.fork()
 
         if pid == 0:
             # Child process
-            requestTickets(host, port, ticketType, quantity, f"{identifier}_{i+1}")
+            requestTickets(host, port, ticketType, quantity, f"{identifier}_{i+1}", textProtocol)
             os._exit(os.EX_OK)  # Terminate child process
             
 
@@ -84,14 +386,17 @@ def main():
     parser.add_argument("-q", "--quantity", type=int, default=random.randint(1,10), help="Number of tickets per request (default is 1)")
     parser.add_argument("-i", "--identifier", type=str, default="none", help="Unique identifier")
     parser.add_argument("-n", "--requests", type=int, default=1, help="Number of requests (default is 1)")
+    parser.add_argument("--text", action="store_true", help="Use the legacy text protocol instead of the binary one")
     args = parser.parse_args()
 
     # Validate the provided arguments
     if not args.host or not args.port or not args.ticket or not args.quantity or not args.identifier or not args.requests:
         parser.print_help()
         return
+    if not 0 < args.quantity < 2 ** 32:
+        parser.error("--quantity must be between 1 and 2**32-1")
     
-    generateRequests(args.host, args.port, args.ticket, args.quantity, args.identifier, args.requests)
+    generateRequests(args.host, args.port, args.ticket, args.quantity, args.identifier, args.requests, args.text)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
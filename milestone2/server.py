@@ -36,11 +36,32 @@
 # ==============================================================================
 
 import argparse
+import collections
+import ipaddress
 import random
 import socket
 import signal
 import os
 import errno
+import selectors
+import mmap
+import multiprocessing
+import struct
+import time
+
+from protocol import (FRAME_REQUEST, PROTOCOL_VERSION, ProtocolError, isFramed, negotiateVersion,
+                      packEnd, packError, packTickets, readFrame, unpackRequest)
+
+TICKET_CHUNK_SIZE = 4096  # tickets generated and sent per chunk
+SHARED_POOL_REFILL_BATCH = 1024  # tickets per type the parent generates between accepts
+SHARED_POOL_POLL_INTERVAL = 1.0  # seconds between pool checks of an idle parent
+SHARED_POOL_LOCK_TIMEOUT = 1.0  # seconds to wait for the pool lock before taking its holder for dead
+MAX_HANDLERS = 128  # forked handlers at once, 0 for no limit
+MAX_QUANTITY = 10000000  # tickets one request may ask for
+ADMISSION_CLIENTS = 65536  # clients whose request rate is remembered
+REJECT_BACKLOG = 1024  # refused connections waiting for their request to be answered
+REJECT_TIMEOUT = 1.0  # seconds a refused connection may take to send its request
+ACCEPT_BACKOFF = 0.1  # seconds accepting pauses when the server runs out of file descriptors
 
 class LotteryTicket:
     def __init__(self, ticketType, numbersPerTicket, numbersRange):
@@ -48,6 +69,48 @@ class LotteryTicket:
         self.numbersPerTicket = numbersPerTicket
         self.numbersRange = numbersRange
 
+class TicketBatch:
+    # compact ticket container: one contiguous uint8 buffer shaped
+    # quantity x rowLength, where rowLength = sum(numbersPerTicket)
+    __slots__ = ("numbers", "quantity", "numbersPerTicket", "rowLength")
+
+    def __init__(self, numbers, numbersPerTicket):
+        self.numbers = numbers
+        self.numbersPerTicket = numbersPerTicket
+        self.rowLength = sum(numbersPerTicket)
+        self.quantity = len(numbers) // self.rowLength if self.rowLength else 0
+
+    def __len__(self):
+        return self.quantity
+
+    def __getitem__(self, index):
+        # numbers of one ticket as a zero-copy view
+        if index < 0:
+            index += self.quantity
+        if not 0 <= index < self.quantity:
+            raise IndexError("ticket index out of range")
+        start = index * self.rowLength
+        return self.view()[start:start + self.rowLength]
+
+    def __iter__(self):
+        numbers = self.view()
+        rowLength = self.rowLength
+        for start in range(0, self.quantity * rowLength, rowLength):
+            yield numbers[start:start + rowLength]
+
+    def view(self):
+        return memoryview(self.numbers)
+
+    def ticketSets(self, index):
+        # split one ticket back into its sets of numbers
+        ticket = self[index]
+        sets = []
+        position = 0
+        for length in self.numbersPerTicket:
+            sets.append(ticket[position:position + length])
+            position += length
+        return sets
+
 class LotteryTicketGenerator:
     def __init__(self):
         self.lottoTicketTypes = {
@@ -56,96 +119,458 @@ class LotteryTicketGenerator:
             "daily": LotteryTicket("DAILY GRAND", [5], 49)
         }
     
+    def generateTicketBatch(self, quantityOfTicket, typeOfTicket):
+        # draw every ticket of the request into one flat byte matrix
+        # (quantityOfTicket rows of sum(numbersPerTicket) numbers each)
+        ticketPool = bytearray(range(1, typeOfTicket.numbersRange))
+        poolSize = len(ticketPool)
+        # partial Fisher-Yates: (position, remaining width) for every draw of a ticket
+        drawSteps = []
+        for length in typeOfTicket.numbersPerTicket:
+            if length > poolSize:
+                raise ValueError(f"cannot draw {length} numbers from a pool of {poolSize}")
+            drawSteps.append([(j, poolSize - j) for j in range(length)])
+        rowLength = sum(typeOfTicket.numbersPerTicket)
+        numbers = bytearray(quantityOfTicket * rowLength)
+        draw = random.random
+        position = 0
+        for _ in range(quantityOfTicket):
+            for steps in drawSteps:
+                # every set is drawn from a fresh copy of the pool
+                pool = ticketPool[:]
+                for j, width in steps:
+                    randomIndex = j + int(draw() * width)
+                    pool[j], pool[randomIndex] = pool[randomIndex], pool[j]
+                length = len(steps)
+                numbers[position:position + length] = pool[:length]
+                position += length
+        return TicketBatch(numbers, typeOfTicket.numbersPerTicket)
+
+    def generateTicketChunks(self, quantityOfTicket, typeOfTicket, chunkSize):
+        # lazily draw a large request as a sequence of smaller batches
+        for start in range(0, quantityOfTicket, chunkSize):
+            yield self.generateTicketBatch(min(chunkSize, quantityOfTicket - start), typeOfTicket)
+
     def generateTickets(self, quantityOfTicket, typeOfTicket):
+        # store generated tickets
+        batch = self.generateTicketBatch(quantityOfTicket, typeOfTicket)
         tickets = []
-        for _ in range(quantityOfTicket):
-            ticket = []
-            for length in typeOfTicket.numbersPerTicket:
-                ticketSet = []
-                ticketPool = list(range(1, typeOfTicket.numbersRange))
-                remainingPool = len(ticketPool) - 1 if ticketPool else None
-                for _ in range(length):
-                    if ticketPool:
-                        randomIndex = random.randint(0, remainingPool)
-                        ticketSet.append(ticketPool.pop(randomIndex))
-                        remainingPool -= 1
-                ticket.append(ticketSet)
+        for index in range(len(batch)):
+            # store generated ticket
+            ticket = [list(ticketSet) for ticketSet in batch.ticketSets(index)]
             tickets.append(ticket)
         return tickets
 
+class SharedTicketPool:
+    # pregenerated tickets in anonymous shared memory, created by the parent before it forks.
+    # Handlers claim slices through a per type cursor guarded by a process-shared lock and copy
+    # them out while holding it. Only the parent refills consumed slots.
+    # Exhaustion policy: a claim takes whatever is available and the handler generates the rest inline.
+    # A handler killed while holding the lock never releases it: whoever waits for the lock longer
+    # than SHARED_POOL_LOCK_TIMEOUT marks the pool abandoned, from then on claims generate inline
+    # and the parent replaces the pool for the handlers it forks later.
+    COUNTERS = struct.Struct("qqqq")  # produced, consumed, tickets served from the pool, tickets requested
+
+    def __init__(self, generator, capacity):
+        self.generator = generator
+        self.capacity = capacity
+        self.lock = multiprocessing.Lock()
+        self.regions = {}
+        size = 0
+        for key, typeOfTicket in generator.lottoTicketTypes.items():
+            rowLength = sum(typeOfTicket.numbersPerTicket)
+            self.regions[key] = (size, typeOfTicket, rowLength)
+            size += self.COUNTERS.size + capacity * rowLength
+        self.abandonedFlag = size
+        self.memory = mmap.mmap(-1, size + 1)  # MAP_SHARED | MAP_ANONYMOUS: visible to forked children
+
+    def acquire(self):
+        # False when the pool is abandoned: the caller does without it
+        if self.memory[self.abandonedFlag]:
+            return False
+        if self.lock.acquire(timeout=SHARED_POOL_LOCK_TIMEOUT):
+            return True
+        self.memory[self.abandonedFlag] = 1
+        return False
+
+    def abandoned(self):
+        return bool(self.memory[self.abandonedFlag])
+
+    def claim(self, ticketType, quantity):
+        offset, typeOfTicket, rowLength = self.regions[ticketType]
+        if not self.acquire():
+            return self.generator.generateTicketBatch(quantity, typeOfTicket)
+        start = offset + self.COUNTERS.size
+        try:
+            produced, consumed, hits, requested = self.COUNTERS.unpack_from(self.memory, offset)
+            taken = min(quantity, produced - consumed)
+            slot = consumed % self.capacity
+            first = min(taken, self.capacity - slot)
+            numbers = bytearray(self.memory[start + slot * rowLength:start + (slot + first) * rowLength])
+            numbers += self.memory[start:start + (taken - first) * rowLength]
+            self.COUNTERS.pack_into(self.memory, offset, produced, consumed + taken, hits + taken, requested + quantity)
+        finally:
+            self.lock.release()
+        missing = quantity - taken
+        if missing > 0:
+            # pool exhausted: generate the rest inline
+            numbers += self.generator.generateTicketBatch(missing, typeOfTicket).numbers
+        return TicketBatch(numbers, typeOfTicket.numbersPerTicket)
+
+    def refill(self, budget=SHARED_POOL_REFILL_BATCH):
+        # parent only: generate up to budget tickets per type into consumed slots,
+        # returns True while some type is still below capacity
+        pending = False
+        for key, (offset, typeOfTicket, rowLength) in self.regions.items():
+            if not self.acquire():
+                return False
+            try:
+                produced, consumed, hits, requested = self.COUNTERS.unpack_from(self.memory, offset)
+            finally:
+                self.lock.release()
+            count = min(self.capacity - (produced - consumed), budget)
+            if count <= 0:
+                continue
+            numbers = self.generator.generateTicketBatch(count, typeOfTicket).view()
+            start = offset + self.COUNTERS.size
+            if not self.acquire():
+                return False
+            try:
+                produced, consumed, hits, requested = self.COUNTERS.unpack_from(self.memory, offset)
+                slot = produced % self.capacity
+                first = min(count, self.capacity - slot)
+                self.memory[start + slot * rowLength:start + (slot + first) * rowLength] = numbers[:first * rowLength]
+                self.memory[start:start + (count - first) * rowLength] = numbers[first * rowLength:]
+                self.COUNTERS.pack_into(self.memory, offset, produced + count, consumed, hits, requested)
+                pending = pending or produced + count - consumed < self.capacity
+            finally:
+                self.lock.release()
+        return pending
+
+    def metrics(self):
+        depth = {}
+        served = requested = 0
+        if not self.acquire():
+            return {"depth": depth, "hitRate": 0.0}
+        try:
+            for key, (offset, typeOfTicket, rowLength) in self.regions.items():
+                produced, consumed, hits, asked = self.COUNTERS.unpack_from(self.memory, offset)
+                depth[key] = produced - consumed
+                served += hits
+                requested += asked
+        finally:
+            self.lock.release()
+        return {"depth": depth, "hitRate": served / requested if requested else 1.0}
+
+sharedTicketPool = None  # SharedTicketPool inherited from the parent, if enabled
+
+def createSharedPool(capacity):
+    global sharedTicketPool
+    if capacity > 0:
+        sharedTicketPool = SharedTicketPool(LotteryTicketGenerator(), capacity)
+        while sharedTicketPool.refill():
+            pass
+        print(f"Shared ticket pool of {capacity} tickets per type created.")
+
+def refillSharedPool():
+    # returns how long the caller may sleep before the pool needs attention again
+    global sharedTicketPool
+    if sharedTicketPool is None:
+        return None
+    if sharedTicketPool.abandoned():
+        # handlers forked from now on get a fresh pool; the ones running generate inline
+        print("Shared ticket pool lock was never released, a handler probably died holding it; replacing the pool.")
+        sharedTicketPool = SharedTicketPool(sharedTicketPool.generator, sharedTicketPool.capacity)
+        return 0
+    if sharedTicketPool.refill():
+        return 0
+    return SHARED_POOL_POLL_INTERVAL
+
+def ticketChunks(generator, ticketType, quantity):
+    typeOfTicket = generator.lottoTicketTypes[ticketType]
+    if sharedTicketPool is None:
+        yield from generator.generateTicketChunks(quantity, typeOfTicket, TICKET_CHUNK_SIZE)
+        return
+    for start in range(0, quantity, TICKET_CHUNK_SIZE):
+        yield sharedTicketPool.claim(ticketType, min(TICKET_CHUNK_SIZE, quantity - start))
+
+def formatTickets(tickets, firstNumber):
+    return "".join([f"{i}. {', '.join(map(str, ticket))}\n" for i, ticket in enumerate(tickets, firstNumber)])
+
+def streamTickets(generator, ticketType, quantity):
+    # generate and format the reply one chunk at a time so memory stays flat
+    firstNumber = 1
+    for tickets in ticketChunks(generator, ticketType, quantity):
+        yield formatTickets(tickets, firstNumber).encode()
+        firstNumber += len(tickets)
+
+def sendError(clientSocket, message):
+    # the client may be gone already: a failed error reply must not take the handler down
+    try:
+        clientSocket.sendall(message)
+    except OSError as e:
+        print(f"Socket error occurred: {str(e)}")
+
 def processClientRequest(clientSocket, addr, ticketType, quantity):
     generator = LotteryTicketGenerator()
     
     try:
-        tickets = generator.generateTickets(quantity, generator.lottoTicketTypes[ticketType])
-        
-        processedTickets = ""
-        for i, ticket in enumerate(tickets, 1):
-            processedTickets += f"{i}. {', '.join(map(str, ticket[0]))}\n"
-        
-        clientSocket.send(processedTickets.encode())
+        for chunk in streamTickets(generator, ticketType, quantity):
+            clientSocket.sendall(chunk)
     
     except (ValueError, KeyError) as e:
-        errorMessage = f"Error: {str(e)}"
-        clientSocket.send(errorMessage.encode())
+        sendError(clientSocket, f"Error: {str(e)}".encode())
     
     clientSocket.close()
 
-def runServer(host, port):
+def processBinaryRequest(clientSocket, addr, request):
+    version = PROTOCOL_VERSION
+    try:
+        clientVersion, kind, payload, _ = readFrame(clientSocket, request)
+        version = negotiateVersion(clientVersion)
+        if kind != FRAME_REQUEST:
+            raise ProtocolError(f"unexpected frame kind {kind}")
+        ticketType, quantity = unpackRequest(payload)
+        admission.checkQuantity(quantity)
+
+        generator = LotteryTicketGenerator()
+        total = 0
+        for tickets in ticketChunks(generator, ticketType, quantity):
+            clientSocket.sendall(packTickets(tickets, version))
+            total += len(tickets)
+        clientSocket.sendall(packEnd(total, version))
+
+    except (ValueError, KeyError, ProtocolError) as e:
+        sendError(clientSocket, packError(f"Error: {str(e)}", version))
+
+class ClientRateLimiter:
+    # token bucket per client in a table of the clients seen most recently: every check is O(1),
+    # and a client dropped from the table comes back with a full bucket
+    def __init__(self, rate=0.0, burst=0.0, capacity=ADMISSION_CLIENTS):
+        self.rate = rate  # requests per second and client, 0 for no limit
+        self.burst = burst
+        self.capacity = capacity
+        self.clients = collections.OrderedDict()  # client -> [tokens, last update]
+
+    def allow(self, address):
+        if self.rate <= 0:
+            return True
+        now = time.monotonic()
+        client = clientKey(address)
+        bucket = self.clients.get(client)
+        if bucket is None:
+            if len(self.clients) >= self.capacity:
+                self.clients.popitem(last=False)
+            bucket = self.clients[client] = [self.burst, now]
+        else:
+            self.clients.move_to_end(client)
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return True
+        return False
+
+def clientKey(address):
+    # an IPv6 host usually owns a whole /64, so its addresses count as one client
+    try:
+        ip = ipaddress.ip_address(address.split("%", 1)[0])
+    except ValueError:
+        return address
+    if ip.version == 6 and ip.ipv4_mapped is not None:
+        return str(ip.ipv4_mapped)
+    if ip.version == 6 and not ip.is_loopback:
+        return ip.exploded[:19]
+    return str(ip)
+
+class AdmissionControl:
+    # turns connections away before they cost a fork: per client rate, handlers at once, tickets per request
+    def __init__(self):
+        self.clients = ClientRateLimiter()
+        self.maxHandlers = MAX_HANDLERS
+        self.maxQuantity = MAX_QUANTITY
+        self.handlers = set()  # pids of the forked handlers still running
+        self.rejections = collections.deque()  # (deadline, socket) of refused connections, oldest first
+
+    def refuse(self, addr):
+        # reason to turn this connection away, None to serve it
+        if self.maxHandlers and len(self.handlers) >= self.maxHandlers:
+            return "server busy, try again later"
+        if not self.clients.allow(addr[0]):
+            return "too many requests, slow down"
+        return None
+
+    def checkQuantity(self, quantity):
+        if quantity > self.maxQuantity:
+            raise ValueError(f"at most {self.maxQuantity} tickets per request")
+
+admission = AdmissionControl()
+
+def rejectionReply(request, reason):
+    # the error in the protocol of the request
+    if isFramed(request):
+        return packError(f"Error: {reason}")
+    return f"Error: {reason}".encode()
+
+def rejectConnection(clientSocket, addr, reason, selector):
+    # the parent answers once the request arrives, so the error is not lost to a reset
+    print(f"Refused connection from [{addr[0]}]:{addr[1]}: {reason}")
+    if len(admission.rejections) >= REJECT_BACKLOG:
+        clientSocket.close()
+        return
+    clientSocket.setblocking(False)
+    selector.register(clientSocket, selectors.EVENT_READ, reason)
+    admission.rejections.append((time.monotonic() + REJECT_TIMEOUT, clientSocket))
+
+def answerRejection(clientSocket, reason, selector):
+    selector.unregister(clientSocket)
+    try:
+        request = clientSocket.recv(1024)
+        clientSocket.send(rejectionReply(request, reason))
+    except OSError:
+        pass
+    finally:
+        clientSocket.close()
+
+def closeRejections(selector):
+    # forked handler: drop its copies of the refused connections the parent is answering,
+    # or their clients would not see the connection close until this handler exits
+    for deadline, clientSocket in admission.rejections:
+        clientSocket.close()
+    admission.rejections.clear()
+    selector.close()
+
+def expireRejections(selector):
+    # close refused connections that never sent a request; returns the seconds until the next one is due
+    now = time.monotonic()
+    while admission.rejections:
+        deadline, clientSocket = admission.rejections[0]
+        if clientSocket.fileno() == -1:
+            # answered already
+            admission.rejections.popleft()
+        elif deadline <= now:
+            admission.rejections.popleft()
+            selector.unregister(clientSocket)
+            clientSocket.close()
+        else:
+            return deadline - now
+    return None
+
+def acceptConnections(serverSocket, selector):
+    # Accept every pending connection before going back to the selector;
+    # returns when to watch the listening socket again if accepting had to pause
+    while True:
+        try:
+            clientSocket, addr = serverSocket.accept()
+        except socket.error as e:
+            # Handle interrupted system call error
+            if e.errno == errno.EINTR:
+                continue
+            elif e.errno == errno.EAGAIN or e.errno == errno.EWOULDBLOCK:
+                # No more incoming connections
+                return
+            elif e.errno == errno.ECONNABORTED:
+                # Connection gone before it was accepted
+                continue
+            elif e.errno in (errno.EMFILE, errno.ENFILE):
+                # Out of descriptors: the listening socket stays readable, so leave it out
+                # of the selector for a moment instead of waking up on it again at once
+                print(f"Accept failed: {str(e)}")
+                selector.unregister(serverSocket)
+                return time.monotonic() + ACCEPT_BACKOFF
+            else:
+                raise
+
+        print(f"Accepted connection from [{addr[0]}]:{addr[1]}")
+
+        # Refuse without forking when the client or the server is over its limit
+        reason = admission.refuse(addr)
+        if reason:
+            rejectConnection(clientSocket, addr, reason, selector)
+            continue
+
+        # Hold SIGCHLD until the child's pid is recorded, or it could be reaped first
+        signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGCHLD})
+        try:
+            pid = os.fork()
+
+            if pid == 0:
+                # Child process
+                signal.pthread_sigmask(signal.SIG_UNBLOCK, {signal.SIGCHLD})
+                closeRejections(selector)
+                serverSocket.close()  # Release socket in child process
+                handleClient(clientSocket, addr)
+                os._exit(os.EX_OK)  # Terminate child process
+
+            else:
+                # Parent process
+                admission.handlers.add(pid)
+                clientSocket.close()  # Release socket in parent process
+        finally:
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, {signal.SIGCHLD})
+
+def runServer(host, port, backlog=socket.SOMAXCONN, sharedPool=0):
     serverSocket = socket.socket(socket.AF_INET6, socket.SOCK_STREAM)
     serverSocket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
     serverSocket.bind((host, port))
-    serverSocket.listen(5)
+    serverSocket.listen(backlog)
     serverSocket.setblocking(False)
 
     print(f"Server listening on [{host}]:{port}...")
 
+    # The pool must exist before the first fork
+    createSharedPool(sharedPool)
+
     # Set up the signal handler for SIGCHLD
     signal.signal(signal.SIGCHLD, signalHandler) 
 
+    # Sleep until the listening socket is readable instead of spinning on accept()
+    selector = selectors.DefaultSelector()
+    selector.register(serverSocket, selectors.EVENT_READ)
+
+    timeout = refillSharedPool()
+    resumeAccepts = None  # when to watch the listening socket again after running out of descriptors
     while True:
         try:
-            try:
-                clientSocket, addr = serverSocket.accept()
-                print(f"Accepted connection from [{addr[0]}]:{addr[1]}")
-
-                pid = os.fork()
-
-                if pid == 0:
-                    # Child process
-                    serverSocket.close()  # Release socket in child process
-                    handleClient(clientSocket, addr)
-                    os._exit(os.EX_OK)  # Terminate child process
-
-                else:
-                    # Parent process
-                    clientSocket.close()  # Release socket in parent process
-
-            except socket.error as e:
-                # Handle interrupted system call error
-                if e.errno == errno.EINTR:
-                    continue
-                elif e.errno == errno.EAGAIN or e.errno == errno.EWOULDBLOCK:
-                    # No more incoming connections, continue loop
-                    continue
+            for key, events in selector.select(timeout):
+                if key.fileobj is serverSocket:
+                    resumeAccepts = acceptConnections(serverSocket, selector)
                 else:
-                    raise
+                    # a refused connection sent its request
+                    answerRejection(key.fileobj, key.data, selector)
+            timeout = refillSharedPool()
+            due = expireRejections(selector)
+            if resumeAccepts is not None:
+                if resumeAccepts <= time.monotonic():
+                    selector.register(serverSocket, selectors.EVENT_READ)
+                    resumeAccepts = None
+                elif due is None or resumeAccepts - time.monotonic() < due:
+                    due = resumeAccepts - time.monotonic()
+            if due is not None and (timeout is None or due < timeout):
+                timeout = due
 
         except KeyboardInterrupt:
             # Terminate the server on keyboard interrupt (Ctrl+C)
             print("Server terminated.")
             break
 
+    selector.close()
     serverSocket.close()
 
 def handleClient(clientSocket, addr):
     try:
-        request = clientSocket.recv(1024).decode().strip()
-        ticketType, quantity = request.split(',')
-        processClientRequest(clientSocket, addr, ticketType, int(quantity))
+        request = clientSocket.recv(1024)
+        if isFramed(request):
+            # binary protocol client
+            processBinaryRequest(clientSocket, addr, request)
+            return
+        # legacy text protocol client
+        ticketType, quantity = request.decode().strip().split(',')
+        quantity = int(quantity)
+        admission.checkQuantity(quantity)
+        processClientRequest(clientSocket, addr, ticketType, quantity)
     except (ValueError, KeyError) as e:
-        errorMessage = f"Error: {str(e)}"
-        clientSocket.send(errorMessage.encode())
+        sendError(clientSocket, f"Error: {str(e)}".encode())
     except socket.error as e:
         print(f"Socket error occurred: {str(e)}")
     finally:
@@ -160,6 +585,7 @@ def signalHandler(signum, frame):
             if pid == 0:
                 # No more terminated child processes
                 break
+            admission.handlers.discard(pid)
         except OSError:
             # No child processes
             break
@@ -169,8 +595,20 @@ def main():
     parser = argparse.ArgumentParser(description="Lottery Ticket Generator (Server)")
     parser.add_argument("-H", "--host", type=str, default="::1", help="Server IPv6 address (default is ::1)")
     parser.add_argument("-p", "--port", type=int, default=8888, help="Port number (default is 8888)")
+    parser.add_argument("-b", "--backlog", type=int, default=socket.SOMAXCONN, help=f"Listen backlog (default is {socket.SOMAXCONN})")
+    parser.add_argument("-s", "--shared-pool", type=int, default=0, help="Pregenerated tickets per ticket type shared by all forked handlers (default is 0, off)")
+    parser.add_argument("--rate", type=float, default=0.0, help="Connections per second allowed to each client address (IPv6: each /64), 0 for no limit (default is 0)")
+    parser.add_argument("--burst", type=float, help="Connections a client may make at once before --rate applies (default is the rate, at least 1)")
+    parser.add_argument("--max-handlers", type=int, default=MAX_HANDLERS, help=f"Forked handlers at once, 0 for no limit (default is {MAX_HANDLERS})")
+    parser.add_argument("--max-quantity", type=int, default=MAX_QUANTITY, help=f"Tickets per request (default is {MAX_QUANTITY})")
     args = parser.parse_args()
-    runServer(args.host, args.port)
+    if args.rate < 0 or args.max_handlers < 0 or args.max_quantity < 1 or (args.burst is not None and args.burst < 1):
+        parser.error("--rate and --max-handlers must not be negative, --burst and --max-quantity must be at least 1")
+    admission.clients.rate = args.rate
+    admission.clients.burst = args.burst if args.burst is not None else max(1, args.rate)
+    admission.maxHandlers = args.max_handlers
+    admission.maxQuantity = args.max_quantity
+    runServer(args.host, args.port, args.backlog, args.shared_pool)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,143 @@
+#!/usr/bin/python3
+
+# ==============================================================================
+#   Assignment:  Milestone 3
+#
+#   Author:  Fatemeh Zahedi
+#   Language:  Python3
+#   To Compile:  -
+#
+#   Class:  Python for Programmers: Sockets and Security - DPI912NSA
+#   Professor:  Harvey Kaduri
+#
+# -----------------------------------------------------------------------------
+#
+#   Description: This script measures how many connections per second the server accepts and answers
+#                with logging off, logging straight to the file and logging through the log writer.
+#
+#   Collaboration:  -
+#
+#   Input: python3 acceptbench.py [-n 3000] [-c 1] [-w 0] [--backend fork] [--log-rate -1] [-m off direct queued]
+#          -n is the number of connections per run, each asking for one LOTTO MAX ticket
+#          -c is the number of clients connecting at the same time
+#          -m lists the logging setups to run: off, direct (RotatingFileHandler in every process)
+#             and queued (the log writer process of configure_logging)
+#
+#   Output:
+#           off: 310 connections/s, 0 log lines
+#           direct: 262 connections/s, 3001 log lines
+#           queued: 281 connections/s, 3001 log lines
+#
+#   Algorithm: Every setup starts its own server in a child process on a free port in a temporary
+#              directory, so the log files of the runs do not mix. The clients are threads that
+#              connect, send "max,1" and read the reply until the server closes the connection.
+#
+#   Required Features Not Included:  -
+#   Known Bugs:  -
+#   Classification: -
+# ==============================================================================
+
+import argparse
+import logging
+import logging.handlers
+import os
+import signal
+import socket
+import tempfile
+import threading
+import time
+
+import server
+
+def freePort():
+    with socket.socket(socket.AF_INET6, socket.SOCK_STREAM) as probe:
+        probe.bind(("::1", 0))
+        return probe.getsockname()[1]
+
+def runBenchServer(port, mode, workers, backend, logRate):
+    # child process: one server with one logging setup
+    server.logger.setLevel(logging.INFO)
+    for handler in list(server.logger.handlers):
+        server.logger.removeHandler(handler)
+    server.connectionLogLimiter.rate = logRate
+    server.connectionLogLimiter.tokens = max(logRate, 0)
+    if mode == "direct":
+        handler = logging.handlers.RotatingFileHandler(server.LOG_FILE, maxBytes=server.LOG_MAX_BYTES, backupCount=server.LOG_BACKUP_COUNT)
+        handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s: %(message)s"))
+        server.logger.addHandler(handler)
+    elif mode == "queued":
+        server.startLogWriter(server.LOG_FILE)
+    else:
+        server.logger.disabled = True
+    server.logger.info("Server started.")
+    server.runServer("::1", port, workers, backend=backend)
+
+def waitForServer(port, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            socket.create_connection(("::1", port)).close()
+            return
+        except ConnectionRefusedError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+def connectMany(port, count):
+    for _ in range(count):
+        with socket.create_connection(("::1", port)) as clientSocket:
+            clientSocket.sendall(b"max,1")
+            while clientSocket.recv(65536):
+                pass
+
+def logLines(directory):
+    lines = 0
+    for name in os.listdir(directory):
+        if name.startswith(server.LOG_FILE):
+            with open(os.path.join(directory, name), "rb") as logFile:
+                lines += logFile.read().count(b"\n")
+    return lines
+
+def benchmark(mode, connections, clients, workers, backend, logRate):
+    directory = tempfile.mkdtemp(prefix=f"acceptbench-{mode}-")
+    port = freePort()
+    pid = os.fork()
+    if pid == 0:
+        os.setpgid(0, 0)  # the server, its workers and its log writer are stopped together
+        os.chdir(directory)
+        try:
+            runBenchServer(port, mode, workers, backend, logRate)
+        finally:
+            os._exit(0)
+    try:
+        waitForServer(port)
+        connectMany(port, min(connections, 200))  # warm up
+        threads = [threading.Thread(target=connectMany, args=(port, connections // clients)) for _ in range(clients)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+    finally:
+        os.killpg(pid, signal.SIGTERM)
+        os.waitpid(pid, 0)
+    time.sleep(server.LOG_FLUSH_INTERVAL * 2)  # let the log writer write its last batch
+    return (connections // clients) * clients / elapsed, logLines(directory)
+
+def main():
+    parser = argparse.ArgumentParser(description="Server Accept Throughput Benchmark")
+    parser.add_argument("-n", "--connections", type=int, default=3000, help="Connections per run (default is 3000)")
+    parser.add_argument("-c", "--clients", type=int, default=1, help="Clients connecting at the same time (default is 1)")
+    parser.add_argument("-w", "--workers", type=int, default=0, help="Pre-forked workers of the server (default is 0, fork per connection)")
+    parser.add_argument("--backend", choices=["fork", "asyncio"], default="fork", help="Server backend (default is fork)")
+    parser.add_argument("--log-rate", type=int, default=-1, help="Accepted connection log lines per second and process (default is -1, all)")
+    parser.add_argument("-m", "--modes", nargs="+", choices=["off", "direct", "queued"], default=["off", "direct", "queued"], help="Logging setups to run (default is all)")
+    args = parser.parse_args()
+
+    for mode in args.modes:
+        rate, lines = benchmark(mode, args.connections, args.clients, args.workers, args.backend, args.log_rate)
+        print(f"{mode}: {rate:.0f} connections/s, {lines} log lines")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+#!/usr/bin/python3
+
+# ==============================================================================
+#   Assignment:  Milestone 3
+#
+#   Author:  Fatemeh Zahedi
+#   Language:  Python3
+#   To Compile:  -
+#
+#   Class:  Python for Programmers: Sockets and Security - DPI912NSA
+#   Professor:  Harvey Kaduri
+#
+# -----------------------------------------------------------------------------
+#
+#   Description: This script checks issued lottery tickets against a winning draw and counts the tickets of every prize tier.
+#
+#   Collaboration:  -
+#
+#   Input: python3 checker.py -t 6/49 -w 1,2,3,4,5,6 -f text -i GeneratedTickets.txt
+#          -w takes one comma separated list per set of numbers, sets separated by "|" (for example 1,2,3,4,5|7)
+#          -f is the format of the results file: text, jsonl or binary as written by client.py,
+#             or ranks as written by milestone0 (-f ranks)
+#
+#   Output:
+#           Checked 1000000 6/49 tickets against 1, 2, 3, 4, 5, 6
+#           6 matched: 0
+#           5 matched: 24
+#           ...
+#
+#   Algorithm: Tickets are read in chunks of rows, so files larger than memory are streamed.
+#              Every ticket column of a chunk is mapped to 0/1 (no match/match) with bytes.translate
+#              and read as one big integer holding one byte per ticket; adding the columns counts
+#              the matches of all tickets of the chunk at once, bytes.count then tallies the tiers.
+#
+#   Required Features Not Included:  -
+#   Known Bugs:  -
+#   Classification: -
+# ==============================================================================
+
+import argparse
+import json
+import os
+import struct
+
+from ticketcodec import TicketCodec
+
+CHECK_CHUNK_ROWS = 1 << 20  # tickets matched per step
+TICKET_TYPES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ticket_types.json")
+
+# binary results file record of client.py: identifier length, ticket type length, ticket count,
+# numbers per ticket, error length, followed by the identifier, ticket type, error text and the numbers
+RESULT_RECORD = struct.Struct("!HBIBH")
+
+class DrawChecker:
+    # counts the matches of every ticket against one winning draw, one set of numbers per ticket set
+    def __init__(self, winningSets):
+        if not winningSets or not all(winningSets):
+            raise ValueError("the winning draw needs at least one number per set")
+        for winningSet in winningSets:
+            if len(set(winningSet)) != len(winningSet) or not all(1 <= number <= 255 for number in winningSet):
+                raise ValueError("winning numbers must be distinct within a set and from 1 to 255")
+        self.winningSets = winningSets
+        self.numbersPerTicket = [len(winningSet) for winningSet in winningSets]
+        self.rowLength = sum(self.numbersPerTicket)
+        # bytes.translate tables: 1 for a winning number of the set, 0 for anything else
+        self.tables = [bytes(number in winningSet for number in range(256)) for winningSet in winningSets]
+        # a ticket's tier is its match count per set in mixed radix, one byte per ticket
+        self.weights = []
+        weight = 1
+        for length in reversed(self.numbersPerTicket):
+            self.weights.insert(0, weight)
+            weight *= length + 1
+        if weight > 256:
+            raise ValueError("too many prize tiers for one byte per ticket")
+        self.tierCounts = [0] * weight
+        self.checked = 0
+
+    def check(self, numbers):
+        # numbers holds whole rows of rowLength numbers each
+        numbers = bytes(numbers)
+        rowLength = self.rowLength
+        if len(numbers) % rowLength:
+            raise ValueError(f"tickets must have {rowLength} numbers each")
+        rows = len(numbers) // rowLength
+        if not rows:
+            return
+        tiers = 0
+        position = 0
+        for length, table, weight in zip(self.numbersPerTicket, self.tables, self.weights):
+            matches = 0
+            for column in range(position, position + length):
+                # one byte per ticket: bytes never carry into each other, a set has at most 255 numbers
+                matches += int.from_bytes(numbers[column::rowLength].translate(table), "big")
+            tiers += matches * weight
+            position += length
+        tierBytes = tiers.to_bytes(rows, "big")
+        for tier in range(len(self.tierCounts)):
+            self.tierCounts[tier] += tierBytes.count(tier)
+        self.checked += rows
+
+    def tiers(self):
+        # ((matches per set), ticket count), best tier first
+        results = []
+        for tier, count in enumerate(self.tierCounts):
+            matches = []
+            for weight in self.weights:
+                matched, tier = divmod(tier, weight)
+                matches.append(matched)
+            results.append((tuple(matches), count))
+        return sorted(results, reverse=True)
+
+def rowChunks(rows, rowLength):
+    # group an iterable of rows into flat buffers of CHECK_CHUNK_ROWS rows
+    chunk = bytearray()
+    limit = CHECK_CHUNK_ROWS * rowLength
+    for row in rows:
+        if len(row) != rowLength:
+            raise ValueError(f"ticket {list(row)} does not have {rowLength} numbers")
+        chunk += row
+        if len(chunk) >= limit:
+            yield chunk
+            chunk = bytearray()
+    if chunk:
+        yield chunk
+
+def readTextResults(path, ticketType):
+    # "Identifier: ..." / "Ticket Type: ..." headers followed by "1. 3, 14, 15, ..." lines
+    currentType = None
+    with open(path, "r") as resultsFile:
+        for line in resultsFile:
+            if line.startswith("Ticket Type: "):
+                currentType = line[len("Ticket Type: "):].strip()
+            elif currentType == ticketType and ". " in line:
+                numbers = line.split(". ", 1)[1]
+                if numbers[:1].isdigit():
+                    yield bytes([int(number) for number in numbers.replace("|", ",").split(",")])
+
+def readJsonResults(path, ticketType):
+    with open(path, "r") as resultsFile:
+        for line in resultsFile:
+            record = json.loads(line)
+            if record.get("ticketType") == ticketType:
+                for ticket in record.get("tickets", []):
+                    yield bytes(ticket)
+
+def readBinaryResults(path, ticketType, rowLength):
+    # whole records are skipped or copied as they are: no per-ticket work
+    ticketTypeBytes = ticketType.encode()
+    chunk = bytearray()
+    with open(path, "rb") as resultsFile:
+        while True:
+            header = resultsFile.read(RESULT_RECORD.size)
+            if not header:
+                break
+            if len(header) < RESULT_RECORD.size:
+                raise ValueError(f"{path}: truncated record")
+            identifierLength, typeLength, count, recordRowLength, errorLength = RESULT_RECORD.unpack(header)
+            resultsFile.seek(identifierLength, os.SEEK_CUR)
+            recordType = resultsFile.read(typeLength)
+            resultsFile.seek(errorLength, os.SEEK_CUR)
+            size = count * recordRowLength
+            if recordType != ticketTypeBytes or not count:
+                # another ticket type, or an error record without tickets
+                resultsFile.seek(size, os.SEEK_CUR)
+                continue
+            if recordRowLength != rowLength:
+                raise ValueError(f"{path}: {ticketType} tickets have {recordRowLength} numbers, the draw has {rowLength}")
+            numbers = resultsFile.read(size)
+            if len(numbers) < size:
+                raise ValueError(f"{path}: truncated record")
+            chunk += numbers
+            if len(chunk) >= CHECK_CHUNK_ROWS * rowLength:
+                yield chunk
+                chunk = bytearray()
+    if chunk:
+        yield chunk
+
+def readRankResults(path, ticketType, ticketTypesFile=TICKET_TYPES_FILE):
+    # milestone0 ranks file: ticket type key on the first line, then packed combination ranks
+    with open(ticketTypesFile, "r") as configFile:
+        config = json.load(configFile)
+    with open(path, "rb") as resultsFile:
+        fileType = resultsFile.readline().decode().strip()
+        if fileType != ticketType:
+            return
+        if fileType not in config:
+            raise ValueError(f"{path}: unknown ticket type {fileType!r}")
+        codec = TicketCodec(config[fileType]["numbersPerTicket"], config[fileType]["numbersRange"] - 1)
+        while True:
+            data = resultsFile.read(CHECK_CHUNK_ROWS * codec.rankBytes)
+            if not data:
+                break
+            yield codec.decodeBatch(codec.unpackRanks(data))
+
+def readResults(path, outputFormat, ticketType, rowLength):
+    if outputFormat == "binary":
+        return readBinaryResults(path, ticketType, rowLength)
+    if outputFormat == "ranks":
+        return readRankResults(path, ticketType)
+    if outputFormat == "jsonl":
+        return rowChunks(readJsonResults(path, ticketType), rowLength)
+    return rowChunks(readTextResults(path, ticketType), rowLength)
+
+def parseDraw(text):
+    # "1,2,3,4,5|7" -> [[1, 2, 3, 4, 5], [7]]
+    return [[int(number) for number in numbers.split(",")] for numbers in text.split("|")]
+
+def checkResults(path, outputFormat, ticketType, winningSets):
+    checker = DrawChecker(winningSets)
+    for numbers in readResults(path, outputFormat, ticketType, checker.rowLength):
+        checker.check(numbers)
+    return checker
+
+def main():
+    parser = argparse.ArgumentParser(description="Lottery Ticket Checker")
+    parser.add_argument("-t", "--ticket", type=str, required=True, help="Ticket type to check (for example 6/49)")
+    parser.add_argument("-w", "--winning", type=str, required=True, help="Winning numbers, sets separated by | (for example 1,2,3,4,5,6)")
+    parser.add_argument("-i", "--input", type=str, default="GeneratedTickets.txt", help="Results file (default is GeneratedTickets.txt)")
+    parser.add_argument("-f", "--format", choices=["text", "jsonl", "binary", "ranks"], default="text", help="Results file format (default is text)")
+    args = parser.parse_args()
+
+    try:
+        checker = checkResults(args.input, args.format, args.ticket, parseDraw(args.winning))
+    except (OSError, ValueError) as e:
+        print(f"Error: {str(e)}")
+        return
+
+    draw = " | ".join(", ".join(map(str, winningSet)) for winningSet in checker.winningSets)
+    print(f"Checked {checker.checked} {args.ticket} tickets against {draw}")
+    for matches, count in checker.tiers():
+        print(f"{' + '.join(map(str, matches))} matched: {count}")
+
+if __name__ == "__main__":
+    main()
@@ -20,13 +20,16 @@
 #   Collaboration:  -
 #
 #   Input: python3 client.py -H <server_host> -p <server_port> -t <ticket_type> -q <quantity> -i <identifier> -n <requests>
+#          python3 client.py -t <ticket_type> -q <quantity> --load -c <concurrency> [-r <rate>] -d <seconds> -w <seconds> [-j <file>]
 #
 #   Output: If the client successfully connects to the server and receives a response, the response will be printed to the console. 
 #           The response contains the generated lottery tickets or error message if there was an issue.
 #           
 #
-#   Algorithm: The script establishes a connection with the server and sends requests in parallel using child processes. 
+#   Algorithm: The script pipelines the requests over a pool of persistent connections.
 #              Upon receiving responses, it prints them to the console. The responses are also appended to a file. 
+#              In --load mode it keeps a fixed number of requests in flight (closed loop) or starts them at a
+#              fixed rate (open loop) and reports throughput, errors and latency percentiles.
 #  
 #   Required Features Not Included:  -
 #   Known Bugs:  -
@@ -35,46 +38,660 @@
 
 
 import argparse
+import asyncio
+import collections
+import fcntl
+import json
 import os
+import queue
 import socket
 import random
+import stat
+import struct
+import threading
+import time
 
-def requestTickets(host, port, ticketType, quantity, identifier):
-    clientSocket = socket.socket(socket.AF_INET6, socket.SOCK_STREAM)
+from protocol import (FRAME_END, FRAME_ERROR, FRAME_TICKETS, HEADER, MAGIC, ProtocolError, isFramed, packRequest,
+                      readFrame, unpackTickets)
+from ticketstore import TicketStore, encodeRecord
+
+PIPELINE_DEPTH = 64  # requests sent ahead of their replies on one connection
+
+# binary results file record: identifier length, ticket type length, ticket count, numbers per ticket,
+# error length, followed by the identifier, ticket type, error text and one byte per ticket number
+RESULT_RECORD = struct.Struct("!HBIBH")
+
+class TicketError(Exception):
+    # the server answered a request with an error
+    pass
+
+class UnframedReplyError(ProtocolError):
+    # the server only speaks the legacy text protocol
+    pass
+
+class TicketConnection:
+    # one persistent binary protocol connection
+    def __init__(self, host, port, timeout=None):
+        self.socket = socket.socket(socket.AF_INET6, socket.SOCK_STREAM)
+        self.socket.settimeout(timeout)
+        self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        try:
+            self.socket.connect((host, port))
+        except OSError:
+            self.socket.close()
+            raise
+        self.buffered = b""
+        self.served = 0  # replies received so far
+
+    def send(self, requests):
+        # every request is (ticketType, quantity) or (ticketType, quantity, seed)
+        self.socket.sendall(b"".join(packRequest(*request) for request in requests))
+
+    def receive(self):
+        # read one complete reply and return its tickets as rows of numbers
+        if not self.buffered:
+            self.buffered = self.socket.recv(65536)
+            if not self.buffered:
+                raise ConnectionAbortedError("server closed the connection")
+        if not isFramed(self.buffered):
+            raise UnframedReplyError("server does not speak the binary protocol")
+
+        tickets = []
+        while True:
+            version, kind, payload, self.buffered = readFrame(self.socket, self.buffered)
+            if kind == FRAME_TICKETS:
+                tickets.extend(unpackTickets(payload))
+            elif kind == FRAME_ERROR:
+                self.served += 1
+                raise TicketError(payload.decode())
+            elif kind == FRAME_END:
+                self.served += 1
+                return tickets
+
+    def close(self):
+        self.socket.close()
+
+class TicketClient:
+    # blocking client with a pool of persistent connections and pipelined requests
+    def __init__(self, host, port, poolSize=4, timeout=None):
+        self.host = host
+        self.port = port
+        self.poolSize = poolSize
+        self.timeout = timeout
+        self.idle = []
+        self.keepAlive = True  # cleared once the server turns out to close after every reply
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def connection(self):
+        if self.idle:
+            return self.idle.pop()
+        return TicketConnection(self.host, self.port, self.timeout)
+
+    def release(self, connection):
+        if self.keepAlive and len(self.idle) < self.poolSize:
+            self.idle.append(connection)
+        else:
+            connection.close()
+
+    def request(self, ticketType, quantity, seed=None):
+        result, = self.requestMany([(ticketType, quantity, seed)])
+        if isinstance(result, TicketError):
+            raise result
+        return result
+
+    def requestMany(self, requests):
+        # replies come back in request order; a failed request yields its TicketError
+        results = [None] * len(requests)
+        pending = collections.deque(range(len(requests)))
+        while pending:
+            depth = PIPELINE_DEPTH if self.keepAlive else 1
+            rounds = []
+            # send one window of requests on every pooled connection, then collect the replies
+            for _ in range(self.poolSize):
+                if not pending:
+                    break
+                window = [pending.popleft() for _ in range(min(depth, len(pending)))]
+                connection = self.connection()
+                try:
+                    connection.send([requests[index] for index in window])
+                except ConnectionError:
+                    self.dropConnection(connection, len(window))
+                    pending.extendleft(reversed(window))
+                    continue
+                rounds.append((connection, window))
+
+            for connection, window in rounds:
+                answered = self.receiveWindow(connection, window, results)
+                pending.extendleft(reversed(window[answered:]))
+        return results
+
+    def receiveWindow(self, connection, window, results):
+        answered = 0
+        try:
+            for index in window:
+                try:
+                    results[index] = connection.receive()
+                except TicketError as e:
+                    results[index] = e
+                answered += 1
+        except UnframedReplyError:
+            connection.close()
+            raise
+        except (ConnectionError, ProtocolError):
+            self.dropConnection(connection, len(window))
+            return answered
+        self.release(connection)
+        return answered
 
+    def dropConnection(self, connection, inFlight):
+        # closed after answering (or while pipelining): the server handles one request per connection
+        connection.close()
+        if connection.served == 0 and inFlight <= 1:
+            raise ConnectionAbortedError("server closed the connection without replying")
+        self.keepAlive = False
+
+    def close(self):
+        while self.idle:
+            self.idle.pop().close()
+
+class AsyncTicketConnection:
+    # one persistent connection; replies are matched to requests in order
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.waiting = collections.deque()
+        self.served = 0
+        self.closed = False
+        self.readerTask = asyncio.ensure_future(self.readReplies())
+
+    @classmethod
+    async def open(cls, host, port):
+        reader, writer = await asyncio.open_connection(host, port, family=socket.AF_INET6)
+        writer.get_extra_info("socket").setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return cls(reader, writer)
+
+    async def request(self, ticketType, quantity, seed=None):
+        if self.closed:
+            raise ConnectionAbortedError("server closed the connection")
+        future = asyncio.get_running_loop().create_future()
+        self.waiting.append(future)
+        try:
+            self.writer.write(packRequest(ticketType, quantity, seed))
+            await self.writer.drain()
+        except BaseException:
+            # nobody will wait for this reply any more
+            future.cancel()
+            raise
+        return await future
+
+    async def readReply(self):
+        tickets = []
+        while True:
+            header = await self.reader.readexactly(HEADER.size)
+            magic, version, kind, length = HEADER.unpack(header)
+            if magic != MAGIC:
+                raise UnframedReplyError("server does not speak the binary protocol")
+            payload = await self.reader.readexactly(length)
+            if kind == FRAME_TICKETS:
+                tickets.extend(unpackTickets(payload))
+            elif kind == FRAME_ERROR:
+                return TicketError(payload.decode())
+            elif kind == FRAME_END:
+                return tickets
+
+    async def readReplies(self):
+        error = ConnectionAbortedError("server closed the connection")
+        try:
+            while True:
+                reply = await self.readReply()
+                self.served += 1
+                if not self.waiting:
+                    continue
+                future = self.waiting.popleft()
+                if future.done():
+                    continue
+                if isinstance(reply, TicketError):
+                    future.set_exception(reply)
+                else:
+                    future.set_result(reply)
+        except UnframedReplyError as e:
+            error = e
+        except (asyncio.IncompleteReadError, ConnectionError, ProtocolError):
+            pass
+        finally:
+            self.closed = True
+            while self.waiting:
+                future = self.waiting.popleft()
+                if not future.done():
+                    future.set_exception(error)
+            self.writer.close()
+
+    async def close(self):
+        self.readerTask.cancel()
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except ConnectionError:
+            pass
+
+class AsyncTicketClient:
+    # asyncio client: requests are spread over a pool of pipelined connections
+    def __init__(self, host, port, poolSize=4):
+        self.host = host
+        self.port = port
+        self.poolSize = poolSize
+        self.connections = []
+        self.nextConnection = 0
+        self.connecting = asyncio.Lock()
+        self.keepAlive = True
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def connection(self):
+        if not self.keepAlive:
+            return await AsyncTicketConnection.open(self.host, self.port)
+        # serialise connects so concurrent requests share the pool instead of each opening a socket
+        async with self.connecting:
+            self.connections = [connection for connection in self.connections if not connection.closed]
+            if len(self.connections) < self.poolSize:
+                connection = await AsyncTicketConnection.open(self.host, self.port)
+                self.connections.append(connection)
+                return connection
+        self.nextConnection = (self.nextConnection + 1) % len(self.connections)
+        return self.connections[self.nextConnection]
+
+    async def request(self, ticketType, quantity, seed=None):
+        pooled = self.keepAlive
+        connection = await self.connection()
+        try:
+            return await connection.request(ticketType, quantity, seed)
+        except (ConnectionAbortedError, ConnectionResetError, BrokenPipeError):
+            if not pooled:
+                raise
+            # the server closes after every reply: stop sharing connections and retry once
+            self.keepAlive = False
+            return await self.request(ticketType, quantity, seed)
+        finally:
+            if not pooled:
+                await connection.close()
+
+    async def requestMany(self, requests):
+        return await asyncio.gather(*(self.request(*request) for request in requests),
+                                    return_exceptions=True)
+
+    async def close(self):
+        for connection in self.connections:
+            await connection.close()
+        self.connections = []
+
+def formatTickets(tickets):
+    return "".join([f"{i}. {', '.join(map(str, ticket))}\n" for i, ticket in enumerate(tickets, 1)])
+
+def requestText(host, port, ticketType, quantity, seed=None):
+    # legacy text protocol: the reply ends when the server closes the connection
+    clientSocket = socket.socket(socket.AF_INET6, socket.SOCK_STREAM)
     try:
         clientSocket.connect((host, port))
+        request = f"{ticketType},{quantity}" if seed is None else f"{ticketType},{quantity},{seed}"
+        clientSocket.sendall(request.encode())
+        response = bytearray()
+        while True:
+            chunk = clientSocket.recv(65536)
+            if not chunk:
+                break
+            response += chunk
+        return response.decode()
+    finally:
+        clientSocket.close()
+
+def parseTickets(response):
+    # text protocol reply -> (tickets, error)
+    if response.startswith("Error"):
+        return None, response
+    tickets = []
+    for line in response.splitlines():
+        if ". " in line:
+            tickets.append([int(number) for number in line.split(". ", 1)[1].split(", ")])
+    return tickets, None
+
+class ResultWriter:
+    # single writer stage for the results file: records are queued by the request code,
+    # batched by a background thread and appended with one write (under flock) per flush
+    def __init__(self, path="GeneratedTickets.txt", outputFormat="text", batchSize=256, flushInterval=0.5,
+                 fsyncInterval=1.0):
+        self.path = path
+        self.outputFormat = outputFormat
+        self.batchSize = batchSize
+        self.flushInterval = flushInterval
+        self.fsyncInterval = fsyncInterval  # None: never fsync, 0: fsync every flush
+        self.records = queue.Queue()
+        self.store = self.file = None
+        if outputFormat == "store":
+            # path is a TicketStore directory: indexed records instead of one flat file
+            self.store = TicketStore(path)
+        else:
+            self.file = open(path, "ab")
+            if not stat.S_ISREG(os.fstat(self.file.fileno()).st_mode):
+                # pipes and devices such as /dev/null cannot be fsynced
+                self.fsyncInterval = None
+        self.lastSync = time.monotonic()
+        self.header = outputFormat == "text"  # "Generated Tickets:" starts a new text file
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, identifier, ticketType, tickets=None, error=None):
+        self.records.put(self.encode(identifier, ticketType, tickets, error))
+
+    def encode(self, identifier, ticketType, tickets, error):
+        if self.outputFormat == "store":
+            return encodeRecord(identifier, ticketType, tickets, error)
+        if self.outputFormat == "jsonl":
+            record = {"identifier": identifier, "ticketType": ticketType}
+            if error is None:
+                record["tickets"] = [list(ticket) for ticket in tickets]
+            else:
+                record["error"] = error
+            return (json.dumps(record) + "\n").encode()
+        if self.outputFormat == "binary":
+            identifierBytes, typeBytes = identifier.encode(), ticketType.encode()
+            errorBytes = error.encode() if error is not None else b""
+            tickets = tickets or []
+            rowLength = len(tickets[0]) if tickets else 0
+            header = RESULT_RECORD.pack(len(identifierBytes), len(typeBytes), len(tickets), rowLength, len(errorBytes))
+            return b"".join([header, identifierBytes, typeBytes, errorBytes] + [bytes(ticket) for ticket in tickets])
+        response = error if error is not None else formatTickets(tickets)
+        return f"Identifier: {identifier}\nTicket Type: {ticketType}\n{response}\n".encode()
+
+    def run(self):
+        batch = []
+        deadline = time.monotonic() + self.flushInterval
+        while True:
+            try:
+                record = self.records.get(timeout=max(0, deadline - time.monotonic()))
+            except queue.Empty:
+                record = b""
+            if record is None:
+                self.flush(batch)
+                return
+            if record:
+                batch.append(record)
+            if len(batch) >= self.batchSize or time.monotonic() >= deadline:
+                self.flush(batch)
+                batch = []
+                deadline = time.monotonic() + self.flushInterval
+
+    def flush(self, batch):
+        if not batch:
+            return
+        if self.store is not None:
+            sync = self.fsyncInterval is not None and time.monotonic() - self.lastSync >= self.fsyncInterval
+            self.store.appendEncoded(batch, sync)
+            if sync:
+                self.lastSync = time.monotonic()
+            return
+        # hold the lock for the whole batch so concurrent clients never interleave records
+        fcntl.flock(self.file, fcntl.LOCK_EX)
+        try:
+            if self.header:
+                # checked under the lock: another client may have written the file meanwhile
+                self.header = False
+                if self.file.seek(0, os.SEEK_END) == 0:
+                    batch = [b"Generated Tickets:\n"] + batch
+            self.file.write(b"".join(batch))
+            self.file.flush()
+            if self.fsyncInterval is not None and time.monotonic() - self.lastSync >= self.fsyncInterval:
+                os.fsync(self.file.fileno())
+                self.lastSync = time.monotonic()
+        finally:
+            fcntl.flock(self.file, fcntl.LOCK_UN)
 
-        request = f"{ticketType},{quantity}"
-        clientSocket.send(request.encode())
+    def close(self):
+        self.records.put(None)
+        self.thread.join()
+        if self.store is not None:
+            if self.fsyncInterval is not None:
+                self.store.sync()
+            self.store.close()
+            return
+        if self.fsyncInterval is not None:
+            os.fsync(self.file.fileno())
+        self.file.close()
 
-        response = clientSocket.recv(1024).decode()
-        print(response)
+def recordResponse(identifier, ticketType, tickets, error, writer):
+    print(error if error is not None else formatTickets(tickets))
+    if identifier:
+        writer.write(identifier, ticketType, tickets, error)
 
-        if identifier:
-            with open("GeneratedTickets.txt", "a") as file:
-                if not os.path.isfile("GeneratedTickets.txt"):
-                    file.write("Generated Tickets:\n")
-                file.write(f"Identifier: {identifier}\n")
-                file.write(f"Ticket Type: {ticketType}\n")
-                file.write(response)
-                file.write("\n")
+def requestTickets(host, port, ticketType, quantity, identifier, textProtocol=False, client=None, writer=None, seed=None):
+    ownWriter = writer is None
+    try:
+        tickets = error = None
+        if not textProtocol:
+            ticketClient = client or TicketClient(host, port, poolSize=1)
+            try:
+                tickets = ticketClient.request(ticketType, quantity, seed)
+            except TicketError as e:
+                error = str(e)
+            except UnframedReplyError:
+                # older server: fall back to the text protocol
+                textProtocol = True
+            finally:
+                if client is None:
+                    ticketClient.close()
+
+        if textProtocol:
+            tickets, error = parseTickets(requestText(host, port, ticketType, quantity, seed))
+        writer = writer or ResultWriter()
+        recordResponse(identifier, ticketType, tickets, error, writer)
 
     except ConnectionRefusedError:
         print("Connection refused. Make sure the server is running.")
 
+    except OSError as e:
+        # e.g. the server reset the connection or the results file cannot be written
+        print(f"Request failed: {str(e)}")
+
     finally:
-        clientSocket.close()
+        if ownWriter and writer is not None:
+            writer.close()
+
+def generateRequests(host, port, ticketType, quantity, identifier, requests, textProtocol=False, writer=None, seed=None):
+    # all requests share one pooled, pipelining client instead of a forked child each
+    ownWriter = writer is None
+    writer = writer or ResultWriter()
+    try:
+        replies = None
+        if not textProtocol:
+            try:
+                with TicketClient(host, port) as client:
+                    replies = client.requestMany([(ticketType, quantity, seed)] * requests)
+            except UnframedReplyError:
+                # older server: fall back to the text protocol
+                replies = None
+            except ConnectionRefusedError:
+                print("Connection refused. Make sure the server is running.")
+                return
+            except OSError as e:
+                # the server dropped the connection, e.g. when it refused the client
+                print(f"Connection failed: {str(e)}")
+                return
+
+        if replies is None:
+            for i in range(requests):
+                requestTickets(host, port, ticketType, quantity, f"{identifier}_{i+1}", textProtocol=True, writer=writer,
+                               seed=seed)
+            return
+
+        for i, reply in enumerate(replies):
+            if isinstance(reply, TicketError):
+                recordResponse(f"{identifier}_{i+1}", ticketType, None, str(reply), writer)
+            else:
+                recordResponse(f"{identifier}_{i+1}", ticketType, reply, None, writer)
+
+    finally:
+        if ownWriter:
+            writer.close()
+
+class LatencyHistogram:
+    # HDR-style log-linear histogram: 2**SUB_BUCKET_BITS buckets per power of two (< 1% error)
+    SUB_BUCKET_BITS = 7
+
+    def __init__(self):
+        self.counts = collections.Counter()
+        self.count = 0
+        self.total = 0
+        self.minimum = None
+        self.maximum = 0
+
+    def bucketIndex(self, value):
+        subBuckets = 1 << self.SUB_BUCKET_BITS
+        if value < subBuckets:
+            return value
+        shift = value.bit_length() - self.SUB_BUCKET_BITS
+        return subBuckets + (shift - 1) * (subBuckets >> 1) + (value >> shift) - (subBuckets >> 1)
+
+    def bucketValue(self, index):
+        # midpoint of the values that share a bucket
+        subBuckets = 1 << self.SUB_BUCKET_BITS
+        if index < subBuckets:
+            return index
+        shift, offset = divmod(index - subBuckets, subBuckets >> 1)
+        shift += 1
+        lowest = (offset + (subBuckets >> 1)) << shift
+        return lowest + ((1 << shift) >> 1)
+
+    def record(self, value):
+        value = max(0, int(value))
+        self.counts[self.bucketIndex(value)] += 1
+        self.count += 1
+        self.total += value
+        self.minimum = value if self.minimum is None else min(self.minimum, value)
+        self.maximum = max(self.maximum, value)
+
+    def merge(self, other):
+        self.counts.update(other.counts)
+        self.count += other.count
+        self.total += other.total
+        if other.minimum is not None:
+            self.minimum = other.minimum if self.minimum is None else min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+
+    def valueAtPercentile(self, percentile):
+        if not self.count:
+            return 0
+        target = max(1, percentile / 100 * self.count)
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                return min(self.bucketValue(index), self.maximum)
+        return self.maximum
+
+    def summary(self):
+        return {
+            "min": self.minimum or 0,
+            "mean": self.total / self.count if self.count else 0,
+            "p50": self.valueAtPercentile(50),
+            "p90": self.valueAtPercentile(90),
+            "p99": self.valueAtPercentile(99),
+            "p999": self.valueAtPercentile(99.9),
+            "max": self.maximum,
+        }
 
-def generateRequests(host, port, ticketType, quantity, identifier, requests):
-    for i in range(requests):
-        pid = os.fork()
+async def runLoad(host, port, ticketType, quantity, concurrency, rate, duration, warmup):
+    # closed loop (rate 0): concurrency requests always in flight
+    # open loop (rate > 0): requests start on a fixed schedule and latency is measured from the
+    # scheduled start, so a stalled server is not hidden by the client waiting on it
+    histogram = LatencyHistogram()
+    errors = collections.Counter()
+    loop = asyncio.get_running_loop()
 
-        if pid == 0:
-            # Child process
-            requestTickets(host, port, ticketType, quantity, f"{identifier}_{i+1}")
-            os._exit(os.EX_OK)  # Terminate child process
-            
+    async with AsyncTicketClient(host, port, poolSize=concurrency) as client:
+        start = loop.time()
+        measureFrom = start + warmup
+        stop = measureFrom + duration
+
+        async def timedRequest(scheduled):
+            try:
+                await client.request(ticketType, quantity)
+            except (TicketError, OSError, ProtocolError, asyncio.IncompleteReadError) as e:
+                if scheduled >= measureFrom:
+                    errors[type(e).__name__] += 1
+            else:
+                if scheduled >= measureFrom:
+                    histogram.record((loop.time() - scheduled) * 1e6)
+
+        if rate > 0:
+            inFlight = asyncio.Semaphore(concurrency)
+            tasks = set()
+            sent = 0
+            while True:
+                scheduled = start + sent / rate
+                if scheduled >= stop:
+                    break
+                delay = scheduled - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                await inFlight.acquire()
+                task = asyncio.ensure_future(timedRequest(scheduled))
+                task.add_done_callback(lambda task: inFlight.release())
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                sent += 1
+            await asyncio.gather(*tasks)
+        else:
+            async def worker():
+                while loop.time() < stop:
+                    await timedRequest(loop.time())
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+        elapsed = max(loop.time(), stop) - measureFrom
+
+    return {
+        "host": host,
+        "port": port,
+        "ticketType": ticketType,
+        "quantity": quantity,
+        "mode": "open" if rate > 0 else "closed",
+        "concurrency": concurrency,
+        "rate": rate,
+        "warmup": warmup,
+        "duration": duration,
+        "requests": histogram.count,
+        "errors": dict(errors),
+        "throughput": histogram.count / elapsed if elapsed else 0,
+        "latencyMicroseconds": histogram.summary(),
+    }
+
+def printLoadReport(result):
+    latency = result["latencyMicroseconds"]
+    print(f"{result['mode']} loop, concurrency {result['concurrency']}, {result['duration']}s after {result['warmup']}s warmup")
+    print(f"requests: {result['requests']}  errors: {sum(result['errors'].values())} {result['errors'] or ''}")
+    print(f"throughput: {result['throughput']:.1f} requests/s")
+    print("latency (ms): " + "  ".join(f"{name} {latency[name] / 1000:.3f}" for name in
+                                        ("min", "mean", "p50", "p90", "p99", "p999", "max")))
+
+def generateLoad(host, port, ticketType, quantity, concurrency, rate, duration, warmup, jsonFile):
+    result = asyncio.run(runLoad(host, port, ticketType, quantity, concurrency, rate, duration, warmup))
+    printLoadReport(result)
+    if jsonFile:
+        with open(jsonFile, "w") as file:
+            json.dump(result, file, indent=2)
 
 def main():
     parser = argparse.ArgumentParser(description="Lottery Ticket Generator (Client)")
@@ -84,14 +701,37 @@ def main():
     parser.add_argument("-q", "--quantity", type=int, default=random.randint(1,10), help="Number of tickets per request (default is 1)")
     parser.add_argument("-i", "--identifier", type=str, default="none", help="Unique identifier")
     parser.add_argument("-n", "--requests", type=int, default=1, help="Number of requests (default is 1)")
+    parser.add_argument("-S", "--seed", type=int, help="Replay the tickets of this seed (0 to 2**64-1) instead of a fresh draw")
+    parser.add_argument("--text", action="store_true", help="Use the legacy text protocol instead of the binary one")
+    parser.add_argument("-o", "--output", type=str, default="GeneratedTickets.txt", help="Results file (default is GeneratedTickets.txt)")
+    parser.add_argument("-f", "--format", choices=["text", "jsonl", "binary", "store"], default="text", help="Results file format, store keeps an indexed ticket store in the -o directory (default is text)")
+    parser.add_argument("--fsync-interval", type=float, default=1.0, help="Seconds between fsyncs of the results file, -1 to never fsync (default is 1)")
+    parser.add_argument("--load", action="store_true", help="Run a load test instead of -n requests")
+    parser.add_argument("-c", "--concurrency", type=int, default=8, help="Load test: requests in flight (default is 8)")
+    parser.add_argument("-r", "--rate", type=float, default=0, help="Load test: target requests/s, 0 for closed loop (default is 0)")
+    parser.add_argument("-d", "--duration", type=float, default=10, help="Load test: measured seconds (default is 10)")
+    parser.add_argument("-w", "--warmup", type=float, default=2, help="Load test: unmeasured warmup seconds (default is 2)")
+    parser.add_argument("-j", "--json", type=str, help="Load test: write the results to this JSON file")
     args = parser.parse_args()
 
     # Validate the provided arguments
     if not args.host or not args.port or not args.ticket or not args.quantity or not args.identifier or not args.requests:
         parser.print_help()
         return
-    
-    generateRequests(args.host, args.port, args.ticket, args.quantity, args.identifier, args.requests)
+    if not 0 < args.quantity < 2 ** 32:
+        parser.error("--quantity must be between 1 and 2**32-1")
+    if args.seed is not None and not 0 <= args.seed < 2 ** 64:
+        parser.error("--seed must be between 0 and 2**64-1")
+
+    if args.load:
+        generateLoad(args.host, args.port, args.ticket, args.quantity, args.concurrency, args.rate,
+                     args.duration, args.warmup, args.json)
+        return
+
+    fsyncInterval = args.fsync_interval if args.fsync_interval >= 0 else None
+    with ResultWriter(args.output, args.format, fsyncInterval=fsyncInterval) as writer:
+        generateRequests(args.host, args.port, args.ticket, args.quantity, args.identifier, args.requests, args.text,
+                         writer, args.seed)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,119 @@
+#!/usr/bin/python3
+
+# ==============================================================================
+#   Assignment:  Milestone 3
+#
+#   Author:  Fatemeh Zahedi
+#   Language:  Python3 (struct library)
+#   To Compile:  -
+#
+#   Class:  Python for Programmers: Sockets and Security - DPI912NSA
+#   Professor:  Harvey Kaduri
+#
+# -----------------------------------------------------------------------------
+#
+#   Description: Framed binary wire protocol shared by the lottery client and server.
+#
+#   Frame:  magic "LT" (2 bytes) | version (1 byte) | kind (1 byte) | payload length (4 bytes, big endian) | payload
+#           REQUEST payload: quantity (4 bytes) | ticket type (ascii)
+#           SEEDED REQUEST payload: quantity (4 bytes) | seed (8 bytes) | ticket type (ascii)
+#           TICKETS payload: ticket count (4 bytes) | numbers per ticket (1 byte) | one byte per ticket number
+#           END payload:     total tickets sent (4 bytes)
+#           ERROR payload:   error message (utf-8)
+#
+#   Algorithm: A client that speaks the binary protocol starts its request with the magic bytes.
+#              Anything else is treated as the legacy "type,quantity" text request, so old clients
+#              keep receiving the text reply. The server answers with the lower of the two versions.
+# ==============================================================================
+
+import struct
+
+MAGIC = b"LT"
+PROTOCOL_VERSION = 1
+
+FRAME_REQUEST = 1
+FRAME_TICKETS = 2
+FRAME_END = 3
+FRAME_ERROR = 4
+FRAME_SEEDED_REQUEST = 5
+
+HEADER = struct.Struct("!2sBBI")
+REQUEST = struct.Struct("!I")
+SEEDED_REQUEST = struct.Struct("!IQ")
+TICKETS = struct.Struct("!IB")
+END = struct.Struct("!I")
+
+MAX_PAYLOAD = 64 * 1024 * 1024  # refuse frames larger than this
+
+class ProtocolError(Exception):
+    pass
+
+def isFramed(data):
+    return data[:len(MAGIC)] == MAGIC
+
+def packFrame(kind, payload, version=PROTOCOL_VERSION):
+    return HEADER.pack(MAGIC, version, kind, len(payload)) + payload
+
+def packRequest(ticketType, quantity, seed=None, version=PROTOCOL_VERSION):
+    # a seed asks the server to replay the tickets that seed always produces
+    if seed is None:
+        return packFrame(FRAME_REQUEST, REQUEST.pack(quantity) + ticketType.encode(), version)
+    return packFrame(FRAME_SEEDED_REQUEST, SEEDED_REQUEST.pack(quantity, seed) + ticketType.encode(), version)
+
+def unpackRequest(payload, kind=FRAME_REQUEST):
+    # returns (ticket type, quantity, seed or None)
+    if kind == FRAME_SEEDED_REQUEST:
+        if len(payload) < SEEDED_REQUEST.size:
+            raise ProtocolError("truncated request frame")
+        quantity, seed = SEEDED_REQUEST.unpack_from(payload)
+        return payload[SEEDED_REQUEST.size:].decode(), quantity, seed
+    if len(payload) < REQUEST.size:
+        raise ProtocolError("truncated request frame")
+    quantity, = REQUEST.unpack_from(payload)
+    return payload[REQUEST.size:].decode(), quantity, None
+
+def packTickets(tickets, version=PROTOCOL_VERSION):
+    # tickets is a TicketBatch: its buffer already holds one byte per number
+    header = TICKETS.pack(len(tickets), tickets.rowLength)
+    return packFrame(FRAME_TICKETS, header + bytes(tickets.view()), version)
+
+def unpackTickets(payload):
+    if len(payload) < TICKETS.size:
+        raise ProtocolError("truncated tickets frame")
+    count, rowLength = TICKETS.unpack_from(payload)
+    numbers = memoryview(payload)[TICKETS.size:]
+    if len(numbers) != count * rowLength:
+        raise ProtocolError("tickets frame length does not match its header")
+    return [numbers[start:start + rowLength] for start in range(0, count * rowLength, rowLength)]
+
+def packEnd(total, version=PROTOCOL_VERSION):
+    return packFrame(FRAME_END, END.pack(total), version)
+
+def packError(message, version=PROTOCOL_VERSION):
+    return packFrame(FRAME_ERROR, message.encode(), version)
+
+def receiveExactly(sock, size, buffered=b""):
+    # read exactly size bytes, starting with whatever was already received
+    data = bytearray(buffered)
+    while len(data) < size:
+        chunk = sock.recv(max(size - len(data), 65536))
+        if not chunk:
+            raise ProtocolError("connection closed in the middle of a frame")
+        data += chunk
+    return bytes(data[:size]), bytes(data[size:])
+
+def readFrame(sock, buffered=b""):
+    # returns (version, kind, payload, leftover bytes)
+    header, buffered = receiveExactly(sock, HEADER.size, buffered)
+    magic, version, kind, length = HEADER.unpack(header)
+    if magic != MAGIC:
+        raise ProtocolError("bad frame magic")
+    if length > MAX_PAYLOAD:
+        raise ProtocolError(f"frame of {length} bytes is too large")
+    payload, buffered = receiveExactly(sock, length, buffered)
+    return version, kind, payload, buffered
+
+def negotiateVersion(clientVersion):
+    if clientVersion < 1:
+        raise ProtocolError(f"unsupported protocol version {clientVersion}")
+    return min(clientVersion, PROTOCOL_VERSION)
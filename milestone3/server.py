@@ -37,129 +37,1537 @@
 
 
 import argparse
+import asyncio
 import random
 import socket
 import signal
 import os
 import errno
+import selectors
 import fcntl
 import logzero
+import logging
 import time
 import atexit
+import json
 import sys
+import mmap
+import multiprocessing
+import struct
+import threading
+import hashlib
+import functools
+import itertools
+import bisect
+import collections
+import ipaddress
 
 from logzero import logger
+from protocol import (FRAME_REQUEST, FRAME_SEEDED_REQUEST, HEADER, MAGIC, MAX_PAYLOAD, PROTOCOL_VERSION, ProtocolError, isFramed,
+                      negotiateVersion, packEnd, packError, packTickets, readFrame, unpackRequest)
+from ticketcodec import TicketCodec
 
 PID_FILE = "server.pid"  # PID file name
+TICKET_TYPES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ticket_types.json")
+TICKET_CHUNK_SIZE = 4096  # tickets generated and sent per chunk
+SHARED_POOL_REFILL_BATCH = 1024  # tickets per type the parent generates between accepts
+SHARED_POOL_POLL_INTERVAL = 1.0  # seconds between pool checks of an idle parent
+SHARED_POOL_LOCK_TIMEOUT = 1.0  # seconds to wait for the pool lock before taking its holder for dead
+PARALLEL_THRESHOLD = 100000  # tickets in one request before generation is split across processes
+PARALLEL_BLOCK = 1000000  # tickets generated per parallel round of a streamed request
+RANDOM_MODES = ("fast", "secure")  # Mersenne Twister, or os.urandom for real draws
+ENTROPY_BUFFER = 16384  # bytes of os.urandom read at once by the secure mode
+MAX_SEED = 2 ** 64 - 1  # request seeds must fit the 8 byte field of the binary protocol
+UNIQUE_SCAN_FRACTION = 0.25  # unique requests above this share of all tickets select ranks instead of redrawing
+UNIQUE_SET_ENTRY = 64  # bytes a set of issued ranks takes per ticket, about
+UNIQUE_MEMORY_LIMIT = 64 * 1024 * 1024  # bytes one unique request may use to track or select its tickets
+DRAW_METHODS = ("shuffle", "rank")  # draw numbers one by one, or draw one uniform rank per ticket
+RANK_DRAW_LIMIT = 2 ** 53  # a float draw cannot reach every rank of types with more combinations
+LOG_FILE = "server.log"
+LOG_MAX_BYTES = 1000000  # server.log is rotated at this size
+LOG_BACKUP_COUNT = 3  # rotated logs kept: server.log.1 .. server.log.3
+LOG_BATCH = 256  # log lines written by the log writer at once
+LOG_FLUSH_INTERVAL = 0.5  # seconds a log line may wait in the log writer
+LOG_RECORD_MAX = 8192  # longer log lines are cut
+LOG_SOCKET_BUFFER = 4 * 1024 * 1024  # log lines the kernel holds for the log writer before lines are dropped
+LOG_CONNECTION_RATE = 50  # "Accepted connection" lines per second and process (-1 for all, 0 for none)
+METRICS_FILE = "server.metrics"  # shared counters of the running server, read by "server.py stats"
+METRICS_SLOTS = 256  # counter slots: the master, one shared by handlers beyond the slots, one per handler or worker
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+REQUEST_PHASES = ("parse", "generate", "format", "send")
+ERROR_TYPES = (("ProtocolError", ProtocolError), ("ValueError", ValueError), ("KeyError", KeyError), ("OSError", OSError))
+ACCEPT_RATE_WINDOW = 10  # seconds the accept rate is averaged over
+PROFILE_DIR = "profiles"  # folded stacks of sampled requests, one file per worker
+PROFILE_FRACTION = 0.01  # share of requests sampled when SIGUSR1 turns profiling on without --profile
+PROFILE_INTERVAL = 0.001  # seconds of CPU time between stack samples of a sampled request
+PROFILE_FLUSH_INTERVAL = 5.0  # seconds a worker keeps its stacks before appending them to its file
+MAX_HANDLERS = 128  # forked handlers or asyncio connections served at once (0 for no limit)
+MAX_QUANTITY = 10000000  # tickets per request
+ADMISSION_CLIENTS = 65536  # clients whose request rate is tracked, the least recently seen is dropped first
+REJECT_BACKLOG = 1024  # refused connections waiting for their request to get the error; more are closed at once
+REJECT_TIMEOUT = 1.0  # seconds a refused connection has to send its request
+ACCEPT_BACKOFF = 0.1  # seconds accepting pauses when the server runs out of file descriptors
+WORKER_RESTART_LIMIT = 10  # pre-forked workers that may die within WORKER_RESTART_WINDOW before restarts are delayed
+WORKER_RESTART_WINDOW = 10.0  # seconds
+WORKER_RESTART_DELAY = 1.0  # seconds between restarts of workers beyond WORKER_RESTART_LIMIT
 
 class LotteryTicket:
     def __init__(self, ticketType, numbersPerTicket, numbersRange):
+        if not isinstance(ticketType, str) or not ticketType:
+            raise ValueError("ticket type name must be a non-empty string")
+        if not isinstance(numbersRange, int) or not 2 <= numbersRange <= 256:
+            raise ValueError(f"{ticketType}: numbersRange must be an integer from 2 to 256")
+        poolSize = numbersRange - 1
+        if not isinstance(numbersPerTicket, list) or not numbersPerTicket or \
+                not all(isinstance(length, int) and 1 <= length <= poolSize for length in numbersPerTicket):
+            raise ValueError(f"{ticketType}: numbersPerTicket must be a list of set sizes from 1 to {poolSize}")
+        if sum(numbersPerTicket) > 255:
+            raise ValueError(f"{ticketType}: at most 255 numbers per ticket")
         self.ticketType = ticketType
         self.numbersPerTicket = numbersPerTicket
         self.numbersRange = numbersRange
 
+        # draw tables, computed once per type instead of once per request
+        self.ticketPool = bytearray(range(1, numbersRange))
+        # partial Fisher-Yates: (position, remaining width) for every draw of each set
+        self.drawSteps = [[(j, poolSize - j) for j in range(length)] for length in numbersPerTicket]
+        # combination ranks of this type's tickets, for unique batches and rank draws
+        self.codec = TicketCodec(numbersPerTicket, poolSize)
+        self.combinations = self.codec.combinations
+        self.rowLength = sum(numbersPerTicket)
+        # output template: numbers of a set joined by ", ", sets joined by " | "
+        self.numberFormat = " | ".join(", ".join(["{}"] * length) for length in numbersPerTicket)
+
+class TicketBatch:
+    # compact ticket container: one contiguous uint8 buffer shaped
+    # quantity x rowLength, where rowLength = sum(numbersPerTicket)
+    __slots__ = ("numbers", "quantity", "numbersPerTicket", "rowLength")
+
+    def __init__(self, numbers, numbersPerTicket):
+        self.numbers = numbers
+        self.numbersPerTicket = numbersPerTicket
+        self.rowLength = sum(numbersPerTicket)
+        self.quantity = len(numbers) // self.rowLength if self.rowLength else 0
+
+    def __len__(self):
+        return self.quantity
+
+    def __getitem__(self, index):
+        # numbers of one ticket as a zero-copy view
+        if index < 0:
+            index += self.quantity
+        if not 0 <= index < self.quantity:
+            raise IndexError("ticket index out of range")
+        start = index * self.rowLength
+        return self.view()[start:start + self.rowLength]
+
+    def __iter__(self):
+        numbers = self.view()
+        rowLength = self.rowLength
+        for start in range(0, self.quantity * rowLength, rowLength):
+            yield numbers[start:start + rowLength]
+
+    def view(self):
+        return memoryview(self.numbers)
+
+    def ticketSets(self, index):
+        # split one ticket back into its sets of numbers
+        ticket = self[index]
+        sets = []
+        position = 0
+        for length in self.numbersPerTicket:
+            sets.append(ticket[position:position + length])
+            position += length
+        return sets
+
 class LotteryTicketGenerator:
-    def __init__(self):
-        self.lottoTicketTypes = {
+    def __init__(self, lottoTicketTypes=None, processes=1, randomMode="fast", unique=False, drawMethod="shuffle"):
+        if randomMode not in RANDOM_MODES:
+            raise ValueError(f"random mode must be one of {', '.join(RANDOM_MODES)}")
+        if drawMethod not in DRAW_METHODS:
+            raise ValueError(f"draw method must be one of {', '.join(DRAW_METHODS)}")
+        self.processes = processes  # processes a request of PARALLEL_THRESHOLD tickets or more is split across
+        self.randomMode = randomMode
+        self.unique = unique  # issue every request without duplicate tickets
+        self.drawMethod = drawMethod
+        self.lottoTicketTypes = lottoTicketTypes or {
             "max": LotteryTicket("LOTTO MAX", [7], 50),
             "6/49": LotteryTicket("LOTTO 6/49", [6], 49),
             "daily": LotteryTicket("DAILY GRAND", [5], 49)
         }
+
+    @classmethod
+    def fromFile(cls, path):
+        # {"<key>": {"name": ..., "numbersPerTicket": [...], "numbersRange": ...}, ...}
+        with open(path, "r") as configFile:
+            config = json.load(configFile)
+        if not isinstance(config, dict) or not config:
+            raise ValueError(f"{path}: expected an object of ticket types")
+        lottoTicketTypes = {}
+        for key, entry in config.items():
+            if not isinstance(entry, dict) or set(entry) != {"name", "numbersPerTicket", "numbersRange"}:
+                raise ValueError(f"{path}: ticket type {key!r} needs exactly name, numbersPerTicket and numbersRange")
+            if "," in key or not key.strip():
+                raise ValueError(f"{path}: ticket type key {key!r} cannot be empty or contain a comma")
+            lottoTicketTypes[key] = LotteryTicket(entry["name"], entry["numbersPerTicket"], entry["numbersRange"])
+        return cls(lottoTicketTypes)
     
-    def generateTickets(self, quantityOfTicket, typeOfTicket):
-        tickets = []
+    def drawTickets(self, quantityOfTicket, typeOfTicket, draw):
+        # draw every ticket into one flat byte matrix
+        # (quantityOfTicket rows of sum(numbersPerTicket) numbers each)
+        if self.drawMethod == "rank" and typeOfTicket.combinations <= RANK_DRAW_LIMIT:
+            # one uniform rank per ticket, decoded with its sets in ascending order
+            total = typeOfTicket.combinations
+            return typeOfTicket.codec.decodeBatch([int(draw() * total) for _ in range(quantityOfTicket)])
+        ticketPool = typeOfTicket.ticketPool
+        drawSteps = typeOfTicket.drawSteps
+        numbers = bytearray(quantityOfTicket * typeOfTicket.rowLength)
+        position = 0
         for _ in range(quantityOfTicket):
-            ticket = []
-            for length in typeOfTicket.numbersPerTicket:
-                ticketSet = []
-                ticketPool = list(range(1, typeOfTicket.numbersRange))
-                remainingPool = len(ticketPool) - 1 if ticketPool else None
-                for _ in range(length):
-                    if ticketPool:
-                        randomIndex = random.randint(0, remainingPool)
-                        ticketSet.append(ticketPool.pop(randomIndex))
-                        remainingPool -= 1
-                ticket.append(ticketSet)
+            for steps in drawSteps:
+                # every set is drawn from a fresh copy of the pool
+                pool = ticketPool[:]
+                for j, width in steps:
+                    randomIndex = j + int(draw() * width)
+                    pool[j], pool[randomIndex] = pool[randomIndex], pool[j]
+                length = len(steps)
+                numbers[position:position + length] = pool[:length]
+                position += length
+        return numbers
+
+    def randomSource(self, seed=None):
+        # draw() returning floats in [0, 1); a seeded request replays through its own fast stream,
+        # which a server drawing securely must not hand out: anyone could predict those tickets
+        if seed is not None:
+            if self.randomMode == "secure":
+                raise ValueError("seeded requests are not served in secure random mode")
+            return random.Random(seed).random
+        if self.randomMode == "secure":
+            return secureRandom()
+        return random.random
+
+    def generateTicketBatch(self, quantityOfTicket, typeOfTicket, seed=None):
+        if seed is None and self.processes > 1 and quantityOfTicket >= PARALLEL_THRESHOLD:
+            return self.generateParallelBatch(quantityOfTicket, typeOfTicket)
+        draw = self.randomSource(seed)
+        return TicketBatch(self.drawTickets(quantityOfTicket, typeOfTicket, draw), typeOfTicket.numbersPerTicket)
+
+    def generateParallelBatch(self, quantityOfTicket, typeOfTicket):
+        # split one large request across forked processes: each draws its share with
+        # its own random stream straight into one shared buffer, so nothing is merged afterwards
+        processes = min(self.processes, quantityOfTicket)
+        rowLength = typeOfTicket.rowLength
+        size = quantityOfTicket * rowLength
+        shared = mmap.mmap(-1, size + processes)  # ticket numbers, then one done flag per process
+        seeds = spawnSeeds(processes)
+        share = -(-quantityOfTicket // processes)
+        children = []
+        for index in range(processes):
+            first = index * share
+            count = max(0, min(share, quantityOfTicket - first))
+            pid = os.fork()
+            if pid == 0:
+                try:
+                    draw = secureRandom() if self.randomMode == "secure" else random.Random(seeds[index]).random
+                    shared[first * rowLength:(first + count) * rowLength] = self.drawTickets(count, typeOfTicket, draw)
+                    shared[size + index] = 1
+                finally:
+                    os._exit(0)
+            children.append(pid)
+        for pid in children:
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                # already collected by an inherited SIGCHLD handler, the done flag tells
+                pass
+        if shared[size:] != b"\x01" * processes:
+            shared.close()
+            raise ValueError(f"parallel generation of {quantityOfTicket} tickets failed")
+        return TicketBatch(memoryview(shared)[:size], typeOfTicket.numbersPerTicket)
+
+    def generateTicketChunks(self, quantityOfTicket, typeOfTicket, chunkSize, seed=None):
+        # lazily draw a large request as a sequence of smaller batches
+        if seed is not None:
+            # replay: one stream for the whole request, whatever the process count
+            draw = self.randomSource(seed)
+            for start in range(0, quantityOfTicket, chunkSize):
+                numbers = self.drawTickets(min(chunkSize, quantityOfTicket - start), typeOfTicket, draw)
+                yield TicketBatch(numbers, typeOfTicket.numbersPerTicket)
+            return
+        if self.processes > 1 and quantityOfTicket >= PARALLEL_THRESHOLD:
+            # draw big blocks in parallel and hand them out as zero-copy slices
+            rowLength = typeOfTicket.rowLength
+            for block in range(0, quantityOfTicket, PARALLEL_BLOCK):
+                numbers = self.generateTicketBatch(min(PARALLEL_BLOCK, quantityOfTicket - block), typeOfTicket).view()
+                for start in range(0, len(numbers), chunkSize * rowLength):
+                    yield TicketBatch(numbers[start:start + chunkSize * rowLength], typeOfTicket.numbersPerTicket)
+            return
+        for start in range(0, quantityOfTicket, chunkSize):
+            yield self.generateTicketBatch(min(chunkSize, quantityOfTicket - start), typeOfTicket)
+
+    def generateUniqueChunks(self, quantityOfTicket, typeOfTicket, chunkSize, seed=None):
+        # like generateTicketChunks, but no ticket appears twice in the whole request
+        total = typeOfTicket.combinations
+        if quantityOfTicket > total:
+            raise ValueError(f"only {total} different {typeOfTicket.ticketType} tickets exist")
+        draw = self.randomSource(seed)
+        numbersPerTicket = typeOfTicket.numbersPerTicket
+        rowLength = typeOfTicket.rowLength
+        if quantityOfTicket >= total * UNIQUE_SCAN_FRACTION:
+            # near-exhaustive: redrawing duplicates would dominate, select distinct ranks instead;
+            # the selection is shuffled as a whole, so the reply is held in memory
+            if quantityOfTicket * rowLength > UNIQUE_MEMORY_LIMIT:
+                raise ValueError(f"at most {UNIQUE_MEMORY_LIMIT // rowLength} unique {typeOfTicket.ticketType} tickets per request")
+            numbers = self.selectUniqueTickets(quantityOfTicket, typeOfTicket, draw)
+            for start in range(0, len(numbers), chunkSize * rowLength):
+                yield TicketBatch(numbers[start:start + chunkSize * rowLength], numbersPerTicket)
+            return
+
+        # issued ranks in whichever is smaller for this request: a set of them,
+        # or one bit per possible ticket rank
+        bitmapSize = (total + 7) >> 3
+        if min(bitmapSize, quantityOfTicket * UNIQUE_SET_ENTRY) > UNIQUE_MEMORY_LIMIT:
+            raise ValueError(f"at most {UNIQUE_MEMORY_LIMIT // UNIQUE_SET_ENTRY} unique {typeOfTicket.ticketType} tickets per request")
+        bitmap = bytearray(bitmapSize) if bitmapSize <= quantityOfTicket * UNIQUE_SET_ENTRY else None
+        seen = set()
+        rankTicket = typeOfTicket.codec.encode
+        for start in range(0, quantityOfTicket, chunkSize):
+            wanted = min(chunkSize, quantityOfTicket - start) * rowLength
+            numbers = bytearray()
+            while len(numbers) < wanted:
+                candidates = TicketBatch(self.drawTickets((wanted - len(numbers)) // rowLength, typeOfTicket, draw), numbersPerTicket)
+                for ticket in candidates:
+                    rank = rankTicket(ticket)
+                    if bitmap is not None:
+                        mask = 1 << (rank & 7)
+                        if bitmap[rank >> 3] & mask:
+                            continue
+                        bitmap[rank >> 3] |= mask
+                    else:
+                        if rank in seen:
+                            continue
+                        seen.add(rank)
+                    numbers += ticket
+            yield TicketBatch(numbers, numbersPerTicket)
+
+    def selectUniqueTickets(self, quantityOfTicket, typeOfTicket, draw):
+        # selection sampling (Knuth's algorithm S) over every ticket in rank order,
+        # then a Fisher-Yates shuffle of the rows so the reply is not sorted
+        rowLength = typeOfTicket.rowLength
+        numbers = bytearray(quantityOfTicket * rowLength)
+        needed = quantityOfTicket
+        remaining = typeOfTicket.combinations
+        position = 0
+        for ticket in typeOfTicket.codec.everyTicket():
+            if draw() * remaining < needed:
+                numbers[position:position + rowLength] = ticket
+                position += rowLength
+                needed -= 1
+                if not needed:
+                    break
+            remaining -= 1
+        for row in range(quantityOfTicket - 1, 0, -1):
+            other = int(draw() * (row + 1))
+            if other != row:
+                a = row * rowLength
+                b = other * rowLength
+                numbers[a:a + rowLength], numbers[b:b + rowLength] = numbers[b:b + rowLength], numbers[a:a + rowLength]
+        return numbers
+
+    def generateTickets(self, quantityOfTicket, typeOfTicket, seed=None):
+        # store generated tickets
+        batch = self.generateTicketBatch(quantityOfTicket, typeOfTicket, seed)
+        tickets = []
+        for index in range(len(batch)):
+            # store generated ticket
+            ticket = [list(ticketSet) for ticketSet in batch.ticketSets(index)]
             tickets.append(ticket)
         return tickets
 
-def processClientRequest(clientSocket, addr, ticketType, quantity):
-    generator = LotteryTicketGenerator()
+def secureRandom(bufferSize=ENTROPY_BUFFER):
+    # draw() of floats in [0, 1) with 53 random bits each, one os.urandom call per bufferSize // 8 draws
+    unpack = struct.Struct(f"<{bufferSize // 8}Q").unpack
+    def batches():
+        while True:
+            yield [(value >> 11) * (1.0 / 9007199254740992) for value in unpack(os.urandom(bufferSize))]
+    return functools.partial(next, itertools.chain.from_iterable(batches()))
+
+def spawnSeeds(count, entropy=None):
+    # derive independent child seeds from one root value, one per worker process
+    if entropy is None:
+        entropy = int.from_bytes(os.urandom(16), "big")
+    return [int.from_bytes(hashlib.sha256(f"{entropy}/{index}".encode()).digest(), "big") for index in range(count)]
+
+ticketGenerator = LotteryTicketGenerator()  # ticket types of this server, shared by every request
+
+def loadTicketTypes(path):
+    # replace the built-in ticket types with the ones in the config file, once at startup
+    global ticketGenerator
+    ticketGenerator = LotteryTicketGenerator.fromFile(path)
+
+class TicketRing:
+    # fixed-capacity ring buffer of pregenerated tickets of one type
+    def __init__(self, typeOfTicket, capacity):
+        self.typeOfTicket = typeOfTicket
+        self.rowLength = sum(typeOfTicket.numbersPerTicket)
+        self.capacity = capacity
+        self.numbers = bytearray(capacity * self.rowLength)
+        self.head = 0  # first stored ticket
+        self.count = 0
+
+    def put(self, tickets):
+        # append as many tickets as fit
+        stored = min(len(tickets), self.capacity - self.count)
+        numbers = tickets.view()
+        tail = (self.head + self.count) % self.capacity
+        first = min(stored, self.capacity - tail)
+        self.numbers[tail * self.rowLength:(tail + first) * self.rowLength] = numbers[:first * self.rowLength]
+        rest = stored - first
+        self.numbers[:rest * self.rowLength] = numbers[first * self.rowLength:stored * self.rowLength]
+        self.count += stored
+
+    def take(self, quantity):
+        # copy up to quantity tickets out of the ring
+        taken = min(quantity, self.count)
+        first = min(taken, self.capacity - self.head)
+        numbers = self.numbers[self.head * self.rowLength:(self.head + first) * self.rowLength]
+        numbers += self.numbers[:(taken - first) * self.rowLength]
+        self.head = (self.head + taken) % self.capacity
+        self.count -= taken
+        return TicketBatch(numbers, self.typeOfTicket.numbersPerTicket)
+
+class TicketReservoir:
+    # per ticket type reservoir of pregenerated tickets; a background thread refills every ring
+    # that drops below half full back up to its capacity, requests take tickets from the ring and
+    # only generate inline what the ring cannot cover
+    def __init__(self, generator, capacity, refillChunk=TICKET_CHUNK_SIZE, reportInterval=60):
+        self.generator = generator
+        self.rings = {key: TicketRing(typeOfTicket, capacity) for key, typeOfTicket in generator.lottoTicketTypes.items()}
+        self.lowWater = capacity // 2
+        self.refillChunk = refillChunk
+        self.reportInterval = reportInterval
+        self.condition = threading.Condition()
+        self.requested = 0  # tickets asked for
+        self.hits = 0  # tickets served from a ring
+        self.refilled = 0  # tickets generated by the refill thread
+        self.refillSeconds = 0.0
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def take(self, ticketType, quantity):
+        ring = self.rings[ticketType]
+        with self.condition:
+            tickets = ring.take(quantity)
+            self.requested += quantity
+            self.hits += len(tickets)
+            if ring.count < self.lowWater:
+                self.condition.notify()
+        missing = quantity - len(tickets)
+        if missing > 0:
+            # reservoir ran dry: generate the rest inline
+            extra = self.generator.generateTicketBatch(missing, ring.typeOfTicket)
+            tickets = TicketBatch(tickets.numbers + extra.numbers, tickets.numbersPerTicket)
+        return tickets
+
+    def needsRefill(self):
+        return any(ring.count < ring.capacity for ring in self.rings.values())
+
+    def run(self):
+        lastReport = time.monotonic()
+        while True:
+            with self.condition:
+                if not any(ring.count < self.lowWater for ring in self.rings.values()):
+                    self.condition.wait(timeout=self.reportInterval)
+            while self.needsRefill():
+                for ring in self.rings.values():
+                    space = ring.capacity - ring.count
+                    if space <= 0:
+                        continue
+                    started = time.perf_counter()
+                    tickets = self.generator.generateTicketBatch(min(space, self.refillChunk), ring.typeOfTicket)
+                    with self.condition:
+                        ring.put(tickets)
+                        self.refilled += len(tickets)
+                        self.refillSeconds += time.perf_counter() - started
+            if time.monotonic() - lastReport >= self.reportInterval:
+                logger.info(f"Reservoir: {self.metrics()}")
+                lastReport = time.monotonic()
+
+    def metrics(self):
+        with self.condition:
+            return {
+                "depth": {key: ring.count for key, ring in self.rings.items()},
+                "hitRate": self.hits / self.requested if self.requested else 1.0,
+                "refilledTickets": self.refilled,
+                "refillRate": self.refilled / self.refillSeconds if self.refillSeconds else 0.0,
+            }
+
+ticketReservoir = None  # TicketReservoir of this process, if enabled
+
+def startReservoir(capacity):
+    # called in the process that serves requests: threads do not survive fork()
+    global ticketReservoir
+    if capacity > 0:
+        ticketReservoir = TicketReservoir(ticketGenerator, capacity).start()
+        logger.info(f"Ticket reservoir of {capacity} tickets per type started.")
+
+class SharedTicketPool:
+    # pregenerated tickets in anonymous shared memory, created by the parent before it forks.
+    # Handlers claim slices through a per type cursor guarded by a process-shared lock and copy
+    # them out while holding it. Only the parent refills consumed slots.
+    # Exhaustion policy: a claim takes whatever is available and the handler generates the rest inline.
+    # A handler killed while holding the lock never releases it: whoever waits for the lock longer
+    # than SHARED_POOL_LOCK_TIMEOUT marks the pool abandoned, from then on claims generate inline
+    # and the parent replaces the pool for the handlers it forks later.
+    COUNTERS = struct.Struct("qqqq")  # produced, consumed, tickets served from the pool, tickets requested
+
+    def __init__(self, generator, capacity):
+        self.generator = generator
+        self.capacity = capacity
+        self.lock = multiprocessing.Lock()
+        self.regions = {}
+        size = 0
+        for key, typeOfTicket in generator.lottoTicketTypes.items():
+            rowLength = sum(typeOfTicket.numbersPerTicket)
+            self.regions[key] = (size, typeOfTicket, rowLength)
+            size += self.COUNTERS.size + capacity * rowLength
+        self.abandonedFlag = size
+        self.memory = mmap.mmap(-1, size + 1)  # MAP_SHARED | MAP_ANONYMOUS: visible to forked children
+
+    def acquire(self):
+        # False when the pool is abandoned: the caller does without it
+        if self.memory[self.abandonedFlag]:
+            return False
+        if self.lock.acquire(timeout=SHARED_POOL_LOCK_TIMEOUT):
+            return True
+        self.memory[self.abandonedFlag] = 1
+        return False
+
+    def abandoned(self):
+        return bool(self.memory[self.abandonedFlag])
+
+    def claim(self, ticketType, quantity):
+        offset, typeOfTicket, rowLength = self.regions[ticketType]
+        if not self.acquire():
+            return self.generator.generateTicketBatch(quantity, typeOfTicket)
+        start = offset + self.COUNTERS.size
+        try:
+            produced, consumed, hits, requested = self.COUNTERS.unpack_from(self.memory, offset)
+            taken = min(quantity, produced - consumed)
+            slot = consumed % self.capacity
+            first = min(taken, self.capacity - slot)
+            numbers = bytearray(self.memory[start + slot * rowLength:start + (slot + first) * rowLength])
+            numbers += self.memory[start:start + (taken - first) * rowLength]
+            self.COUNTERS.pack_into(self.memory, offset, produced, consumed + taken, hits + taken, requested + quantity)
+        finally:
+            self.lock.release()
+        missing = quantity - taken
+        if missing > 0:
+            # pool exhausted: generate the rest inline
+            numbers += self.generator.generateTicketBatch(missing, typeOfTicket).numbers
+        return TicketBatch(numbers, typeOfTicket.numbersPerTicket)
+
+    def refill(self, budget=SHARED_POOL_REFILL_BATCH):
+        # parent only: generate up to budget tickets per type into consumed slots,
+        # returns True while some type is still below capacity
+        pending = False
+        for key, (offset, typeOfTicket, rowLength) in self.regions.items():
+            if not self.acquire():
+                return False
+            try:
+                produced, consumed, hits, requested = self.COUNTERS.unpack_from(self.memory, offset)
+            finally:
+                self.lock.release()
+            count = min(self.capacity - (produced - consumed), budget)
+            if count <= 0:
+                continue
+            numbers = self.generator.generateTicketBatch(count, typeOfTicket).view()
+            start = offset + self.COUNTERS.size
+            if not self.acquire():
+                return False
+            try:
+                produced, consumed, hits, requested = self.COUNTERS.unpack_from(self.memory, offset)
+                slot = produced % self.capacity
+                first = min(count, self.capacity - slot)
+                self.memory[start + slot * rowLength:start + (slot + first) * rowLength] = numbers[:first * rowLength]
+                self.memory[start:start + (count - first) * rowLength] = numbers[first * rowLength:]
+                self.COUNTERS.pack_into(self.memory, offset, produced + count, consumed, hits, requested)
+                pending = pending or produced + count - consumed < self.capacity
+            finally:
+                self.lock.release()
+        return pending
+
+    def metrics(self):
+        depth = {}
+        served = requested = 0
+        if not self.acquire():
+            return {"depth": depth, "hitRate": 0.0}
+        try:
+            for key, (offset, typeOfTicket, rowLength) in self.regions.items():
+                produced, consumed, hits, asked = self.COUNTERS.unpack_from(self.memory, offset)
+                depth[key] = produced - consumed
+                served += hits
+                requested += asked
+        finally:
+            self.lock.release()
+        return {"depth": depth, "hitRate": served / requested if requested else 1.0}
+
+sharedTicketPool = None  # SharedTicketPool inherited from the parent, if enabled
+
+def createSharedPool(capacity):
+    global sharedTicketPool
+    if capacity > 0:
+        sharedTicketPool = SharedTicketPool(ticketGenerator, capacity)
+        while sharedTicketPool.refill():
+            pass
+        logger.info(f"Shared ticket pool of {capacity} tickets per type created.")
+
+def refillSharedPool():
+    # returns how long the caller may sleep before the pool needs attention again
+    global sharedTicketPool
+    if sharedTicketPool is None:
+        return None
+    if sharedTicketPool.abandoned():
+        # handlers forked from now on get a fresh pool; the ones running generate inline
+        logger.warning("Shared ticket pool lock was never released, a handler probably died holding it; replacing the pool.")
+        sharedTicketPool = SharedTicketPool(sharedTicketPool.generator, sharedTicketPool.capacity)
+        return 0
+    if sharedTicketPool.refill():
+        return 0
+    return SHARED_POOL_POLL_INTERVAL
+
+# counters of one metrics slot, as doubles: exact up to 2**53
+ACCEPTS, REQUESTS, BYTES_OUT, ACTIVE, HANDLERS, REJECTS = range(6)
+ERRORS = 6  # one counter per ERROR_TYPES entry, then one for anything else
+PHASES = ERRORS + len(ERROR_TYPES) + 1  # per phase: one counter per bucket and +Inf, then the sum of seconds
+PHASE_FIELDS = len(LATENCY_BUCKETS) + 2
+ACCEPT_RING = PHASES + len(REQUEST_PHASES) * PHASE_FIELDS  # accepts of the last seconds: (second, count) pairs
+ACCEPT_RING_SIZE = ACCEPT_RATE_WINDOW + 2
+SLOT_FIELDS = ACCEPT_RING + 2 * ACCEPT_RING_SIZE
+MASTER_SLOT, OVERFLOW_SLOT = 0, 1
+PHASE_PARSE, PHASE_GENERATE, PHASE_FORMAT, PHASE_SEND = range(len(REQUEST_PHASES))
+
+class RequestStats:
+    # timings of one request; lap() charges the time since the previous lap to a phase
+    __slots__ = ("phases", "mark", "bytesOut", "errors")
+
+    def __init__(self):
+        self.phases = [0.0] * len(REQUEST_PHASES)
+        self.mark = time.perf_counter()
+        self.bytesOut = 0
+        self.errors = []
+
+    def lap(self, phase):
+        now = time.perf_counter()
+        self.phases[phase] += now - self.mark
+        self.mark = now
+
+    def sent(self, data):
+        self.lap(PHASE_SEND)
+        self.bytesOut += len(data)
+
+    def error(self, e):
+        self.errors.append(e)
+
+class ServerMetrics:
+    # counters in shared memory, created by the parent before it forks. Every process writes to its
+    # own slot only, so counting takes no lock; readers add the slots up. Forked handlers get a
+    # free slot from the parent and give it back when they are reaped, their counts stay in it.
+    # Handlers beyond the free slots share the overflow slot under a lock.
+    # With a path the memory is a file, so "server.py stats" can read it from another process.
+    HEADER = struct.Struct("8sIId")  # magic, slots, fields per slot, start time
+    MAGIC = b"LOTTOMET"
+
+    def __init__(self, slots=METRICS_SLOTS, path=None):
+        size = self.HEADER.size + slots * SLOT_FIELDS * 8
+        if path:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+            try:
+                os.ftruncate(fd, size)
+                self.memory = mmap.mmap(fd, size)
+            finally:
+                os.close(fd)
+        else:
+            self.memory = mmap.mmap(-1, size)  # MAP_SHARED | MAP_ANONYMOUS: visible to forked children
+        self.HEADER.pack_into(self.memory, 0, self.MAGIC, slots, SLOT_FIELDS, time.time())
+        self.values = memoryview(self.memory)[self.HEADER.size:].cast("d")
+        self.slots = slots
+        self.slot = MASTER_SLOT  # slot this process writes to
+        self.lock = multiprocessing.Lock()  # overflow slot only
+        self.freeSlots = list(range(slots - 1, OVERFLOW_SLOT, -1))
+        self.childSlots = {}  # parent only: forked handler pid -> slot
+
+    @classmethod
+    def open(cls, path):
+        # read-only view of a running server's metrics file
+        metrics = cls.__new__(cls)
+        with open(path, "rb") as metricsFile:
+            metrics.memory = mmap.mmap(metricsFile.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, metrics.slots, fields, _ = cls.HEADER.unpack_from(metrics.memory, 0)
+        if magic != cls.MAGIC or fields != SLOT_FIELDS:
+            raise ValueError(f"{path} is not a metrics file of this server version")
+        metrics.values = memoryview(metrics.memory)[cls.HEADER.size:].cast("d")
+        return metrics
+
+    def claimSlot(self):
+        # parent: slot for a handler about to be forked
+        return self.freeSlots.pop() if self.freeSlots else OVERFLOW_SLOT
+
+    def childStarted(self, pid, slot):
+        self.childSlots[pid] = slot
+        self.setGauge(HANDLERS, len(self.childSlots))
+
+    def childExited(self, pid):
+        slot = self.childSlots.pop(pid, None)
+        if slot is None:
+            return
+        if slot != OVERFLOW_SLOT:
+            # a handler that died mid-request leaves its connection counted
+            self.values[slot * SLOT_FIELDS + ACTIVE] = 0
+            self.freeSlots.append(slot)
+        self.setGauge(HANDLERS, len(self.childSlots))
+
+    def setGauge(self, field, value):
+        self.values[self.slot * SLOT_FIELDS + field] = value
+
+    def countAccept(self):
+        values = self.values
+        base = self.slot * SLOT_FIELDS
+        values[base + ACCEPTS] += 1
+        second = int(time.time())
+        position = base + ACCEPT_RING + 2 * (second % ACCEPT_RING_SIZE)
+        if values[position] != second:
+            values[position] = second
+            values[position + 1] = 0
+        values[position + 1] += 1
+
+    def add(self, field, amount=1):
+        if self.slot == OVERFLOW_SLOT:
+            with self.lock:
+                self.values[OVERFLOW_SLOT * SLOT_FIELDS + field] += amount
+        else:
+            self.values[self.slot * SLOT_FIELDS + field] += amount
+
+    def connectionOpened(self):
+        self.add(ACTIVE)
+
+    def connectionClosed(self):
+        self.add(ACTIVE, -1)
+
+    def countError(self, e):
+        # an error outside of any request
+        self.add(ERRORS + errorIndex(e))
+
+    def finishRequest(self, stats):
+        if self.slot == OVERFLOW_SLOT:
+            with self.lock:
+                self.addRequest(stats)
+        else:
+            self.addRequest(stats)
+
+    def addRequest(self, stats):
+        values = self.values
+        base = self.slot * SLOT_FIELDS
+        values[base + REQUESTS] += 1
+        values[base + BYTES_OUT] += stats.bytesOut
+        for e in stats.errors:
+            values[base + ERRORS + errorIndex(e)] += 1
+        # every request times every phase: the count of a phase is the +Inf bucket
+        position = base + PHASES
+        for seconds in stats.phases:
+            values[position + bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+            values[position + PHASE_FIELDS - 1] += seconds
+            position += PHASE_FIELDS
+
+    def total(self, field):
+        return sum(self.values[field::SLOT_FIELDS])
+
+    def acceptRate(self, now=None):
+        # accepts per second over the last ACCEPT_RATE_WINDOW complete seconds
+        now = int(now if now is not None else time.time())
+        accepts = 0
+        for slot in range(self.slots):
+            ring = slot * SLOT_FIELDS + ACCEPT_RING
+            for position in range(ring, ring + 2 * ACCEPT_RING_SIZE, 2):
+                if now - ACCEPT_RATE_WINDOW <= self.values[position] < now:
+                    accepts += self.values[position + 1]
+        return accepts / ACCEPT_RATE_WINDOW
+
+    def render(self):
+        # Prometheus text exposition format
+        startTime = self.HEADER.unpack_from(self.memory, 0)[3]
+        lines = []
+
+        def metric(name, kind, help, samples):
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{labels} {int(value) if value.is_integer() else value!r}")
+
+        metric("lottery_start_time_seconds", "gauge", "Start time of the server since the epoch in seconds.", [("", startTime)])
+        metric("lottery_accepts_total", "counter", "Connections accepted.", [("", self.total(ACCEPTS))])
+        metric("lottery_accepts_per_second", "gauge", f"Connections accepted per second over the last {ACCEPT_RATE_WINDOW} seconds.", [("", self.acceptRate())])
+        metric("lottery_active_connections", "gauge", "Connections being served.", [("", self.total(ACTIVE))])
+        metric("lottery_handler_processes", "gauge", "Forked handlers or pre-forked workers alive.", [("", self.values[MASTER_SLOT * SLOT_FIELDS + HANDLERS])])
+        metric("lottery_rejected_total", "counter", "Connections refused by admission control.", [("", self.total(REJECTS))])
+        metric("lottery_requests_total", "counter", "Requests answered, errors included.", [("", self.total(REQUESTS))])
+        metric("lottery_bytes_out_total", "counter", "Reply bytes sent.", [("", self.total(BYTES_OUT))])
+        errorNames = [name for name, _ in ERROR_TYPES] + ["other"]
+        metric("lottery_errors_total", "counter", "Requests answered with an error, by exception type.",
+               [(f'{{type="{name}"}}', self.total(ERRORS + index)) for index, name in enumerate(errorNames)])
+
+        samples = []
+        for index, phase in enumerate(REQUEST_PHASES):
+            position = PHASES + index * PHASE_FIELDS
+            cumulative = 0
+            for bucket, bound in enumerate(LATENCY_BUCKETS + (float("inf"),)):
+                cumulative += self.total(position + bucket)
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                samples.append((f'_bucket{{phase="{phase}",le="{le}"}}', cumulative))
+            samples.append((f'_sum{{phase="{phase}"}}', self.total(position + PHASE_FIELDS - 1)))
+            samples.append((f'_count{{phase="{phase}"}}', cumulative))
+        metric("lottery_request_phase_seconds", "histogram", "Time spent per request parsing, generating, formatting and sending.", samples)
+        return "\n".join(lines) + "\n"
+
+def errorIndex(e):
+    for index, (_, errorType) in enumerate(ERROR_TYPES):
+        if isinstance(e, errorType):
+            return index
+    return len(ERROR_TYPES)
+
+serverMetrics = ServerMetrics(slots=2)  # replaced by runServer; counts requests served outside of it
+
+def createMetrics(workers, path=None):
+    global serverMetrics
+    serverMetrics = ServerMetrics(max(METRICS_SLOTS, workers + 2), path)
+
+class RequestProfiler:
+    # statistical profiler of sampled requests: while one runs, SIGPROF fires every PROFILE_INTERVAL
+    # of CPU time and the Python stack it interrupts is counted. Stacks are written in the folded
+    # format of flamegraph.pl ("outer;inner count"), appended to profiles/profile-<pid>.folded of
+    # each worker; forked handlers append to their server's file, so the lines of one file add up.
+    # While profiling is off a request costs one attribute check.
+    def __init__(self):
+        self.enabled = False
+        self.fraction = 0.0
+        self.random = random.Random()  # sampling must not move the ticket generator's random stream
+        # like the random module's own generator: a forked handler must not repeat its parent's draws
+        os.register_at_fork(after_in_child=self.random.seed)
+        self.stacks = {}
+        self.active = 0  # sampled requests running, more than one on the asyncio backend
+        self.owner = os.getpid()  # process whose file the stacks go to
+        self.flushed = time.monotonic()
+
+    def begin(self):
+        # returns True if this request is sampled; end() must follow
+        if self.random.random() >= self.fraction:
+            return False
+        if not self.active:
+            signal.signal(signal.SIGPROF, self.record)
+            signal.setitimer(signal.ITIMER_PROF, PROFILE_INTERVAL, PROFILE_INTERVAL)
+        self.active += 1
+        return True
+
+    def end(self):
+        self.active -= 1
+        if not self.active:
+            signal.setitimer(signal.ITIMER_PROF, 0)
+        # a forked handler exits after its request: write its stacks now
+        if os.getpid() != self.owner or time.monotonic() - self.flushed >= PROFILE_FLUSH_INTERVAL:
+            self.flush()
+
+    def record(self, signum, frame):
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        stack = ";".join(reversed(names))
+        self.stacks[stack] = self.stacks.get(stack, 0) + 1
+
+    def flush(self):
+        self.flushed = time.monotonic()
+        if not self.stacks:
+            return
+        stacks, self.stacks = self.stacks, {}
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        data = "".join([f"{stack} {count}\n" for stack, count in stacks.items()]).encode()
+        # one O_APPEND write: lines of processes sharing the file do not interleave
+        fd = os.open(os.path.join(PROFILE_DIR, f"profile-{self.owner}.folded"), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        if self.enabled and not self.fraction:
+            self.fraction = PROFILE_FRACTION
+        if not self.enabled:
+            self.flush()
+
+requestProfiler = RequestProfiler()
+profilerMaster = None  # pid of the process that forwards SIGUSR1 to its workers and handlers
+
+def toggleProfiling(signum, frame):
+    requestProfiler.toggle()
+    if os.getpid() != profilerMaster:
+        return
+    state = f"on, sampling {requestProfiler.fraction:g} of requests" if requestProfiler.enabled else "off"
+    logger.info(f"Request profiling {state}.")
+    for pid in list(serverMetrics.childSlots):
+        try:
+            os.kill(pid, signal.SIGUSR1)
+        except OSError:
+            pass
+
+def startProfiler():
+    # SIGUSR1 to the server turns profiling on and off in the server and everything it forked
+    global profilerMaster
+    profilerMaster = requestProfiler.owner = os.getpid()
+    signal.signal(signal.SIGUSR1, toggleProfiling)
+    if requestProfiler.enabled:
+        logger.info(f"Request profiling on, sampling {requestProfiler.fraction:g} of requests.")
+
+def ticketChunks(generator, ticketType, quantity, seed=None):
+    typeOfTicket = generator.lottoTicketTypes[ticketType]
+    if generator.unique:
+        # uniqueness is tracked over the whole request, so it is drawn on demand too
+        yield from generator.generateUniqueChunks(quantity, typeOfTicket, TICKET_CHUNK_SIZE, seed)
+        return
+    if seed is not None:
+        # pregenerated tickets cannot be replayed: draw seeded requests on demand
+        yield from generator.generateTicketChunks(quantity, typeOfTicket, TICKET_CHUNK_SIZE, seed)
+        return
+    if ticketReservoir is not None:
+        take = ticketReservoir.take
+    elif sharedTicketPool is not None:
+        take = sharedTicketPool.claim
+    else:
+        yield from generator.generateTicketChunks(quantity, typeOfTicket, TICKET_CHUNK_SIZE)
+        return
+    for start in range(0, quantity, TICKET_CHUNK_SIZE):
+        yield take(ticketType, min(TICKET_CHUNK_SIZE, quantity - start))
+
+def formatTickets(tickets, firstNumber, numberFormat):
+    lineFormat = "{}. " + numberFormat + "\n"
+    return "".join([lineFormat.format(i, *ticket) for i, ticket in enumerate(tickets, firstNumber)])
+
+def streamTickets(generator, ticketType, quantity, seed=None, stats=None):
+    # generate and format the reply one chunk at a time so memory stays flat
+    stats = stats or RequestStats()
+    firstNumber = 1
+    for tickets in ticketChunks(generator, ticketType, quantity, seed):
+        stats.lap(PHASE_GENERATE)
+        chunk = formatTickets(tickets, firstNumber, generator.lottoTicketTypes[ticketType].numberFormat).encode()
+        stats.lap(PHASE_FORMAT)
+        yield chunk
+        firstNumber += len(tickets)
+
+def parseTextRequest(request):
+    # "type,quantity" or "type,quantity,seed"
+    fields = request.decode().strip().split(',')
+    if len(fields) not in (2, 3):
+        raise ValueError("request must be type,quantity or type,quantity,seed")
+    seed = None
+    if len(fields) == 3:
+        seed = int(fields[2])
+        if not 0 <= seed <= MAX_SEED:
+            raise ValueError(f"seed must be between 0 and {MAX_SEED}")
+    quantity = int(fields[1])
+    admission.checkQuantity(quantity)
+    return fields[0], quantity, seed
+
+def sendError(clientSocket, message, stats):
+    # the client may be gone already: a failed error reply must not take the handler down
+    try:
+        clientSocket.sendall(message)
+        stats.sent(message)
+    except OSError as e:
+        stats.error(e)
+        logger.error(f"Socket error occurred: {str(e)}")
+
+def processClientRequest(clientSocket, addr, ticketType, quantity, seed=None, stats=None):
+    generator = ticketGenerator
+    stats = stats or RequestStats()
     
     try:
-        tickets = generator.generateTickets(quantity, generator.lottoTicketTypes[ticketType])
-        
-        processedTickets = ""
-        for i, ticket in enumerate(tickets, 1):
-            processedTickets += f"{i}. {', '.join(map(str, ticket[0]))}\n"
-        
-        clientSocket.send(processedTickets.encode())
+        for chunk in streamTickets(generator, ticketType, quantity, seed, stats):
+            clientSocket.sendall(chunk)
+            stats.sent(chunk)
     
     except (ValueError, KeyError) as e:
-        errorMessage = f"Error: {str(e)}"
-        clientSocket.send(errorMessage.encode())
+        stats.error(e)
+        sendError(clientSocket, f"Error: {str(e)}".encode(), stats)
     
     clientSocket.close()
 
-def runServer(host, port):
+def binaryReply(generator, clientVersion, kind, payload, stats=None):
+    # frames answering one binary request
+    stats = stats or RequestStats()
+    version = PROTOCOL_VERSION
+    try:
+        version = negotiateVersion(clientVersion)
+        if kind not in (FRAME_REQUEST, FRAME_SEEDED_REQUEST):
+            raise ProtocolError(f"unexpected frame kind {kind}")
+        ticketType, quantity, seed = unpackRequest(payload, kind)
+        admission.checkQuantity(quantity)
+        stats.lap(PHASE_PARSE)
+
+        total = 0
+        for tickets in ticketChunks(generator, ticketType, quantity, seed):
+            stats.lap(PHASE_GENERATE)
+            frame = packTickets(tickets, version)
+            stats.lap(PHASE_FORMAT)
+            yield frame
+            total += len(tickets)
+        yield packEnd(total, version)
+
+    except (ValueError, KeyError, ProtocolError) as e:
+        stats.error(e)
+        yield packError(f"Error: {str(e)}", version)
+
+def textReply(generator, request, stats=None):
+    # chunks answering one "type,quantity[,seed]" text request
+    stats = stats or RequestStats()
+    try:
+        ticketType, quantity, seed = parseTextRequest(request)
+        stats.lap(PHASE_PARSE)
+        yield from streamTickets(generator, ticketType, quantity, seed, stats)
+    except (ValueError, KeyError) as e:
+        stats.error(e)
+        yield f"Error: {str(e)}".encode()
+
+def processBinaryRequest(clientSocket, addr, request, stats=None):
+    stats = stats or RequestStats()
+    try:
+        clientVersion, kind, payload, _ = readFrame(clientSocket, request)
+    except ProtocolError as e:
+        stats.error(e)
+        sendError(clientSocket, packError(f"Error: {str(e)}"), stats)
+        return
+
+    for frame in binaryReply(ticketGenerator, clientVersion, kind, payload, stats):
+        clientSocket.sendall(frame)
+        stats.sent(frame)
+
+class ClientRateLimiter:
+    # token bucket per client in a table of the clients seen most recently: every check is O(1),
+    # and a client dropped from the table comes back with a full bucket
+    def __init__(self, rate=0.0, burst=0.0, capacity=ADMISSION_CLIENTS):
+        self.rate = rate  # requests per second and client, 0 for no limit
+        self.burst = burst
+        self.capacity = capacity
+        self.clients = collections.OrderedDict()  # client -> [tokens, last update]
+
+    def allow(self, address):
+        if self.rate <= 0:
+            return True
+        now = time.monotonic()
+        client = clientKey(address)
+        bucket = self.clients.get(client)
+        if bucket is None:
+            if len(self.clients) >= self.capacity:
+                self.clients.popitem(last=False)
+            bucket = self.clients[client] = [self.burst, now]
+        else:
+            self.clients.move_to_end(client)
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return True
+        return False
+
+def clientKey(address):
+    # an IPv6 host usually owns a whole /64, so its addresses count as one client
+    try:
+        ip = ipaddress.ip_address(address.split("%", 1)[0])
+    except ValueError:
+        return address
+    if ip.version == 6 and ip.ipv4_mapped is not None:
+        return str(ip.ipv4_mapped)
+    if ip.version == 6 and not ip.is_loopback:
+        return ip.exploded[:19]
+    return str(ip)
+
+class AdmissionControl:
+    # turns connections away before they cost a fork: per client rate, handlers at once, tickets per request
+    def __init__(self):
+        self.clients = ClientRateLimiter()
+        self.maxHandlers = MAX_HANDLERS
+        self.maxQuantity = MAX_QUANTITY
+        self.connections = 0  # asyncio backend: connections being served
+        self.rejections = collections.deque()  # fork mode: (deadline, socket) of refused connections, oldest first
+
+    def refuse(self, addr, handlers):
+        # reason to turn this connection away, None to serve it
+        if self.maxHandlers and handlers >= self.maxHandlers:
+            return "server busy, try again later"
+        if not self.clients.allow(addr[0]):
+            return "too many requests, slow down"
+        return None
+
+    def checkQuantity(self, quantity):
+        if quantity > self.maxQuantity:
+            raise ValueError(f"at most {self.maxQuantity} tickets per request")
+
+admission = AdmissionControl()
+
+def rejectionReply(request, reason):
+    # the error in the protocol of the request
+    if isFramed(request):
+        return packError(f"Error: {reason}")
+    return f"Error: {reason}".encode()
+
+def rejectConnection(clientSocket, addr, reason, selector):
+    # fork mode: the master answers once the request arrives, so the error is not lost to a reset
+    serverMetrics.add(REJECTS)
+    logRejection(addr, reason)
+    if len(admission.rejections) >= REJECT_BACKLOG:
+        clientSocket.close()
+        return
+    clientSocket.setblocking(False)
+    selector.register(clientSocket, selectors.EVENT_READ, reason)
+    admission.rejections.append((time.monotonic() + REJECT_TIMEOUT, clientSocket))
+
+def answerRejection(clientSocket, reason, selector):
+    selector.unregister(clientSocket)
+    try:
+        request = clientSocket.recv(1024)
+        clientSocket.send(rejectionReply(request, reason))
+    except OSError:
+        pass
+    finally:
+        clientSocket.close()
+
+def closeRejections(selector):
+    # forked handler: drop its copies of the refused connections the parent is answering,
+    # or their clients would not see the connection close until this handler exits
+    for deadline, clientSocket in admission.rejections:
+        clientSocket.close()
+    admission.rejections.clear()
+    selector.close()
+
+def expireRejections(selector):
+    # close refused connections that never sent a request; returns the seconds until the next one is due
+    now = time.monotonic()
+    while admission.rejections:
+        deadline, clientSocket = admission.rejections[0]
+        if clientSocket.fileno() == -1:
+            # answered already
+            admission.rejections.popleft()
+        elif deadline <= now:
+            admission.rejections.popleft()
+            selector.unregister(clientSocket)
+            clientSocket.close()
+        else:
+            return deadline - now
+    return None
+
+def refuseClient(clientSocket, addr, reason):
+    # pre-forked worker: answer the refused connection at once, without waiting on the client,
+    # so refused clients cannot tie up the workers; a request that has not arrived yet gets
+    # the text error, the reply is best effort
+    serverMetrics.add(REJECTS)
+    logRejection(addr, reason)
+    try:
+        clientSocket.setblocking(False)
+        try:
+            request = clientSocket.recv(1024)
+        except BlockingIOError:
+            request = b""
+        clientSocket.send(rejectionReply(request, reason))
+        clientSocket.shutdown(socket.SHUT_WR)
+    except OSError:
+        pass
+    finally:
+        clientSocket.close()
+
+def acceptConnections(serverSocket, selector):
+    # Accept every pending connection before going back to the selector;
+    # returns when to watch the listening socket again if accepting had to pause
+    while True:
+        try:
+            clientSocket, addr = serverSocket.accept()
+        except socket.error as e:
+            # Handle interrupted system call error
+            if e.errno == errno.EINTR:
+                continue
+            elif e.errno == errno.EAGAIN or e.errno == errno.EWOULDBLOCK:
+                # No more incoming connections
+                return
+            elif e.errno == errno.ECONNABORTED:
+                # Connection gone before it was accepted
+                continue
+            elif e.errno in (errno.EMFILE, errno.ENFILE):
+                # Out of descriptors: the listening socket stays readable, so leave it out
+                # of the selector for a moment instead of waking up on it again at once
+                logger.error(f"Accept failed: {str(e)}")
+                selector.unregister(serverSocket)
+                return time.monotonic() + ACCEPT_BACKOFF
+            else:
+                raise
+
+        logConnection(addr)
+        serverMetrics.countAccept()
+
+        # Refuse without forking when the client or the server is over its limit
+        reason = admission.refuse(addr, len(serverMetrics.childSlots))
+        if reason:
+            rejectConnection(clientSocket, addr, reason, selector)
+            continue
+
+        # Hold SIGCHLD until the child's metrics slot is recorded, or it could be reaped first
+        slot = serverMetrics.claimSlot()
+        signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGCHLD})
+        try:
+            pid = os.fork()
+
+            if pid == 0:
+                # Child process
+                signal.pthread_sigmask(signal.SIG_UNBLOCK, {signal.SIGCHLD})
+                closeRejections(selector)
+                serverMetrics.slot = slot
+                serverSocket.close()  # Release socket in child process
+                handleClient(clientSocket, addr)
+                os._exit(os.EX_OK)  # Terminate child process
+
+            else:
+                # Parent process
+                serverMetrics.childStarted(pid, slot)
+                clientSocket.close()  # Release socket in parent process
+        finally:
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, {signal.SIGCHLD})
+
+def runServer(host, port, workers=0, backlog=socket.SOMAXCONN, backend="fork", reservoir=0, sharedPool=0, metricsFile=None):
+    # Counters and the profiler first: every process forked from here on uses them
+    createMetrics(workers, metricsFile)
+    startProfiler()
+
     serverSocket = socket.socket(socket.AF_INET6, socket.SOCK_STREAM)
     serverSocket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
     serverSocket.bind((host, port))
-    serverSocket.listen(5)
-    serverSocket.setblocking(False)
+    serverSocket.listen(backlog)
 
     logger.info(f"Server listening on [{host}]:{port}...")
 
-    # Set up the signal handler for SIGCHLD
-    signal.signal(signal.SIGCHLD, signalHandler) 
+    if backend == "asyncio":
+        # Event loop mode: keep-alive connections with pipelined requests
+        serverMetrics.setGauge(HANDLERS, 1)
+        startReservoir(reservoir)
+        runAsyncServer(serverSocket)
+        serverSocket.close()
+        return
 
-    while True:
-        try:
-            try:
-                clientSocket, addr = serverSocket.accept()
-                logger.info(f"Accepted connection from [{addr[0]}]:{addr[1]}")
+    # Forking modes: the pool must exist before the first fork
+    createSharedPool(sharedPool)
 
-                pid = os.fork()
+    if workers > 0:
+        # Pre-forked mode: long-lived workers share the listening socket
+        runPreforkServer(serverSocket, workers, reservoir)
+        serverSocket.close()
+        return
 
-                if pid == 0:
-                    # Child process
-                    serverSocket.close()  # Release socket in child process
-                    handleClient(clientSocket, addr)
-                    os._exit(os.EX_OK)  # Terminate child process
+    # Fork-per-connection mode
+    serverSocket.setblocking(False)
 
-                else:
-                    # Parent process
-                    clientSocket.close()  # Release socket in parent process
+    # Set up the signal handler for SIGCHLD
+    signal.signal(signal.SIGCHLD, signalHandler) 
 
-            except socket.error as e:
-                # Handle interrupted system call error
-                if e.errno == errno.EINTR:
-                    continue
-                elif e.errno == errno.EAGAIN or e.errno == errno.EWOULDBLOCK:
-                    # No more incoming connections, continue loop
-                    continue
+    # Sleep until the listening socket is readable instead of spinning on accept()
+    selector = selectors.DefaultSelector()
+    selector.register(serverSocket, selectors.EVENT_READ)
+
+    timeout = refillSharedPool()
+    resumeAccepts = None  # when to watch the listening socket again after running out of descriptors
+    while True:
+        try:
+            for key, events in selector.select(timeout):
+                if key.fileobj is serverSocket:
+                    resumeAccepts = acceptConnections(serverSocket, selector)
                 else:
-                    raise
+                    # a refused connection sent its request
+                    answerRejection(key.fileobj, key.data, selector)
+            timeout = refillSharedPool()
+            due = expireRejections(selector)
+            if resumeAccepts is not None:
+                if resumeAccepts <= time.monotonic():
+                    selector.register(serverSocket, selectors.EVENT_READ)
+                    resumeAccepts = None
+                elif due is None or resumeAccepts - time.monotonic() < due:
+                    due = resumeAccepts - time.monotonic()
+            if due is not None and (timeout is None or due < timeout):
+                timeout = due
 
         except KeyboardInterrupt:
             # Terminate the server on keyboard interrupt (Ctrl+C)
             logger.info("Server terminated.")
             break
 
+    selector.close()
     serverSocket.close()
 
+async def writeReply(writer, chunks, stats=None):
+    # drain after every chunk so a slow reader holds back its own connection only;
+    # chunks are generated in the event loop, so yield to the other connections between
+    # them even when drain() does not wait
+    for chunk in chunks:
+        writer.write(chunk)
+        await writer.drain()
+        if stats is not None:
+            stats.sent(chunk)
+        await asyncio.sleep(0)
+
+async def serveBinaryRequests(reader, writer, generator, buffered):
+    # keep-alive: any number of request frames, answered in order
+    while True:
+        header = buffered + await reader.readexactly(HEADER.size - len(buffered))
+        buffered = b""
+        stats = RequestStats()
+        magic, version, kind, length = HEADER.unpack(header)
+        if magic != MAGIC or length > MAX_PAYLOAD:
+            stats.error(ProtocolError("bad frame"))
+            await writeReply(writer, [packError("Error: bad frame")], stats)
+            serverMetrics.finishRequest(stats)
+            return
+        payload = await reader.readexactly(length)
+        # samples of an asyncio request include the other connections served meanwhile
+        sampled = requestProfiler.enabled and requestProfiler.begin()
+        try:
+            await writeReply(writer, binaryReply(generator, version, kind, payload, stats), stats)
+        finally:
+            if sampled:
+                requestProfiler.end()
+        serverMetrics.finishRequest(stats)
+
+async def serveTextRequests(reader, writer, generator, buffered):
+    stats = RequestStats()
+    if b"\n" not in buffered:
+        buffered += await reader.read(1024)
+    if b"\n" not in buffered:
+        # legacy one-shot request: reply and close like the forking server
+        sampled = requestProfiler.enabled and requestProfiler.begin()
+        try:
+            await writeReply(writer, textReply(generator, buffered, stats), stats)
+        finally:
+            if sampled:
+                requestProfiler.end()
+        serverMetrics.finishRequest(stats)
+        return
+
+    # keep-alive: one request per line, every reply ends with an empty line
+    while True:
+        if b"\n" not in buffered:
+            try:
+                line = await reader.readline()
+            except ValueError as e:
+                # a line beyond the stream limit: the rest of the connection cannot be parsed
+                stats = RequestStats()
+                stats.error(e)
+                await writeReply(writer, [b"Error: request line too long", b"\n"], stats)
+                serverMetrics.finishRequest(stats)
+                return
+            if not line and not buffered:
+                return
+            buffered += line
+        request, separator, buffered = buffered.partition(b"\n")
+        if request.strip():
+            stats = RequestStats()
+            sampled = requestProfiler.enabled and requestProfiler.begin()
+            try:
+                await writeReply(writer, textReply(generator, request, stats), stats)
+                await writeReply(writer, [b"\n"], stats)
+            finally:
+                if sampled:
+                    requestProfiler.end()
+            serverMetrics.finishRequest(stats)
+        if not separator:
+            # connection closed after an unterminated last request
+            return
+
+async def serveConnection(reader, writer):
+    addr = writer.get_extra_info("peername")
+    logConnection(addr)
+    serverMetrics.countAccept()
+    serverMetrics.connectionOpened()
+    admission.connections += 1
+    # replies are written frame by frame: do not let Nagle hold back the last one
+    writer.get_extra_info("socket").setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    generator = ticketGenerator
+    try:
+        try:
+            prefix = await reader.readexactly(len(MAGIC))
+        except asyncio.IncompleteReadError as e:
+            prefix = e.partial
+        if not prefix:
+            return
+
+        reason = admission.refuse(addr, admission.connections - 1)
+        if reason:
+            serverMetrics.add(REJECTS)
+            logRejection(addr, reason)
+            writer.write(rejectionReply(prefix, reason))
+            await writer.drain()
+            return
+
+        if isFramed(prefix):
+            await serveBinaryRequests(reader, writer, generator, prefix)
+        else:
+            await serveTextRequests(reader, writer, generator, prefix)
+
+    except asyncio.IncompleteReadError:
+        # client closed the connection between or in the middle of requests
+        pass
+    except ConnectionError as e:
+        serverMetrics.countError(e)
+        logger.error(f"Socket error occurred: {str(e)}")
+    finally:
+        admission.connections -= 1
+        serverMetrics.connectionClosed()
+        writer.close()
+
+async def serveAsync(serverSocket):
+    server = await asyncio.start_server(serveConnection, sock=serverSocket)
+    async with server:
+        await server.serve_forever()
+
+def runAsyncServer(serverSocket):
+    try:
+        asyncio.run(serveAsync(serverSocket))
+    except KeyboardInterrupt:
+        # Terminate the server on keyboard interrupt (Ctrl+C)
+        logger.info("Server terminated.")
+
+def workerLoop(serverSocket, reservoir):
+    # Each worker blocks in accept() on the shared socket and serves connections one after another
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    startReservoir(reservoir)
+    requestProfiler.owner = os.getpid()  # a worker keeps its own profile
+    while True:
+        try:
+            clientSocket, addr = serverSocket.accept()
+        except OSError as e:
+            if e.errno in (errno.EMFILE, errno.ENFILE):
+                logger.error(f"Accept failed: {str(e)}")
+                time.sleep(ACCEPT_BACKOFF)
+            elif e.errno != errno.ECONNABORTED:
+                raise
+            continue
+        logConnection(addr)
+        serverMetrics.countAccept()
+        # the workers bound the handlers; the request rate is counted per worker
+        reason = admission.refuse(addr, 0)
+        if reason:
+            refuseClient(clientSocket, addr, reason)
+            continue
+        try:
+            handleClient(clientSocket, addr)
+        except OSError as e:
+            # one broken connection must not cost the worker
+            serverMetrics.countError(e)
+            logger.error(f"Socket error occurred: {str(e)}")
+
+def spawnWorker(serverSocket, reservoir):
+    slot = serverMetrics.claimSlot()
+    pid = os.fork()
+    if pid == 0:
+        # Worker process
+        serverMetrics.slot = slot
+        try:
+            workerLoop(serverSocket, reservoir)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os._exit(os.EX_OK)  # Terminate worker process
+    serverMetrics.childStarted(pid, slot)
+    return pid
+
+def terminateServer(signum, frame):
+    raise SystemExit(0)
+
+def runPreforkServer(serverSocket, workers, reservoir):
+    serverSocket.setblocking(True)
+
+    # The master reaps its workers itself and takes them down when it is stopped
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, terminateServer)
+
+    workerPids = {spawnWorker(serverSocket, reservoir) for _ in range(workers)}
+    logger.info(f"Started {workers} workers.")
+    restarts = collections.deque()  # when the workers of the last WORKER_RESTART_WINDOW died
+
+    try:
+        while True:
+            if sharedTicketPool is None:
+                pid, status = os.wait()
+            else:
+                # keep the shared pool topped up while waiting on the workers
+                pid, status = os.waitpid(-1, os.WNOHANG)
+                if pid == 0:
+                    timeout = refillSharedPool()
+                    if timeout:
+                        time.sleep(timeout)
+                    continue
+            if pid in workerPids:
+                # Replace a worker that died
+                workerPids.discard(pid)
+                serverMetrics.childExited(pid)
+                # a worker that dies on startup would otherwise be replaced in a fork storm;
+                # the server keeps running, it only slows the restarts down
+                now = time.monotonic()
+                restarts.append(now)
+                while restarts[0] < now - WORKER_RESTART_WINDOW:
+                    restarts.popleft()
+                logger.warning(f"Worker {pid} exited with status {status}, restarting it.")
+                if len(restarts) > WORKER_RESTART_LIMIT:
+                    logger.error(f"{len(restarts)} workers died within {WORKER_RESTART_WINDOW:g} seconds, "
+                                 f"waiting {WORKER_RESTART_DELAY:g} seconds before the restart.")
+                    time.sleep(WORKER_RESTART_DELAY)
+                workerPids.add(spawnWorker(serverSocket, reservoir))
+
+    except KeyboardInterrupt:
+        # Terminate the server on keyboard interrupt (Ctrl+C)
+        logger.info("Server terminated.")
+
+    finally:
+        for pid in workerPids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError:
+                pass
+
 def handleClient(clientSocket, addr):
+    stats = RequestStats()
+    serverMetrics.connectionOpened()
+    sampled = requestProfiler.enabled and requestProfiler.begin()
     try:
-        request = clientSocket.recv(1024).decode().strip()
-        ticketType, quantity = request.split(',')
-        processClientRequest(clientSocket, addr, ticketType, int(quantity))
+        request = clientSocket.recv(1024)
+        if isFramed(request):
+            # binary protocol client
+            processBinaryRequest(clientSocket, addr, request, stats)
+            return
+        # legacy text protocol client
+        ticketType, quantity, seed = parseTextRequest(request)
+        stats.lap(PHASE_PARSE)
+        processClientRequest(clientSocket, addr, ticketType, quantity, seed, stats)
     except (ValueError, KeyError) as e:
-        errorMessage = f"Error: {str(e)}"
-        clientSocket.send(errorMessage.encode())
+        stats.error(e)
+        sendError(clientSocket, f"Error: {str(e)}".encode(), stats)
     except socket.error as e:
+        stats.error(e)
         logger.error(f"Socket error occurred: {str(e)}")
     finally:
         clientSocket.close()
+        if sampled:
+            requestProfiler.end()
+        serverMetrics.connectionClosed()
+        serverMetrics.finishRequest(stats)
 
 def signalHandler(signum, frame):
     # Collect exit status of terminated child processes
@@ -169,18 +1577,153 @@ def signalHandler(signum, frame):
             if pid == 0:
                 # No more terminated child processes
                 break
+            serverMetrics.childExited(pid)
         except OSError:
             # No child processes
             break
 
-def configure_logging():
+class LogRateLimiter:
+    # token bucket for the per-connection log lines of one process
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = max(rate, 0)
+        self.updated = time.monotonic()
+        self.suppressed = 0  # lines skipped since the last one logged
+
+    def allow(self):
+        if self.rate < 0:
+            return True
+        now = time.monotonic()
+        self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        self.suppressed += 1
+        return False
+
+connectionLogLimiter = LogRateLimiter(LOG_CONNECTION_RATE)
+rejectionLogLimiter = LogRateLimiter(LOG_CONNECTION_RATE)
+
+def logConnection(addr):
+    if connectionLogLimiter.allow():
+        suppressed, connectionLogLimiter.suppressed = connectionLogLimiter.suppressed, 0
+        more = f" ({suppressed} more not logged)" if suppressed else ""
+        logger.info(f"Accepted connection from [{addr[0]}]:{addr[1]}{more}")
+
+def logRejection(addr, reason):
+    if rejectionLogLimiter.allow():
+        suppressed, rejectionLogLimiter.suppressed = rejectionLogLimiter.suppressed, 0
+        more = f" ({suppressed} more not logged)" if suppressed else ""
+        logger.warning(f"Refused connection from [{addr[0]}]:{addr[1]}: {reason}{more}")
+
+class QueueLogHandler(logging.Handler):
+    # sends formatted lines to the log writer process as datagrams and never waits for it:
+    # when the writer falls behind and the socket buffer is full, lines are counted and dropped
+    def __init__(self, sock):
+        super().__init__()
+        self.socket = sock
+        self.dropped = 0
+
+    def emit(self, record):
+        try:
+            line = self.format(record) + "\n"
+            if self.dropped:
+                line = f"{self.dropped} log lines dropped\n" + line
+            self.socket.send(line.encode()[:LOG_RECORD_MAX])
+            self.dropped = 0
+        except BlockingIOError:
+            self.dropped += 1
+        except Exception:
+            self.handleError(record)
+
+def rotateLog(path, backupCount):
+    # same naming as logging's RotatingFileHandler: server.log.1 is the newest backup
+    for index in range(backupCount - 1, 0, -1):
+        if os.path.exists(f"{path}.{index}"):
+            os.replace(f"{path}.{index}", f"{path}.{index + 1}")
+    if backupCount > 0:
+        os.replace(path, f"{path}.1")
+    else:
+        os.remove(path)
+
+def runLogWriter(reader, path, maxBytes, backupCount):
+    # the only process that touches the log file: it batches lines and rotates the file
+    # signals sent to the whole process group are left to the server: the writer stays until
+    # the server is gone, so the last lines it logs are written too
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    signal.signal(signal.SIGUSR1, signal.SIG_IGN)
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+    parent = os.getppid()
+    logFile = open(path, "ab")
+    reader.setblocking(False)
+    selector = selectors.DefaultSelector()
+    selector.register(reader, selectors.EVENT_READ)
+    batch = []
+    deadline = time.monotonic() + LOG_FLUSH_INTERVAL
+    while True:
+        # a deadline already passed still waits a moment: select(0) would spin
+        if selector.select(max(deadline - time.monotonic(), 0.001)):
+            try:
+                batch.append(reader.recv(LOG_RECORD_MAX))
+            except BlockingIOError:
+                pass
+        if len(batch) < LOG_BATCH and time.monotonic() < deadline:
+            continue
+        if batch:
+            data = b"".join(batch)
+            batch = []
+            if maxBytes and logFile.tell() and logFile.tell() + len(data) > maxBytes:
+                logFile.close()
+                rotateLog(path, backupCount)
+                logFile = open(path, "ab")
+            logFile.write(data)
+            logFile.flush()
+        deadline = time.monotonic() + LOG_FLUSH_INTERVAL
+        if os.getppid() != parent:
+            # the server is gone and everything it sent has been written
+            try:
+                while True:
+                    logFile.write(reader.recv(LOG_RECORD_MAX))
+            except BlockingIOError:
+                pass
+            selector.close()
+            logFile.close()
+            return
+
+def startLogWriter(path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT):
+    # replace the logger's handlers with one that hands lines to a forked log writer process;
+    # the server and every process it forks later share the sending end
+    reader, writer = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+    writer.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, LOG_SOCKET_BUFFER)
+    reader.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, LOG_SOCKET_BUFFER)
+    pid = os.fork()
+    if pid == 0:
+        writer.close()
+        try:
+            runLogWriter(reader, path, maxBytes, backupCount)
+        finally:
+            os._exit(os.EX_OK)
+    reader.close()
+    writer.setblocking(False)
+
+    handler = QueueLogHandler(writer)
+    handler.setFormatter(logzero.LogFormatter(fmt="%(asctime)s - %(levelname)s: %(message)s", color=False))
+    for oldHandler in list(logger.handlers):
+        logger.removeHandler(oldHandler)
+    logger.addHandler(handler)
+    return pid
+
+def configure_logging(connectionLogRate=LOG_CONNECTION_RATE):
     log_directory = "."  # Set the log directory to the current directory
     os.chdir(log_directory)  # Change directory to the log folder
     
-    log_file = "server.log"
-    logzero.logfile(log_file, maxBytes=1e6, backupCount=3)
-    formatter = logzero.LogFormatter(fmt="%(asctime)s - %(levelname)s: %(message)s")
-    logzero.formatter(formatter)
+    # Log through a separate writer process so no request ever waits on the log file
+    for limiter in (connectionLogLimiter, rejectionLogLimiter):
+        limiter.rate = connectionLogRate
+        limiter.tokens = max(connectionLogRate, 0)
+    startLogWriter(LOG_FILE)
     logger.info("Server started.")
 
 def write_pid_file():
@@ -207,6 +1750,25 @@ def start_server(args):
         logger.error("Server is already running.")
         sys.exit(1)
 
+    # Load the ticket types before daemonizing so a bad config is reported on the terminal;
+    # only a missing default file falls back to the built-in types, a file given with -c must exist
+    if args.config != TICKET_TYPES_FILE or os.path.exists(args.config):
+        try:
+            loadTicketTypes(args.config)
+        except (OSError, ValueError) as e:
+            logger.error(f"Invalid ticket types file {args.config}: {str(e)}")
+            sys.exit(1)
+    ticketGenerator.processes = args.processes
+    ticketGenerator.randomMode = args.random
+    ticketGenerator.unique = args.unique
+    ticketGenerator.drawMethod = args.draw
+    requestProfiler.fraction = args.profile
+    admission.clients.rate = args.rate
+    admission.clients.burst = args.burst if args.burst is not None else max(1.0, args.rate)
+    admission.maxHandlers = args.max_handlers
+    admission.maxQuantity = args.max_quantity
+    requestProfiler.enabled = args.profile > 0
+
     # Daemonize the process
     if os.fork():
         sys.exit(0)
@@ -225,11 +1787,23 @@ def start_server(args):
     write_pid_file()
 
     # Configure logging and register cleanup function
-    configure_logging()
-    atexit.register(stop_server)
+    configure_logging(args.log_rate)
+    atexit.register(server_exited)
 
     # Run the server
-    runServer(args.host, args.port)
+    runServer(args.host, args.port, args.workers, args.backlog, args.backend, args.reservoir, args.shared_pool, METRICS_FILE)
+
+def server_exited():
+    # atexit of the daemon: after "server.py stop" the PID file is gone already, otherwise
+    # the server stopped on its own and its PID file goes with it
+    try:
+        with open(PID_FILE, "r") as pid_file:
+            pid = pid_file.read().strip()
+    except OSError:
+        return
+    if pid == str(os.getpid()):
+        remove_pid_file()
+        logger.info("Server stopped.")
 
 import time
 
@@ -260,17 +1834,55 @@ def stop_server():
 
 
 
+def print_stats():
+    # Prometheus text format, read from the running server's shared counters
+    try:
+        metrics = ServerMetrics.open(METRICS_FILE)
+    except (OSError, ValueError) as e:
+        logger.error(f"Server metrics not available: {str(e)}")
+        sys.exit(1)
+    sys.stdout.write(metrics.render())
+
 def main():
     parser = argparse.ArgumentParser(description="Lottery Ticket Generator (Server)")
     parser.add_argument("-H", "--host", type=str, default="::1", help="Server IPv6 address (default is ::1)")
     parser.add_argument("-p", "--port", type=int, default=8888, help="Port number (default is 8888)")
-    parser.add_argument("command", choices=["start", "stop"], help="Command to start or stop the server")
+    parser.add_argument("-b", "--backlog", type=int, default=socket.SOMAXCONN, help=f"Listen backlog (default is {socket.SOMAXCONN})")
+    parser.add_argument("-w", "--workers", type=int, default=0, help="Number of pre-forked workers (default is 0, fork per connection)")
+    parser.add_argument("--backend", choices=["fork", "asyncio"], default="fork", help="Connection handling backend (default is fork)")
+    parser.add_argument("-r", "--reservoir", type=int, default=0, help="Pregenerated tickets kept per ticket type by each worker or the asyncio backend (default is 0, off)")
+    parser.add_argument("-s", "--shared-pool", type=int, default=0, help="Pregenerated tickets per ticket type shared by all forked handlers (default is 0, off)")
+    parser.add_argument("-P", "--processes", type=int, default=1, help=f"Processes that share the generation of one request of {PARALLEL_THRESHOLD} tickets or more, forking backend without a reservoir only (default is 1, off)")
+    parser.add_argument("--random", choices=RANDOM_MODES, default="fast", help="Random numbers: fast Mersenne Twister, or secure os.urandom which refuses seeded requests (default is fast)")
+    parser.add_argument("-u", "--unique", action="store_true", help="Never issue the same ticket twice within one request")
+    parser.add_argument("--draw", choices=DRAW_METHODS, default="shuffle", help="Draw tickets number by number or as one uniform combination rank each (default is shuffle)")
+    parser.add_argument("--log-rate", type=int, default=LOG_CONNECTION_RATE, help=f"Accepted connection log lines per second and process, -1 for all, 0 for none (default is {LOG_CONNECTION_RATE})")
+    parser.add_argument("--profile", type=float, default=0.0, help=f"Share of requests to profile from the start, 0 to 1; SIGUSR1 turns profiling on and off (default is 0, off until SIGUSR1, which samples {PROFILE_FRACTION:g})")
+    parser.add_argument("--rate", type=float, default=0.0, help="Connections per second allowed to each client address (IPv6: each /64), 0 for no limit; with -w every worker counts on its own, so a client gets up to workers times the rate (default is 0)")
+    parser.add_argument("--burst", type=float, help="Connections a client may make at once before --rate applies (default is the rate, at least 1)")
+    parser.add_argument("--max-handlers", type=int, default=MAX_HANDLERS, help=f"Connections served at once by forked handlers or the asyncio backend, 0 for no limit (default is {MAX_HANDLERS})")
+    parser.add_argument("--max-quantity", type=int, default=MAX_QUANTITY, help=f"Tickets per request (default is {MAX_QUANTITY})")
+    parser.add_argument("-c", "--config", type=str, default=TICKET_TYPES_FILE, help=f"Ticket types JSON file (default is {TICKET_TYPES_FILE}, built-in types if that file is missing)")
+    parser.add_argument("command", choices=["start", "stop", "stats"], help="Command to start or stop the server, or print its metrics in Prometheus text format")
     args = parser.parse_args()
 
+    if not 0 <= args.profile <= 1:
+        parser.error("--profile must be from 0 to 1")
+    if args.processes < 1:
+        parser.error("--processes must be at least 1")
+    if args.processes > 1 and (args.backend == "asyncio" or args.reservoir > 0):
+        # forking from the event loop would block it in waitpid, and a process with the
+        # reservoir thread may fork while that thread holds a lock
+        parser.error("--processes above 1 needs the fork backend without --reservoir")
+    if args.rate < 0 or args.max_handlers < 0 or args.max_quantity < 1 or (args.burst is not None and args.burst < 1):
+        parser.error("--rate and --max-handlers must not be negative, --burst and --max-quantity must be at least 1")
+
     if args.command == "start":
         start_server(args)
     elif args.command == "stop":
         stop_server()
+    elif args.command == "stats":
+        print_stats()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,66 @@
+#!/usr/bin/python3
+
+# ==============================================================================
+#   Assignment:  Milestone 3
+#
+#   Author:  Fatemeh Zahedi
+#   Language:  Python3
+#   To Compile:  -
+#
+#   Class:  Python for Programmers: Sockets and Security - DPI912NSA
+#   Professor:  Harvey Kaduri
+#
+# -----------------------------------------------------------------------------
+#
+#   Description: Tests of the log writer process of server.py.
+#
+#   Input: python3 -m pytest test_logwriter.py
+#
+#   Algorithm: The log writer runs in a forked child on one end of a datagram socketpair,
+#              the test sends it lines on the other end and reads them back from the log file.
+# ==============================================================================
+
+import os
+import signal
+import socket
+import time
+
+import server
+
+def startWriter(path):
+    reader, writer = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+    pid = os.fork()
+    if pid == 0:
+        writer.close()
+        try:
+            server.runLogWriter(reader, str(path), 0, 0)
+        finally:
+            os._exit(os.EX_OK)
+    reader.close()
+    return pid, writer
+
+def waitForLines(path, count, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if path.exists() and path.read_bytes().count(b"\n") >= count:
+            break
+        time.sleep(0.01)
+    return path.read_bytes() if path.exists() else b""
+
+def test_writer_keeps_running_when_its_flush_deadline_has_passed(tmp_path, monkeypatch):
+    # with no flush interval every wait starts after its deadline
+    monkeypatch.setattr(server, "LOG_FLUSH_INTERVAL", 0)
+    path = tmp_path / "server.log"
+    pid, writer = startWriter(path)
+    try:
+        for index in range(3):
+            writer.send(f"line {index}\n".encode())
+            time.sleep(0.05)
+        assert waitForLines(path, 3) == b"line 0\nline 1\nline 2\n"
+        assert os.waitpid(pid, os.WNOHANG) == (0, 0), "the log writer exited"
+        writer.send(b"line 3\n")  # would fail with ConnectionRefusedError if it had
+        assert waitForLines(path, 4).endswith(b"line 3\n")
+    finally:
+        os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+        writer.close()
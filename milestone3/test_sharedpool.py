@@ -0,0 +1,121 @@
+#!/usr/bin/python3
+
+# ==============================================================================
+#   Assignment:  Milestone 3
+#
+#   Author:  Fatemeh Zahedi
+#   Language:  Python3
+#   To Compile:  -
+#
+#   Class:  Python for Programmers: Sockets and Security - DPI912NSA
+#   Professor:  Harvey Kaduri
+#
+# -----------------------------------------------------------------------------
+#
+#   Description: Tests of the shared ticket pool of server.py under claims from several processes.
+#
+#   Input: python3 -m pytest test_sharedpool.py
+#
+#   Algorithm: The pool is filled by a generator that numbers its tickets 0, 1, 2, ..., so every
+#              ticket handed out can be traced back to the one refill that produced it.
+# ==============================================================================
+
+import os
+import signal
+import struct
+import time
+
+import server
+
+TICKET = struct.Struct(">I")
+INLINE = b"\xff" * TICKET.size  # a ticket generated by a claimer because the pool could not serve it
+
+class CountingGenerator:
+    # refills get consecutive ticket numbers; tickets generated inline in a child are INLINE
+    def __init__(self):
+        self.lottoTicketTypes = {"t": server.LotteryTicket("TEST", [TICKET.size], 256)}
+        self.produced = 0
+        self.owner = os.getpid()
+
+    def generateTicketBatch(self, quantity, typeOfTicket):
+        if os.getpid() != self.owner:
+            return server.TicketBatch(bytearray(INLINE * quantity), typeOfTicket.numbersPerTicket)
+        numbers = b"".join(TICKET.pack(number) for number in range(self.produced, self.produced + quantity))
+        self.produced += quantity
+        return server.TicketBatch(bytearray(numbers), typeOfTicket.numbersPerTicket)
+
+def ticketNumbers(data):
+    return [TICKET.unpack_from(data, position)[0] for position in range(0, len(data), TICKET.size)
+            if data[position:position + TICKET.size] != INLINE]
+
+def leftOver(pool):
+    # the tickets still in the pool, taken without generating any
+    offset = pool.regions["t"][0]
+    produced, consumed = pool.COUNTERS.unpack_from(pool.memory, offset)[:2]
+    return bytes(pool.claim("t", produced - consumed).numbers)
+
+def test_concurrent_claims_never_share_or_lose_tickets(tmp_path):
+    generator = CountingGenerator()
+    pool = server.SharedTicketPool(generator, 64)
+    while pool.refill(16):
+        pass
+
+    children = []
+    for index in range(4):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                with open(tmp_path / f"claims-{index}", "wb") as claims:
+                    for _ in range(1000):
+                        claims.write(bytes(pool.claim("t", 3).numbers))
+            finally:
+                os._exit(0)
+        children.append(pid)
+
+    # the parent keeps refilling while the children claim, like the server does between accepts
+    while children:
+        pool.refill(16)
+        pid, status = os.waitpid(-1, os.WNOHANG)
+        if pid:
+            assert status == 0
+            children.remove(pid)
+        else:
+            time.sleep(0.0005)
+
+    claimed = []
+    for index in range(4):
+        data = (tmp_path / f"claims-{index}").read_bytes()
+        assert len(data) == 1000 * 3 * TICKET.size
+        claimed += ticketNumbers(data)
+    claimed += ticketNumbers(leftOver(pool))
+    assert generator.produced > pool.capacity  # refills ran during the claims
+    assert len(claimed) == len(set(claimed)), "a ticket was claimed twice"
+    assert set(claimed) == set(range(generator.produced)), "a ticket was lost"
+
+def test_holder_killed_with_the_lock_does_not_block_the_pool(monkeypatch):
+    monkeypatch.setattr(server, "SHARED_POOL_LOCK_TIMEOUT", 0.1)
+    generator = CountingGenerator()
+    pool = server.SharedTicketPool(generator, 8)
+    while pool.refill():
+        pass
+
+    pid = os.fork()
+    if pid == 0:
+        pool.lock.acquire()
+        os.kill(os.getpid(), signal.SIGKILL)
+    os.waitpid(pid, 0)
+
+    started = time.monotonic()
+    assert len(pool.claim("t", 5)) == 5  # generated inline after the lock timed out
+    assert pool.abandoned()
+    assert len(pool.claim("t", 5)) == 5  # no more waiting once abandoned
+    assert pool.refill() is False
+    assert time.monotonic() - started < 0.5
+
+    # the parent replaces the abandoned pool for the handlers it forks later
+    monkeypatch.setattr(server, "sharedTicketPool", pool)
+    assert server.refillSharedPool() == 0
+    assert server.sharedTicketPool is not pool
+    while server.sharedTicketPool.refill():
+        pass
+    assert len(ticketNumbers(bytes(server.sharedTicketPool.claim("t", 8).numbers))) == 8
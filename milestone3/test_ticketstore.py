@@ -0,0 +1,51 @@
+#!/usr/bin/python3
+
+# ==============================================================================
+#   Assignment:  Milestone 3
+#
+#   Author:  Fatemeh Zahedi
+#   Language:  Python3
+#   To Compile:  -
+#
+#   Class:  Python for Programmers: Sockets and Security - DPI912NSA
+#   Professor:  Harvey Kaduri
+#
+# -----------------------------------------------------------------------------
+#
+#   Description: Tests of the append-only ticket store of ticketstore.py.
+#
+#   Input: python3 -m pytest test_ticketstore.py
+#
+#   Algorithm: Records are appended to a store in a temporary directory with a small segment size,
+#              so they spread over sealed segments, and are read back by identifier and ticket type.
+# ==============================================================================
+
+import ticketstore
+
+def storedTickets(records):
+    return [(record.identifier, record.error, [bytes(ticket) for ticket in record.tickets()]) for record in records]
+
+def test_append_get_delete_and_compact(tmp_path):
+    with ticketstore.TicketStore(str(tmp_path), segmentSize=64) as store:
+        store.append("a", "649", [bytes([1, 2, 3, 4, 5, 6]), bytes([7, 8, 9, 10, 11, 12])])
+        store.append("b", "649", error="Error: 'unknown'")
+        store.append("c", "max", [bytes([1, 2, 3, 4, 5, 6, 7])], sync=True)
+        assert len(store.segments) > 1
+
+        assert storedTickets(store.get("a")) == [("a", None, [bytes([1, 2, 3, 4, 5, 6]), bytes([7, 8, 9, 10, 11, 12])])]
+        assert storedTickets(store.get("b")) == [("b", "Error: 'unknown'", [])]
+        assert [record.identifier for record in store.byType("649")] == ["a", "b"]
+
+        store.delete("a", sync=True)
+        assert store.get("a") == []
+        assert sorted(store.identifiers()) == ["b", "c"]
+
+        store.compact()
+        assert sorted(store.identifiers()) == ["b", "c"]
+        assert storedTickets(store.get("b")) == [("b", "Error: 'unknown'", [])]
+        assert storedTickets(store.get("c")) == [("c", None, [bytes([1, 2, 3, 4, 5, 6, 7])])]
+
+    # a new store finds the same records on disk
+    with ticketstore.TicketStore(str(tmp_path), segmentSize=64) as store:
+        assert sorted(store.identifiers()) == ["b", "c"]
+        assert storedTickets(store.byType("649")) == [("b", "Error: 'unknown'", [])]
@@ -0,0 +1,407 @@
+#!/usr/bin/python3
+
+# ==============================================================================
+#   Assignment:  Milestone 3
+#
+#   Author:  Fatemeh Zahedi
+#   Language:  Python3 (struct, mmap, zlib library)
+#   To Compile:  -
+#
+#   Class:  Python for Programmers: Sockets and Security - DPI912NSA
+#   Professor:  Harvey Kaduri
+#
+# -----------------------------------------------------------------------------
+#
+#   Description: Append-only binary store of issued tickets, indexed by identifier and ticket type.
+#
+#   Input: python3 ticketstore.py <store directory> get <identifier>
+#          python3 ticketstore.py <store directory> type <ticket type>
+#          python3 ticketstore.py <store directory> list
+#          python3 ticketstore.py <store directory> delete <identifier>
+#          python3 ticketstore.py <store directory> compact
+#          python3 ticketstore.py <store directory> import <GeneratedTickets.txt>
+#
+#   Layout: The store is a directory of segment files segment-000001.dat, segment-000002.dat, ...
+#           Records are only ever appended to the last segment, which is sealed once it reaches
+#           the segment size; a sealed segment gets an index file (segment-000001.idx) next to it.
+#           Record: body length (4 bytes) | crc32 (4 bytes) | kind (1 byte) | identifier length (2 bytes)
+#                   | ticket type length (1 byte) | ticket count (4 bytes) | numbers per ticket (1 byte)
+#                   | error length (2 bytes) | identifier | ticket type | error | one byte per ticket number
+#           The crc32 covers everything after itself, so a torn last record is detected and dropped.
+#
+#   Algorithm: Opening the store loads the index files of sealed segments and scans the record headers
+#              of the rest. Reads map the segments with mmap and return the tickets as views of the map.
+#              Deleting appends a tombstone; compaction rewrites the segments without deleted records.
+#              Writers and compaction hold an exclusive flock on the store, readers a shared one.
+# ==============================================================================
+
+import argparse
+import fcntl
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+
+SEGMENT_SIZE = 64 * 1024 * 1024  # bytes written to a segment before it is sealed
+SEGMENT_PREFIX = "segment-"
+LOCK_FILE = "store.lock"
+
+# body length, crc32, kind, identifier length, ticket type length, ticket count, numbers per ticket, error length
+STORE_RECORD = struct.Struct("!IIBHBIBH")
+KIND_TICKETS = 1
+KIND_DELETE = 2
+
+class StoredRecord:
+    # one request's tickets as stored; numbers is a zero-copy view of the mapped segment
+    __slots__ = ("identifier", "ticketType", "error", "rowLength", "numbers")
+
+    def __init__(self, identifier, ticketType, error, rowLength, numbers):
+        self.identifier = identifier
+        self.ticketType = ticketType
+        self.error = error
+        self.rowLength = rowLength
+        self.numbers = numbers
+
+    def tickets(self):
+        rowLength = self.rowLength
+        if not rowLength:
+            return []  # an error record has no tickets
+        return [self.numbers[start:start + rowLength] for start in range(0, len(self.numbers), rowLength)]
+
+def encodeRecord(identifier, ticketType, tickets=None, error=None, kind=KIND_TICKETS):
+    identifierBytes, typeBytes = identifier.encode(), ticketType.encode()
+    errorBytes = error.encode() if error is not None else b""
+    tickets = tickets or []
+    rowLength = len(tickets[0]) if tickets else 0
+    body = b"".join([identifierBytes, typeBytes, errorBytes] + [bytes(ticket) for ticket in tickets])
+    checked = STORE_RECORD.pack(0, 0, kind, len(identifierBytes), len(typeBytes), len(tickets), rowLength,
+                                len(errorBytes))[8:]
+    return struct.pack("!II", len(body), zlib.crc32(checked + body)) + checked + body
+
+def segmentName(number, extension="dat"):
+    return f"{SEGMENT_PREFIX}{number:06d}.{extension}"
+
+class TicketStore:
+    def __init__(self, directory, segmentSize=SEGMENT_SIZE):
+        self.directory = directory
+        self.segmentSize = segmentSize
+        os.makedirs(directory, exist_ok=True)
+        self.lockFile = open(os.path.join(directory, LOCK_FILE), "a")
+        self.maps = {}  # segment number -> (mmap, mapped size)
+        self.unsynced = set()  # segments this store appended to since its last fsync
+        self.reset()
+        self.refresh()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def reset(self):
+        self.index = {}  # identifier -> [(segment, offset), ...] in append order
+        self.typeIndex = {}  # ticket type -> [(segment, offset), ...]
+        self.segments = []  # segment numbers, oldest first
+        self.scanned = {}  # segment number -> bytes of valid records seen
+        self.closeMaps()
+
+    def lock(self, operation):
+        fcntl.flock(self.lockFile, operation)
+
+    def unlock(self):
+        fcntl.flock(self.lockFile, fcntl.LOCK_UN)
+
+    def path(self, number, extension="dat"):
+        return os.path.join(self.directory, segmentName(number, extension))
+
+    def listSegments(self):
+        numbers = []
+        for name in os.listdir(self.directory):
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(".dat"):
+                numbers.append(int(name[len(SEGMENT_PREFIX):-len(".dat")]))
+        return sorted(numbers)
+
+    def refresh(self):
+        # pick up what other processes appended, sealed or compacted since the last look
+        self.lock(fcntl.LOCK_SH)
+        try:
+            self.refreshLocked()
+        finally:
+            self.unlock()
+
+    def refreshLocked(self):
+        segments = self.listSegments()
+        if any(number not in segments for number in self.segments):
+            # compacted underneath us: start over
+            self.reset()
+        for number in segments:
+            if number not in self.scanned:
+                self.segments.append(number)
+                self.scanned[number] = 0
+                self.loadIndex(number)
+            if os.path.getsize(self.path(number)) > self.scanned[number]:
+                # records appended since the last scan (or since the segment was sealed)
+                self.scanSegment(number)
+
+    def loadIndex(self, number):
+        # sealed segments carry their index, so their records need not be scanned
+        try:
+            with open(self.path(number, "idx"), "r") as indexFile:
+                entries = json.load(indexFile)
+        except (OSError, ValueError):
+            return False
+        for kind, identifier, ticketType, offset in entries["records"]:
+            self.addEntry(kind, identifier, ticketType, number, offset)
+        self.scanned[number] = entries["size"]
+        return True
+
+    def addEntry(self, kind, identifier, ticketType, number, offset):
+        if kind == KIND_DELETE:
+            # a tombstone hides every earlier record of the identifier
+            for segment, position in self.index.pop(identifier, []):
+                for entries in self.typeIndex.values():
+                    if (segment, position) in entries:
+                        entries.remove((segment, position))
+            return
+        self.index.setdefault(identifier, []).append((number, offset))
+        self.typeIndex.setdefault(ticketType, []).append((number, offset))
+
+    def scanSegment(self, number):
+        # read record headers from where the last scan stopped; stops at a torn or corrupt record
+        with open(self.path(number), "rb") as segmentFile:
+            offset = self.scanned[number]
+            segmentFile.seek(offset)
+            while True:
+                header = segmentFile.read(STORE_RECORD.size)
+                if len(header) < STORE_RECORD.size:
+                    break
+                length, crc, kind, identifierLength, typeLength, count, rowLength, errorLength = STORE_RECORD.unpack(header)
+                body = segmentFile.read(length)
+                if len(body) < length or zlib.crc32(header[8:] + body) != crc:
+                    break
+                identifier = body[:identifierLength].decode()
+                ticketType = body[identifierLength:identifierLength + typeLength].decode()
+                self.addEntry(kind, identifier, ticketType, number, offset)
+                offset += STORE_RECORD.size + length
+            self.scanned[number] = offset
+
+    def sealSegment(self, number):
+        entries = []
+        with open(self.path(number), "rb") as segmentFile:
+            offset = 0
+            size = self.scanned[number]
+            while offset < size:
+                segmentFile.seek(offset)
+                header = segmentFile.read(STORE_RECORD.size)
+                length, crc, kind, identifierLength, typeLength = STORE_RECORD.unpack(header)[:5]
+                names = segmentFile.read(identifierLength + typeLength)
+                entries.append([kind, names[:identifierLength].decode(), names[identifierLength:].decode(), offset])
+                offset += STORE_RECORD.size + length
+        temporaryPath = self.path(number, "idx.tmp")
+        with open(temporaryPath, "w") as indexFile:
+            json.dump({"size": size, "records": entries}, indexFile)
+        os.replace(temporaryPath, self.path(number, "idx"))
+
+    def appendEncoded(self, records, sync=False):
+        # records are encodeRecord() results; all of them go into the store under one lock
+        data = b"".join(records)
+        if not data:
+            return
+        self.lock(fcntl.LOCK_EX)
+        try:
+            self.refreshLocked()
+            number = self.segments[-1] if self.segments else 0
+            if not number or (self.scanned[number] and self.scanned[number] + len(data) > self.segmentSize):
+                if number:
+                    self.sealSegment(number)
+                number += 1
+                self.segments.append(number)
+                self.scanned[number] = 0
+            with open(self.path(number), "ab") as segmentFile:
+                # drop a torn record left behind by a crashed writer before appending
+                segmentFile.truncate(self.scanned[number])
+                segmentFile.write(data)
+                segmentFile.flush()
+            self.unsynced.add(number)
+            if sync:
+                self.sync()
+            self.scanSegment(number)
+        finally:
+            self.unlock()
+
+    def sync(self):
+        # make everything appended so far durable, in every segment written since the last sync
+        for number in sorted(self.unsynced):
+            try:
+                with open(self.path(number), "ab") as segmentFile:
+                    os.fsync(segmentFile.fileno())
+            except FileNotFoundError:
+                # compacted away meanwhile
+                pass
+        self.unsynced.clear()
+
+    def append(self, identifier, ticketType, tickets=None, error=None, sync=False):
+        self.appendEncoded([encodeRecord(identifier, ticketType, tickets, error)], sync)
+
+    def delete(self, identifier, sync=False):
+        self.appendEncoded([encodeRecord(identifier, "", kind=KIND_DELETE)], sync)
+
+    def segmentMap(self, number):
+        mapped = self.maps.get(number)
+        if mapped is None or mapped[1] < self.scanned[number]:
+            with open(self.path(number), "rb") as segmentFile:
+                mapped = (mmap.mmap(segmentFile.fileno(), 0, access=mmap.ACCESS_READ), self.scanned[number])
+            self.maps[number] = mapped
+        return mapped[0]
+
+    def read(self, number, offset):
+        segment = self.segmentMap(number)
+        length, crc, kind, identifierLength, typeLength, count, rowLength, errorLength = STORE_RECORD.unpack_from(segment, offset)
+        position = offset + STORE_RECORD.size
+        view = memoryview(segment)
+        identifier = bytes(view[position:position + identifierLength]).decode()
+        position += identifierLength
+        ticketType = bytes(view[position:position + typeLength]).decode()
+        position += typeLength
+        error = bytes(view[position:position + errorLength]).decode() if errorLength else None
+        position += errorLength
+        return StoredRecord(identifier, ticketType, error, rowLength, view[position:position + count * rowLength])
+
+    def get(self, identifier):
+        # every record appended under this identifier, oldest first
+        self.refresh()
+        return [self.read(number, offset) for number, offset in self.index.get(identifier, [])]
+
+    def byType(self, ticketType):
+        self.refresh()
+        for number, offset in list(self.typeIndex.get(ticketType, [])):
+            yield self.read(number, offset)
+
+    def identifiers(self):
+        self.refresh()
+        return list(self.index)
+
+    def compact(self):
+        # rewrite the live records into new segments and remove the old ones (and deleted records with them)
+        self.lock(fcntl.LOCK_EX)
+        try:
+            self.refreshLocked()
+            old = list(self.segments)
+            live = sorted(entry for entries in self.index.values() for entry in entries)
+            batch = []
+            batchSize = 0
+            number = (old[-1] if old else 0) + 1
+            written = 0
+            output = open(self.path(number), "wb")
+            for segment, offset in live:
+                mapped = self.segmentMap(segment)
+                length = STORE_RECORD.unpack_from(mapped, offset)[0]
+                record = mapped[offset:offset + STORE_RECORD.size + length]
+                if written and written + len(record) > self.segmentSize:
+                    output.close()
+                    self.scanned[number] = written
+                    self.sealSegment(number)
+                    number += 1
+                    written = 0
+                    output = open(self.path(number), "wb")
+                output.write(record)
+                written += len(record)
+            output.flush()
+            os.fsync(output.fileno())
+            output.close()
+            self.closeMaps()
+            for segment in old:
+                for extension in ("dat", "idx"):
+                    try:
+                        os.remove(self.path(segment, extension))
+                    except FileNotFoundError:
+                        pass
+            self.reset()
+            self.refreshLocked()
+        finally:
+            self.unlock()
+
+    def closeMaps(self):
+        for segment, size in getattr(self, "maps", {}).values():
+            try:
+                segment.close()
+            except BufferError:
+                # a StoredRecord still uses it; the map goes away with the record
+                pass
+        self.maps = {}
+
+    def close(self):
+        self.closeMaps()
+        self.lockFile.close()
+
+def importText(store, path):
+    # migrate a flat GeneratedTickets.txt log: "Identifier:", "Ticket Type:", then tickets or an error
+    records = []
+    identifier = ticketType = error = None
+    tickets = []
+
+    def finish():
+        if identifier is not None:
+            records.append(encodeRecord(identifier, ticketType or "", tickets, error))
+
+    with open(path, "r") as textFile:
+        for line in textFile:
+            line = line.strip()
+            if line.startswith("Identifier: "):
+                finish()
+                identifier, ticketType, error, tickets = line[len("Identifier: "):], None, None, []
+            elif line.startswith("Ticket Type: "):
+                ticketType = line[len("Ticket Type: "):]
+            elif line.startswith("Error") and identifier is not None:
+                error = line
+            elif ". " in line and identifier is not None:
+                numbers = line.split(". ", 1)[1]
+                tickets.append(bytes([int(number) for number in numbers.replace("|", ",").split(",")]))
+    finish()
+    store.appendEncoded(records, sync=True)
+    return len(records)
+
+def printRecord(record):
+    print(f"Identifier: {record.identifier}")
+    print(f"Ticket Type: {record.ticketType}")
+    if record.error is not None:
+        print(record.error)
+    for i, ticket in enumerate(record.tickets(), 1):
+        print(f"{i}. {', '.join(map(str, ticket))}")
+    print()
+
+def main():
+    parser = argparse.ArgumentParser(description="Lottery Ticket Store")
+    parser.add_argument("store", type=str, help="Store directory")
+    parser.add_argument("command", choices=["get", "type", "list", "delete", "compact", "import"], help="What to do")
+    parser.add_argument("argument", nargs="?", help="Identifier, ticket type or file to import")
+    args = parser.parse_args()
+
+    if args.command in ("get", "type", "delete", "import") and args.argument is None:
+        parser.error(f"{args.command} needs an argument")
+
+    try:
+        with TicketStore(args.store) as store:
+            if args.command == "get":
+                for record in store.get(args.argument):
+                    printRecord(record)
+            elif args.command == "type":
+                for record in store.byType(args.argument):
+                    printRecord(record)
+            elif args.command == "list":
+                for identifier in store.identifiers():
+                    print(identifier)
+            elif args.command == "delete":
+                store.delete(args.argument, sync=True)
+            elif args.command == "compact":
+                store.compact()
+            elif args.command == "import":
+                print(f"Imported {importText(store, args.argument)} records.")
+    except (OSError, ValueError) as e:
+        print(f"Error: {str(e)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()